@@ -0,0 +1,385 @@
+"""防护应用注册表：按域名和路径前缀把请求路由到应用，每个应用使用各自预编译的规则集"""
+import itertools
+import json
+import os
+
+from reverse_proxy import Upstream
+from rule_engine import RuleCompileError, RuleSet
+
+
+class PathTrie:
+    """按路径段组织的前缀树，查找最长匹配的前缀，耗时只与路径段数有关"""
+
+    __slots__ = ("children", "value")
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+
+    @staticmethod
+    def segments(path: str) -> list:
+        return [s for s in path.split("/") if s]
+
+    def insert(self, prefix: str, value):
+        node = self
+        for segment in self.segments(prefix):
+            node = node.children.setdefault(segment, PathTrie())
+        node.value = value
+
+    def get(self, prefix: str):
+        node = self
+        for segment in self.segments(prefix):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node.value
+
+    def remove(self, prefix: str) -> bool:
+        path = [(None, self)]
+        node = self
+        for segment in self.segments(prefix):
+            node = node.children.get(segment)
+            if node is None:
+                return False
+            path.append((segment, node))
+        if node.value is None:
+            return False
+        node.value = None
+        # 清理不再需要的节点
+        for i in range(len(path) - 1, 0, -1):
+            segment, node = path[i]
+            if node.value is not None or node.children:
+                break
+            del path[i - 1][1].children[segment]
+        return True
+
+    def longest(self, path: str):
+        node = self
+        best = self.value
+        for segment in self.segments(path):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.value is not None:
+                best = node.value
+        return best
+
+    def __bool__(self) -> bool:
+        return self.value is not None or bool(self.children)
+
+
+def normalize_host(host: str) -> str:
+    """小写并去掉端口，空字符串表示匹配任意域名"""
+    host = (host or "").strip().lower()
+    if host.startswith("["):
+        return host[:host.find("]") + 1]
+    return host.split(":", 1)[0]
+
+
+def normalize_prefix(prefix: str) -> str:
+    return "/" + "/".join(PathTrie.segments(prefix or "/"))
+
+
+class ProtectedApp:
+    """一个防护应用，字段名与前端保持一致（to_dict 输出驼峰命名）"""
+
+    EDITABLE = {
+        "name": "name",
+        "backend": "backend",
+        "protocol": "protocol",
+        "port": "port",
+        "host": "host",
+        "pathPrefix": "path_prefix",
+        "isProtected": "is_protected",
+        "ccProtection": "cc_protection",
+        "botProtection": "bot_protection",
+        "authProtection": "auth_protection",
+        "dynamicProtection": "dynamic_protection",
+        "ccRateLimit": "cc_rate_limit",
+        "ccPenaltyTime": "cc_penalty_time",
+        "ruleOverrides": "rule_overrides",
+    }
+    STRINGS = ("name", "backend", "protocol", "host", "pathPrefix")
+    BOOLEANS = ("isProtected", "ccProtection", "botProtection", "authProtection", "dynamicProtection")
+    # 整数字段的取值范围（含两端）
+    INTEGERS = {"port": (1, 65535), "ccRateLimit": (1, None), "ccPenaltyTime": (1, None)}
+
+    def __init__(self, app_id: int):
+        self.id = app_id
+        self.name = ""
+        self.backend = ""
+        self.protocol = "http"
+        self.port = 80
+        self.host = ""
+        self.path_prefix = "/"
+        self.is_protected = True
+        self.running = True
+        self.cc_protection = True
+        self.bot_protection = True
+        self.auth_protection = False
+        self.dynamic_protection = False
+        self.cc_rate_limit = 100
+        self.cc_penalty_time = 5
+        self.rule_overrides = {}
+        self.requests_count = 0
+        self.attacks_count = 0
+        self.rule_set = None
+        self.upstream = None
+
+    def to_dict(self) -> dict:
+        data = {key: getattr(self, attr) for key, attr in self.EDITABLE.items()}
+        data.update({
+            "id": self.id,
+            "status": "running" if self.running else "stopped",
+            "statusText": "运行中" if self.running else "已停止",
+            "requestsCount": self.requests_count,
+            "attacksCount": self.attacks_count,
+        })
+        return data
+
+
+class AppRegistry:
+    """
+    防护应用注册表
+
+    路由分两级：域名哈希索引（O(1)）找到该域名的路径前缀树，再按路径段取最长匹配的前缀；
+    精确域名没有命中时使用不限域名（host 为空）的应用。
+    没有规则覆盖的应用共用全局规则集，有覆盖的应用在保存时编译自己的规则集，
+    请求路径上不再编译规则，耗时与应用数量无关。
+    """
+
+    def __init__(self, base_rules: dict, targets: dict, path: str = "", base_engine: RuleSet | None = None):
+        self.path = path
+        self._ids = itertools.count(1)
+        self._apps = {}
+        self._hosts = {}
+        self.set_base_rules(base_rules, targets, base_engine)
+        if path and os.path.exists(path):
+            self._load()
+
+    def set_base_rules(self, base_rules: dict, targets: dict, base_engine: RuleSet | None = None):
+        """全局规则变化时重新编译所有应用的规则集，任何一个编译失败则保持原状并抛出异常"""
+        base_engine = base_engine or RuleSet(base_rules, targets)
+        self.apply_base_rules(base_rules, targets, base_engine, self.compile_all(base_rules, targets, base_engine))
+
+    def compile_all(self, base_rules: dict, targets: dict, base_engine: RuleSet) -> dict:
+        """
+        按新的全局规则编译所有应用的规则集，不修改注册表，可以在工作线程中执行
+
+        返回 应用 id -> (编译时的规则覆盖, 规则集)，交给 apply_base_rules 在事件循环中替换。
+        """
+        apps = list(self._apps.items())
+        return {
+            app_id: (app.rule_overrides, self._compile(app.rule_overrides, base_rules, targets, base_engine))
+            for app_id, app in apps
+        }
+
+    def apply_base_rules(self, base_rules: dict, targets: dict, base_engine: RuleSet, compiled: dict):
+        """替换全局规则和各应用的规则集；编译期间新增或修改过规则覆盖的应用在这里补编译"""
+        pending = {}
+        for app_id, app in self._apps.items():
+            overrides, rule_set = compiled.get(app_id, (None, None))
+            if rule_set is None or overrides is not app.rule_overrides:
+                rule_set = self._compile(app.rule_overrides, base_rules, targets, base_engine)
+            pending[app_id] = rule_set
+        self.base_rules = base_rules
+        self.targets = targets
+        self.base_engine = base_engine
+        for app_id, rule_set in pending.items():
+            self._apps[app_id].rule_set = rule_set
+
+    @staticmethod
+    def _compile(overrides: dict, base_rules: dict, targets: dict, base_engine: RuleSet) -> RuleSet:
+        if not overrides:
+            return base_engine
+        return RuleSet({**base_rules, **overrides}, targets)
+
+    @staticmethod
+    def _validate_overrides(overrides) -> dict:
+        if not isinstance(overrides, dict) or not all(
+            isinstance(patterns, list) and all(isinstance(p, str) for p in patterns)
+            for patterns in overrides.values()
+        ):
+            raise ValueError("ruleOverrides must map category names to lists of patterns")
+        return overrides
+
+    @staticmethod
+    def _coerce(key: str, value):
+        """按字段类型校验，布尔值也接受 0/1 和 "true"/"false"，整数也接受 "8080" 这样的字符串，类型不对时抛出 ValueError"""
+        if key in ProtectedApp.BOOLEANS:
+            if isinstance(value, str) and value.strip().lower() in ("true", "false", "1", "0"):
+                return value.strip().lower() in ("true", "1")
+            if not isinstance(value, int) or value not in (0, 1):
+                raise ValueError(f"{key} must be a boolean")
+            value = bool(value)
+        elif key in ProtectedApp.INTEGERS:
+            try:
+                if isinstance(value, bool) or not isinstance(value, (int, str)):
+                    raise ValueError
+                value = int(value)
+            except ValueError:
+                raise ValueError(f"{key} must be an integer") from None
+            low, high = ProtectedApp.INTEGERS[key]
+            if value < low or (high is not None and value > high):
+                raise ValueError(f"{key} must be between {low} and {high}" if high else f"{key} must be at least {low}")
+        elif key in ProtectedApp.STRINGS and not isinstance(value, str):
+            raise ValueError(f"{key} must be a string")
+        return value
+
+    def _apply(self, app: ProtectedApp, data: dict, upstream: Upstream | None = None) -> tuple:
+        """校验并写入字段，返回编译好的 (规则集, 上游)，校验失败抛出 ValueError；上游地址未变时沿用 upstream"""
+        for key, value in data.items():
+            attr = ProtectedApp.EDITABLE.get(key)
+            if attr is not None:
+                setattr(app, attr, self._coerce(key, value))
+        if not str(app.name).strip():
+            raise ValueError("name is required")
+        app.host = normalize_host(app.host)
+        app.path_prefix = normalize_prefix(app.path_prefix)
+        app.rule_overrides = self._validate_overrides(app.rule_overrides or {})
+        rule_set = self._compile(app.rule_overrides, self.base_rules, self.targets, self.base_engine)
+        if upstream is None or str(upstream.url) != str(Upstream(app.backend).url):
+            upstream = Upstream(app.backend)
+        return rule_set, upstream
+
+    def _index(self, app: ProtectedApp):
+        self._hosts.setdefault(app.host, PathTrie()).insert(app.path_prefix, app)
+
+    def _unindex(self, app: ProtectedApp):
+        trie = self._hosts.get(app.host)
+        if trie is not None and trie.remove(app.path_prefix) and not trie:
+            del self._hosts[app.host]
+
+    def _check_binding(self, host: str, prefix: str, app_id: int | None):
+        trie = self._hosts.get(host)
+        existing = trie.get(prefix) if trie is not None else None
+        if existing is not None and existing.id != app_id:
+            raise ValueError(f"{host or '*'}{prefix} is already bound to app {existing.id}")
+
+    def add(self, data: dict) -> ProtectedApp:
+        app = ProtectedApp(0)
+        rule_set, upstream = self._apply(app, data)
+        self._check_binding(app.host, app.path_prefix, None)
+        app.id = next(self._ids)
+        app.rule_set, app.upstream = rule_set, upstream
+        self._apps[app.id] = app
+        self._index(app)
+        self._save()
+        return app
+
+    def update(self, app_id: int, data: dict) -> tuple:
+        """
+        修改应用，校验失败时应用保持原状（抛出 KeyError 或 ValueError）
+
+        返回 (应用, 被替换的上游)，上游地址变化时调用方负责关闭旧上游的连接池，否则为 None。
+        """
+        app = self._apps[app_id]
+        draft = ProtectedApp(app_id)
+        draft.__dict__.update(app.__dict__)
+        draft.rule_set, draft.upstream = self._apply(draft, data, app.upstream)
+        self._check_binding(draft.host, draft.path_prefix, app_id)
+
+        retired = app.upstream if draft.upstream is not app.upstream else None
+        self._unindex(app)
+        app.__dict__.update(draft.__dict__)
+        self._index(app)
+        self._save()
+        return app, retired
+
+    def set_running(self, app_id: int, running: bool) -> ProtectedApp:
+        app = self._apps[app_id]
+        app.running = running
+        self._save()
+        return app
+
+    def remove(self, app_id: int) -> ProtectedApp:
+        app = self._apps.pop(app_id)
+        self._unindex(app)
+        self._save()
+        return app
+
+    def get(self, app_id: int) -> ProtectedApp | None:
+        return self._apps.get(app_id)
+
+    def __iter__(self):
+        return iter(list(self._apps.values()))
+
+    def __len__(self) -> int:
+        return len(self._apps)
+
+    def has_host(self, host: str) -> bool:
+        """是否有应用注册了这个域名（不含不限域名的应用）"""
+        host = normalize_host(host)
+        return bool(host) and host in self._hosts
+
+    def route(self, host: str, path: str) -> ProtectedApp | None:
+        """按请求的 Host 和路径找到应用，没有匹配时返回 None"""
+        if not self._hosts:
+            return None
+        trie = self._hosts.get(normalize_host(host))
+        if trie is not None:
+            app = trie.longest(path)
+            if app is not None:
+                return app
+        trie = self._hosts.get("")
+        return trie.longest(path) if trie is not None else None
+
+    def snapshot(self) -> list:
+        """保存的内容：各应用可修改的字段、id 和运行状态"""
+        return [
+            {**{key: getattr(app, attr) for key, attr in ProtectedApp.EDITABLE.items()},
+             "id": app.id, "running": app.running}
+            for app in self._apps.values()
+        ]
+
+    def replace(self, data: list) -> list:
+        """
+        用 snapshot 格式的应用列表替换整个注册表（多 worker 模式下同步其他 worker 的修改），不写文件
+
+        id 相同且上游地址未变的应用沿用原来的上游连接池和计数；返回不再使用的上游，由调用方关闭。
+        """
+        apps = {}
+        for item in data:
+            app = self._restore(item, self._apps.get(item["id"]))
+            if app is not None:
+                apps[app.id] = app
+        in_use = {id(app.upstream) for app in apps.values()}
+        retired = [app.upstream for app in self._apps.values() if id(app.upstream) not in in_use]
+        self._apps = apps
+        self._hosts = {}
+        for app in apps.values():
+            self._index(app)
+        self._ids = itertools.count(max(apps, default=0) + 1)
+        return retired
+
+    def _restore(self, item: dict, previous: ProtectedApp | None = None) -> ProtectedApp | None:
+        app = ProtectedApp(item["id"])
+        app.running = item.get("running", True)
+        upstream = None
+        if previous is not None:
+            app.requests_count, app.attacks_count = previous.requests_count, previous.attacks_count
+            upstream = previous.upstream
+        try:
+            app.rule_set, app.upstream = self._apply(app, item, upstream)
+        except RuleCompileError as e:
+            # 旧版本保存的规则覆盖可能已不合法（例如无上限的 .*），去掉覆盖、按全局规则防护
+            print(f"Protected app {app.id}: ignoring invalid rule overrides: {e}")
+            app.rule_set, app.upstream = self._apply(app, dict(item, ruleOverrides={}), upstream)
+        except ValueError as e:
+            # 旧版本没有校验字段类型，保存了无法使用的值（例如非数字的端口）时跳过该应用
+            print(f"Protected app {app.id}: skipped, invalid field: {e}")
+            return None
+        return app
+
+    def _save(self):
+        """保存到 JSON 文件（先写临时文件再替换，避免写到一半的文件）"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            self.replace(json.load(f))
@@ -1,102 +1,169 @@
 import http.server
-import socketserver
+import ipaddress
 import json
+import queue
+import selectors
+import socket
+import threading
 import time
 import urllib.parse
 import os
+import signal
+
+from ip_blacklist import IPBlacklist
+from rate_limiter import RateLimiter
+from rule_engine import RuleSet
+from token_store import TokenStore
+from waf_core import WAF_RULES, WAF_RULE_TARGETS, WafCore
 
 PORT = int(os.environ.get('PORT', 8009))
+# 监听地址，默认 "::" 为 IPv6 双栈（同时接受 IPv4 连接），系统不支持 IPv6 时退回 0.0.0.0
+HOST = os.environ.get('HOST', '::')
+# pool：固定大小线程池并发处理，支持 HTTP/1.1 长连接；single：原来的单线程 HTTP/1.0 模式
+SERVER_MODE = os.environ.get('SERVER_MODE', 'pool')
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 32))  # 工作线程数
+MAX_PENDING = int(os.environ.get('MAX_PENDING', 128))  # 等待工作线程的连接数上限，超出返回 503
+KEEPALIVE_TIMEOUT = float(os.environ.get('KEEPALIVE_TIMEOUT', 5))  # 连接空闲（或读请求）超时秒数
+IDLE_POLL_INTERVAL = 0.05  # 长连接等待下一个请求时，每隔这么久检查一次是否有连接在排队
+# 可信的反向代理（IP 或网段，逗号分隔）：只有来自这些地址的连接才采用 X-Real-IP / X-Forwarded-For，
+# 否则客户端可以伪造请求头，冒充任意地址（让别人被加入黑名单，或绕开对自己的封禁）
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.environ.get('TRUSTED_PROXIES', '').split(',') if p.strip()
+]
 
 # 简单的用户认证
 users = {
     "admin": "admin123"
 }
 
-# 简单的 token 管理
-tokens = {}
-TOKEN_FILE = "tokens.json"
+# token 管理：有效期 TOKEN_TTL 秒，每 TOKEN_FLUSH_INTERVAL 秒清理过期 token 并批量保存到文件
+TOKEN_FILE = os.environ.get('TOKEN_FILE', 'tokens.json')
+TOKEN_TTL = float(os.environ.get('TOKEN_TTL', 86400))
+TOKEN_FLUSH_INTERVAL = float(os.environ.get('TOKEN_FLUSH_INTERVAL', 2))
+
+token_store = TokenStore(TOKEN_FILE, TOKEN_TTL)
+try:
+    token_store.load()
+except (OSError, ValueError, KeyError) as e:
+    print(f"Error loading tokens: {e}")
 
-def load_tokens():
-    """从文件加载tokens"""
-    global tokens
-    if os.path.exists(TOKEN_FILE):
+def maintain_tokens(stop_event):
+    """后台线程：定期清理过期 token 并保存修改"""
+    while not stop_event.wait(TOKEN_FLUSH_INTERVAL):
+        token_store.purge()
         try:
-            with open(TOKEN_FILE, 'r') as f:
-                tokens = json.load(f)
-        except Exception as e:
-            print(f"Error loading tokens: {e}")
-            tokens = {}
-
-def save_tokens():
-    """保存tokens到文件"""
-    try:
-        with open(TOKEN_FILE, 'w') as f:
-            json.dump(tokens, f)
-    except Exception as e:
-        print(f"Error saving tokens: {e}")
-
-def generate_token(username):
-    token = f"token_{username}_{int(time.time())}"
-    tokens[token] = username
-    print(f"Generated token: {token}")
-    print(f"Tokens dict before save: {tokens}")
-    save_tokens()
-    print(f"Tokens dict after save: {tokens}")
-    return token
-
-def verify_token(token):
-    print(f"Verifying token: {token}")
-    print(f"Tokens dict: {tokens}")
-    print(f"Token in tokens: {token in tokens}")
-    return token in tokens
-
-# 加载tokens
-load_tokens()
+            token_store.flush()
+        except OSError as e:
+            print(f"Error saving tokens: {e}")
 
 # 存储访问日志和攻击记录
 access_logs = []
 attack_logs = []
 
-# IP 黑名单
-ip_blacklist = set()
+# WAF 检查（与 main.py 共用 waf_core）：规则、IP 黑名单和请求频率限制，配置项与 main.py 相同
+waf = WafCore(
+    RuleSet(WAF_RULES, WAF_RULE_TARGETS),
+    IPBlacklist(
+        ipv6_auto_prefix=int(os.environ.get('BLACKLIST_IPV6_PREFIX', 128)),
+        auto_ttl=float(os.environ.get('BLACKLIST_TTL', 3600)),
+        escalation=float(os.environ.get('BLACKLIST_TTL_ESCALATION', 2)),
+        max_ttl=float(os.environ.get('BLACKLIST_MAX_TTL', 7 * 86400)),
+    ),
+    RateLimiter(
+        int(os.environ.get('RATE_LIMIT_MAX_REQUESTS', 100)),
+        int(os.environ.get('RATE_LIMIT_WINDOW', 60)),
+        algorithm=os.environ.get('RATE_LIMIT_ALGORITHM', 'sliding_window'),
+        max_clients=int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 100000)),
+    ),
+    int(os.environ.get('BODY_INSPECT_MAX_BYTES', 1024 * 1024)),
+    int(os.environ.get('BODY_INSPECT_OVERLAP', 256)),
+    # 工作线程共用黑名单和频率限制状态
+    lock=threading.Lock(),
+)
+
+def blacklist_count():
+    with waf.lock:
+        return len(waf.blacklist)
+
+# 保护日志列表，工作线程并发写入和读取
+log_lock = threading.Lock()
+
+def record_access(access_log):
+    with log_lock:
+        access_logs.append(access_log)
+        # 限制日志大小
+        if len(access_logs) > 1000:
+            access_logs.pop(0)
+        if access_log["is_attack"]:
+            attack_logs.append(access_log)
+            if len(attack_logs) > 500:
+                attack_logs.pop(0)
+
+def snapshot_logs():
+    """返回日志列表的副本，统计时不受其他线程写入的影响"""
+    with log_lock:
+        return list(access_logs), list(attack_logs)
 
 class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 长连接；空闲超过 KEEPALIVE_TIMEOUT 秒的连接会被关闭，慢速客户端不会一直占用工作线程
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # 响应头和响应体分两次写入，关闭 Nagle 算法避免长连接上的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        if self.close_connection:
+            return
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.connection, selectors.EVENT_READ)
+            while not self.close_connection and self.wait_for_request(selector):
+                self.handle_one_request()
+
+    def wait_for_request(self, selector):
+        """
+        等待长连接上的下一个请求，返回是否有数据可读
+
+        空闲的长连接会一直占用工作线程：有连接在排队时直接关闭空闲连接，把线程让出来；
+        空闲超过 KEEPALIVE_TIMEOUT 秒同样关闭。
+        """
+        # 先看缓冲区中是否已有数据（流水线请求），非阻塞读取，没有数据时返回 b''
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or getattr(self.server, 'busy', False):
+                return False
+            if selector.select(min(IDLE_POLL_INTERVAL, remaining)):
+                # 可读也可能是客户端关闭了连接，由 handle_one_request 处理
+                return True
+
     def do_GET(self):
         # 解析路径
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
         
-        # 获取客户端 IP
-        client_ip = self.get_client_ip()
-        
-        # 记录访问日志
-        access_log = {
-            "timestamp": time.time(),
-            "ip": client_ip,
-            "method": "GET",
-            "path": path,
-            "query": urllib.parse.parse_qs(parsed_path.query),
-            "user_agent": self.headers.get("User-Agent", ""),
-            "is_attack": False,
-            "status": "allowed"
-        }
-        access_logs.append(access_log)
-        
-        # 限制日志大小
-        if len(access_logs) > 1000:
-            access_logs.pop(0)
+        # WAF 检查并记录访问日志
+        if not self.firewall("GET", parsed_path):
+            return
         
         # 处理 API 请求
         if path == "/":
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "message": "应用防火墙正在运行",
                 "version": "1.0.0",
                 "status": "active"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/status":
             # 检查认证
@@ -106,9 +173,6 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             recent_logs = access_logs[-60:]
             recent_attacks = [log for log in recent_logs if log.get("is_attack", False)]
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "total_accesses": len(access_logs),
                 "total_attacks": len(attack_logs),
@@ -119,75 +183,68 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                     "total_count": len(access_logs),
                     "ipv6_percentage": 0.0
                 },
-                "blacklist_count": len(ip_blacklist)
+                "blacklist_count": blacklist_count()
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/access-logs":
             # 检查认证
             if not self.check_auth():
                 return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "logs": access_logs[-100:],
                 "total": len(access_logs)
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/attack-logs":
             # 检查认证
             if not self.check_auth():
                 return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "logs": attack_logs[-100:],
                 "total": len(attack_logs)
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/ipv6-stats":
             # 检查认证
             if not self.check_auth():
                 return
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "ipv6_count": 0,
                 "total_count": len(access_logs),
                 "ipv6_percentage": 0.0
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/logs-analysis":
             # 检查认证
             if not self.check_auth():
                 return
             
+            logs, attacks = snapshot_logs()
+
             # 攻击类型分布
             attack_types = {}
-            for log in attack_logs:
+            for log in attacks:
                 attack_msg = log.get("attack_message", "Unknown")
                 if attack_msg:
                     attack_types[attack_msg] = attack_types.get(attack_msg, 0) + 1
             
             # IP 地址分析
             ip_analysis = {
-                "total_ips": len(set(log["ip"] for log in access_logs)),
-                "attack_ips": len(set(log["ip"] for log in attack_logs)),
-                "blacklisted_ips": len(ip_blacklist)
+                "total_ips": len(set(log["ip"] for log in logs)),
+                "attack_ips": len(set(log["ip"] for log in attacks)),
+                "blacklisted_ips": blacklist_count()
             }
             
             # 请求方法分析
             method_analysis = {}
-            for log in access_logs:
+            for log in logs:
                 method = log.get("method", "Unknown")
                 method_analysis[method] = method_analysis.get(method, 0) + 1
             
@@ -199,8 +256,8 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 end_time = current_time - ((i - 1) * 60)
                 
                 # 统计该时间段内的请求数和攻击数
-                requests_count = len([log for log in access_logs if start_time <= log.get("timestamp", 0) < end_time])
-                attacks_count = len([log for log in attack_logs if start_time <= log.get("timestamp", 0) < end_time])
+                requests_count = len([log for log in logs if start_time <= log.get("timestamp", 0) < end_time])
+                attacks_count = len([log for log in attacks if start_time <= log.get("timestamp", 0) < end_time])
                 
                 time_trend.append({
                     "timestamp": end_time,
@@ -210,92 +267,62 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             
             # 状态分布
             status_analysis = {
-                "allowed": len([log for log in access_logs if log.get("status") == "allowed"]),
-                "blocked": len([log for log in access_logs if log.get("status") == "blocked"])
+                "allowed": len([log for log in logs if log.get("status") == "allowed"]),
+                "blocked": len([log for log in logs if log.get("status") == "blocked"])
             }
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "attack_types": attack_types,
                 "ip_analysis": ip_analysis,
                 "method_analysis": method_analysis,
                 "time_trend": time_trend,
                 "status_analysis": status_analysis,
-                "total_logs": len(access_logs),
-                "total_attacks": len(attack_logs)
+                "total_logs": len(logs),
+                "total_attacks": len(attacks)
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/auth/me":
             # 检查认证
-            token = self.get_token()
-            if not token or not verify_token(token):
-                self.send_response(401)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
+            username = self.authenticated_user()
+            if username is None:
                 response = {
                     "detail": "Not authenticated"
                 }
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(401, response)
                 return
             
-            username = tokens[token]
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "id": 1,
                 "username": username,
                 "role": "admin"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/health":
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {"status": "healthy"}
-            self.wfile.write(json.dumps(response).encode('utf-8'))
-        
+            self.send_json(200, response)
+
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "detail": "Not found"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(404, response)
     
     def do_POST(self):
         # 解析路径
         parsed_path = urllib.parse.urlparse(self.path)
         path = parsed_path.path
         
-        # 获取客户端 IP
-        client_ip = self.get_client_ip()
-        
         # 读取请求体
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length).decode('utf-8')
+        # 长连接上必须读完请求体，否则剩余内容会被当成下一个请求
+        content_length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(content_length)
         
-        # 记录访问日志
-        access_log = {
-            "timestamp": time.time(),
-            "ip": client_ip,
-            "method": "POST",
-            "path": path,
-            "query": urllib.parse.parse_qs(parsed_path.query),
-            "user_agent": self.headers.get("User-Agent", ""),
-            "is_attack": False,
-            "status": "allowed"
-        }
-        access_logs.append(access_log)
-        
-        # 限制日志大小
-        if len(access_logs) > 1000:
-            access_logs.pop(0)
+        # WAF 检查并记录访问日志
+        if not self.firewall("POST", parsed_path, body):
+            return
+        post_data = body.decode('utf-8', errors='replace')
         
         # 处理登录请求
         if path == "/api/auth/login":
@@ -305,86 +332,95 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             password = form_data.get('password', [''])[0]
             
             if username not in users or users[username] != password:
-                self.send_response(401)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
                 response = {
                     "detail": "Incorrect username or password"
                 }
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(401, response)
                 return
             
             # 生成 token
-            token = generate_token(username)
-            tokens[token] = username
+            token = token_store.issue(username)
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "access_token": token,
                 "token_type": "bearer"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         elif path == "/api/auth/logout":
             # 检查认证
             token = self.get_token()
-            if token and verify_token(token):
-                del tokens[token]
-                save_tokens()
+            if token:
+                token_store.revoke(token)
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "message": "Successfully logged out"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(200, response)
         
         else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
             response = {
                 "detail": "Not found"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(404, response)
     
-    def check_auth(self):
+    def firewall(self, method, parsed_path, body=b""):
+        """WAF 检查并记录访问日志，请求被拦截时发送拦截响应并返回 False"""
+        client_ip = self.get_client_ip()
+        verdict = waf.check(client_ip, parsed_path.path, parsed_path.query, self.headers, body, method=method)
+        
+        # 黑名单和频率限制拦截的请求不记录访问日志（与 main.py 一致）
+        if verdict.allowed or verdict.is_attack:
+            record_access({
+                "timestamp": time.time(),
+                "ip": client_ip,
+                "is_ipv6": verdict.is_ipv6,
+                "method": method,
+                "path": parsed_path.path,
+                "query": urllib.parse.parse_qs(parsed_path.query),
+                "user_agent": self.headers.get("User-Agent", ""),
+                "is_attack": verdict.is_attack,
+                "attack_message": verdict.attack_message,
+                "status": "allowed" if verdict.allowed else "blocked"
+            })
+        
+        if not verdict.allowed:
+            self.send_json(verdict.status, verdict.content)
+            return False
+        return True
+
+    def authenticated_user(self):
+        """返回请求 token 对应的用户名，未认证返回 None"""
         token = self.get_token()
-        if not token or not verify_token(token):
-            self.send_response(401)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
+        return token_store.verify(token) if token else None
+
+    def check_auth(self):
+        if self.authenticated_user() is None:
             response = {
                 "detail": "Not authenticated"
             }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(401, response)
             return False
         return True
     
     def get_client_ip(self):
-        """获取真实的客户端IP地址"""
-        # 检查是否有反向代理的头（不区分大小写）
-        x_forwarded_for = None
-        x_real_ip = None
+        """获取真实的客户端IP地址：连接来自可信代理时才采用代理设置的请求头"""
+        peer = normalize_client_ip(self.client_address[0])
+        if not is_trusted_proxy(peer):
+            return peer
         
-        # 遍历所有请求头，查找X-Forwarded-For和X-Real-IP（不区分大小写）
-        for key, value in self.headers.items():
-            if key.lower() == "x-forwarded-for":
-                x_forwarded_for = value
-            elif key.lower() == "x-real-ip":
-                x_real_ip = value
+        # nginx 用 $remote_addr 覆盖 X-Real-IP，客户端无法伪造（请求头名称不区分大小写）
+        x_real_ip = (self.headers.get("X-Real-IP") or "").strip()
+        if x_real_ip:
+            return normalize_client_ip(x_real_ip)
         
-        if x_forwarded_for:
-            # X-Forwarded-For 格式通常为: client_ip, proxy1_ip, proxy2_ip
-            return x_forwarded_for.split(",")[0].strip()
-        elif x_real_ip:
-            return x_real_ip.strip()
-        else:
-            # 直接返回连接的IP地址
-            return self.client_address[0]
+        # X-Forwarded-For 格式为: client_ip, proxy1_ip, proxy2_ip，左侧的条目可以由客户端伪造，
+        # 从右往左跳过可信代理，第一个不可信的地址就是客户端
+        hops = [hop.strip() for hop in (self.headers.get("X-Forwarded-For") or "").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not is_trusted_proxy(hop):
+                return normalize_client_ip(hop)
+        return normalize_client_ip(hops[0]) if hops else peer
     
     def get_token(self):
         auth_header = self.headers.get("Authorization")
@@ -394,19 +430,154 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             return auth_header
         return None
     
+    def send_json(self, status, response):
+        """发送 JSON 响应，带 Content-Length，长连接上客户端据此判断响应结束"""
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def end_headers(self):
         # 添加 CORS 头
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        # 有连接在排队等待工作线程时不再保持长连接，把线程让给排队的连接
+        if self.protocol_version == 'HTTP/1.1' and getattr(self.server, 'busy', False):
+            self.send_header('Connection', 'close')
         super().end_headers()
     
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-# 启动服务器
-# 使用空字符串作为地址，同时监听IPv4和IPv6地址
-with socketserver.TCPServer(("", PORT), SimpleHTTPRequestHandler) as httpd:
-    print(f"Server running at http://0.0.0.0:{PORT}")
-    httpd.serve_forever()
+    def do_HEAD(self):
+        # 父类的 do_HEAD 直接读取本地文件，不经过 WAF 检查；接口只支持 GET/POST
+        self.send_response(405)
+        self.send_header('Allow', 'GET, POST, OPTIONS')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class DualStackHTTPServer(http.server.HTTPServer):
+    """地址为 IPv6 时使用双栈套接字（关闭 IPV6_V6ONLY），IPv4 客户端也能接入"""
+
+    def __init__(self, server_address, handler_class):
+        self.address_family = socket.AF_INET6 if ':' in server_address[0] else socket.AF_INET
+        super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        if self.address_family == socket.AF_INET6:
+            self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        super().server_bind()
+
+
+class PooledHTTPServer(DualStackHTTPServer):
+    """
+    固定线程池的 HTTP 服务器
+
+    主线程负责 accept，连接放入有界队列，由 workers 个工作线程处理（每个线程一次处理一条连接，
+    连接上可以有多个 HTTP/1.1 请求）。队列已满时直接返回 503 并关闭连接，
+    线程数和排队的连接数都有上限。
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=32, max_pending=128):
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._workers = [
+            threading.Thread(target=self._work, name=f"http-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        super().__init__(server_address, handler_class)
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def busy(self):
+        return not self._pending.empty()
+
+    def process_request(self, request, client_address):
+        try:
+            self._pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.reject(request)
+
+    def reject(self, request):
+        body = b'{"detail": "Server busy"}'
+        try:
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except ConnectionError:
+                # 客户端在排队期间断开
+                pass
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._pending.put(None)
+
+
+def is_trusted_proxy(ip):
+    try:
+        address = ipaddress.ip_address(normalize_client_ip(ip))
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def normalize_client_ip(ip):
+    """双栈套接字上的 IPv4 客户端地址形如 ::ffff:1.2.3.4，还原为 IPv4 地址"""
+    if ip.startswith('::ffff:') and '.' in ip:
+        return ip[7:]
+    return ip
+
+
+def create_server():
+    host = HOST
+    if ':' in host and not socket.has_ipv6:
+        host = '0.0.0.0'
+    if SERVER_MODE == 'single':
+        # 原来的单线程模式：HTTP/1.0，每个请求一条连接
+        SimpleHTTPRequestHandler.protocol_version = 'HTTP/1.0'
+        return DualStackHTTPServer((host, PORT), SimpleHTTPRequestHandler)
+    return PooledHTTPServer((host, PORT), SimpleHTTPRequestHandler, WORKER_THREADS, MAX_PENDING)
+
+
+if __name__ == '__main__':
+    # 启动服务器
+    with create_server() as httpd:
+        stop_event = threading.Event()
+        threading.Thread(target=maintain_tokens, args=(stop_event,), daemon=True).start()
+        # docker stop 发送 SIGTERM：停止服务并保存 token（shutdown 必须在其他线程中调用）
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=httpd.shutdown).start())
+        host = httpd.server_address[0]
+        print(f"Server running at http://{f'[{host}]' if ':' in host else host}:{PORT} ({SERVER_MODE} mode)")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_event.set()
+            token_store.flush()
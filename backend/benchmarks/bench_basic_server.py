@@ -0,0 +1,132 @@
+"""
+basic_server.py 负载基准：单线程模式（SERVER_MODE=single）vs 线程池模式（SERVER_MODE=pool）
+
+多个线程各自用一条连接持续请求（服务端支持时复用长连接），统计每秒请求数和延迟；
+--slow-clients 个连接只发送半个请求行后不再发送数据，模拟慢速客户端。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_basic_server.py --clients 16 --duration 5 --slow-clients 0 2
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "basic_server.py")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def client_loop(port: int, path: str, stop_at: float, latencies: list, errors: list):
+    # HTTP/1.0 服务端每次响应后关闭连接，http.client 会在下一个请求时自动重连
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+
+def open_slow_clients(port: int, count: int) -> list:
+    sockets = []
+    for _ in range(count):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(b"GET /health HTTP/1.1\r\n")
+        sockets.append(s)
+    return sockets
+
+
+def bench(mode: str, clients: int, duration: float, slow_clients: int, path: str, workers: int):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), SERVER_MODE=mode, WORKER_THREADS=str(workers))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 在临时目录中运行，tokens.json 不写到源码目录
+        server = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT], cwd=tmp_dir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_ready(port)
+            slow = open_slow_clients(port, slow_clients)
+            latencies = [[] for _ in range(clients)]
+            errors = [[] for _ in range(clients)]
+            stop_at = time.monotonic() + duration
+            threads = [
+                threading.Thread(target=client_loop, args=(port, path, stop_at, latencies[i], errors[i]))
+                for i in range(clients)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            for s in slow:
+                s.close()
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    samples = sorted(x for chunk in latencies for x in chunk)
+    error_count = sum(len(chunk) for chunk in errors)
+    label = f"{mode:<6} slow={slow_clients}"
+    if not samples:
+        print(f"{label}  no successful requests (errors={error_count})")
+        return
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{label}  {len(samples) / elapsed:9.1f} req/s  p50 {statistics.median(samples) * 1000:8.2f} ms  "
+        f"p99 {p99 * 1000:8.2f} ms  max {samples[-1] * 1000:8.2f} ms  errors={error_count}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["single", "pool"], choices=["single", "pool"])
+    parser.add_argument("--clients", type=int, default=16, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每组压测的秒数")
+    parser.add_argument("--slow-clients", type=int, nargs="+", default=[0, 2], help="慢速客户端数")
+    parser.add_argument("--workers", type=int, default=32, help="线程池模式的工作线程数")
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    for slow_clients in args.slow_clients:
+        for mode in args.modes:
+            bench(mode, args.clients, args.duration, slow_clients, args.path, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+IP 黑名单查找基准：基数树最长前缀匹配 vs 逐条比较网段
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_ip_blacklist.py --entries 10000 50000 --lookups 20000
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ip_blacklist import IPBlacklist  # noqa: E402
+
+
+def random_entries(count: int, rng: random.Random) -> list:
+    """一半 IPv4（/16~/32），一半 IPv6（/48~/128）"""
+    entries = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            prefix = rng.choice([16, 24, 28, 32])
+            network = ipaddress.ip_network((rng.getrandbits(32), prefix), strict=False)
+        else:
+            prefix = rng.choice([48, 56, 64, 128])
+            network = ipaddress.ip_network(((0x2001 << 112) | rng.getrandbits(112), prefix), strict=False)
+        entries.append(str(network))
+    return entries
+
+
+def random_addresses(count: int, rng: random.Random) -> list:
+    addresses = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            addresses.append(ipaddress.IPv4Address(rng.getrandbits(32)))
+        else:
+            addresses.append(ipaddress.IPv6Address((0x2001 << 112) | rng.getrandbits(112)))
+    return addresses
+
+
+def bench(entries_count: int, lookups: int, linear_lookups: int, rng: random.Random):
+    entries = random_entries(entries_count, rng)
+    addresses = random_addresses(lookups, rng)
+
+    blacklist = IPBlacklist()
+    start = time.perf_counter()
+    for entry in entries:
+        blacklist.add(entry)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = sum(1 for address in addresses if address in blacklist)
+    trie_time = time.perf_counter() - start
+
+    networks = [ipaddress.ip_network(e) for e in entries]
+    sample = addresses[:linear_lookups]
+    start = time.perf_counter()
+    for address in sample:
+        any(address.version == n.version and address in n for n in networks)
+    linear_time = time.perf_counter() - start
+
+    print(
+        f"entries={entries_count:>7}  insert {insert_time / entries_count * 1e6:7.2f} us/entry  "
+        f"trie {trie_time / lookups * 1e6:7.2f} us/lookup (hits={hits})  "
+        f"linear {linear_time / len(sample) * 1e6:10.2f} us/lookup"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 50000], help="黑名单条目数")
+    parser.add_argument("--lookups", type=int, default=20000, help="基数树查找次数")
+    parser.add_argument("--linear-lookups", type=int, default=200, help="逐条比较的查找次数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for count in args.entries:
+        bench(count, args.lookups, args.linear_lookups, rng)
+
+
+if __name__ == "__main__":
+    main()
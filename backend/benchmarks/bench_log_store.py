@@ -0,0 +1,112 @@
+"""
+日志存储内存基准：比较旧的 dict + list.pop(0) 布局与 LogStore 环形缓冲区
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_log_store.py --records 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from log_store import AccessLogRecord, LogStore  # noqa: E402
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+def make_fields(i: int) -> dict:
+    """生成一条模拟请求的字段，每条记录的 IP、路径、查询参数都不同"""
+    return {
+        "timestamp": time.time(),
+        "ip": f"2001:db8::{i % 65536:x}",
+        "is_ipv6": True,
+        "method": "GET",
+        "path": f"/dav/photos/{i}.jpg",
+        "query_string": f"size={i % 7}&page={i}",
+        "user_agent": USER_AGENT,
+        "content_type": "",
+        "accept": "*/*",
+        "accept_language": "zh-CN,zh;q=0.9",
+        "accept_encoding": "gzip, deflate",
+        "connection": "keep-alive",
+        "is_attack": False,
+        "attack_message": None,
+        "is_blacklisted": False,
+        "request_count": i % 100,
+    }
+
+
+def dict_layout(records: int, capacity: int):
+    """旧布局：每条日志一个 17 键 dict，超出容量时 list.pop(0)"""
+    logs = []
+    for i in range(records):
+        f = make_fields(i)
+        logs.append({
+            "timestamp": f["timestamp"],
+            "ip": f["ip"],
+            "is_ipv6": f["is_ipv6"],
+            "method": f["method"],
+            "path": f["path"],
+            "query": {"size": str(i % 7), "page": str(i)},
+            "user_agent": f["user_agent"],
+            "content_type": f["content_type"],
+            "accept": f["accept"],
+            "accept_language": f["accept_language"],
+            "accept_encoding": f["accept_encoding"],
+            "connection": f["connection"],
+            "is_attack": f["is_attack"],
+            "attack_message": f["attack_message"],
+            "is_blacklisted": f["is_blacklisted"],
+            "request_count": f["request_count"],
+            "status": "allowed",
+        })
+        if len(logs) > capacity:
+            logs.pop(0)
+    return logs
+
+
+def ring_layout(records: int, capacity: int):
+    """新布局：__slots__ 记录 + 预分配环形缓冲区"""
+    store = LogStore(capacity)
+    for i in range(records):
+        store.append(AccessLogRecord(**make_fields(i)))
+    return store
+
+
+def measure(name: str, build, records: int, capacity: int) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(records, capacity)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = min(records, capacity)
+    del result
+    return {
+        "layout": name,
+        "records": records,
+        "retained": retained,
+        "bytes_per_record": current / retained,
+        "appends_per_sec": records / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000, help="写入的日志条数")
+    parser.add_argument("--capacity", type=int, default=100000, help="保留的日志条数")
+    args = parser.parse_args()
+
+    for name, build in (("dict + list.pop(0)", dict_layout), ("LogStore + __slots__", ring_layout)):
+        r = measure(name, build, args.records, args.capacity)
+        print(
+            f"{r['layout']:<22} retained={r['retained']:>8}  "
+            f"{r['bytes_per_record']:8.1f} B/record  {r['appends_per_sec']:>12,.0f} appends/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
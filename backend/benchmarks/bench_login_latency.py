@@ -0,0 +1,110 @@
+"""
+登录洪水下的事件循环延迟：密码校验放在线程池（当前实现）vs 在事件循环中直接校验（原来的做法）
+
+在进程内通过 ASGI 调用 main.app：并发发送大量登录请求的同时，
+一个协程每隔 --tick 秒测量事件循环的调度延迟，另一个协程持续请求 /health 测量响应时间。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_login_latency.py --logins 40 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# 不写日志数据库和防护应用文件，放宽频率限制，避免登录请求被限流
+os.environ.setdefault("LOG_DB_PATH", "")
+os.environ.setdefault("PROTECTED_APPS_PATH", "")
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+_offloaded_check_password = main.check_password
+
+
+async def inline_check_password(plain_password, hashed_password) -> bool:
+    return main.verify_password(plain_password, hashed_password)
+
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run(mode: str, logins: int, concurrency: int, tick: float) -> dict:
+    """返回耗时、各状态码数量、空闲时的最大延迟、事件循环延迟和 /health 响应时间（秒）"""
+    main.check_password = inline_check_password if mode == "inline" else _offloaded_check_password
+    main.request_rate_limit.clear()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        lags = []
+        health = []
+        statuses = {}
+
+        async def ticker():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(tick)
+                lags.append(time.perf_counter() - start - tick)
+
+        async def prober():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - start)
+                await asyncio.sleep(tick)
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def login(i: int):
+            # 一半使用错误密码，错误密码同样要完整计算一次 bcrypt
+            password = "admin123" if i % 2 == 0 else "wrong-password"
+            async with slots:
+                response = await client.post("/api/auth/login", data={"username": "admin", "password": password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        background = [asyncio.create_task(ticker()), asyncio.create_task(prober())]
+        await asyncio.sleep(0.2)
+        idle_lag = max(lags) if lags else 0.0
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*background)
+    return {"elapsed": elapsed, "statuses": statuses, "idle_lag": idle_lag, "lags": lags, "health": health}
+
+
+def report(mode: str, logins: int, result: dict):
+    elapsed, statuses, idle_lag = result["elapsed"], result["statuses"], result["idle_lag"]
+    lags, health = result["lags"], result["health"]
+    print(
+        f"{mode:<8} logins={logins} in {elapsed:6.2f}s  statuses={dict(sorted(statuses.items()))}\n"
+        f"         loop lag: idle max {idle_lag * 1000:7.2f} ms  p50 {statistics.median(lags) * 1000:7.2f} ms  "
+        f"p99 {percentile(lags, 0.99) * 1000:7.2f} ms  max {max(lags) * 1000:7.2f} ms\n"
+        f"         /health:  p50 {statistics.median(health) * 1000:7.2f} ms  "
+        f"p99 {percentile(health, 0.99) * 1000:7.2f} ms  max {max(health) * 1000:7.2f} ms  ({len(health)} probes)"
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["inline", "pool"], choices=["inline", "pool"])
+    parser.add_argument("--logins", type=int, default=40, help="登录请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时进行的登录请求数")
+    parser.add_argument("--tick", type=float, default=0.01, help="事件循环延迟的采样间隔（秒）")
+    args = parser.parse_args()
+
+    print(f"password hash workers={main.PASSWORD_HASH_WORKERS}, max pending={main.PASSWORD_HASH_MAX_PENDING}")
+    for mode in args.modes:
+        report(mode, args.logins, asyncio.run(run(mode, args.logins, args.concurrency, args.tick)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,160 @@
+"""
+/api/logs-analysis 基准与一致性校验
+
+把一份日志（NDJSON 文件，每行一条 /api/access-logs 返回的日志；不指定时按
+固定随机种子生成）依次写入 LogStore + LogAnalytics，然后与旧的逐条扫描
+实现对比结果并计时，结果不一致时退出码为 1。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_logs_analysis.py --records 20000 --capacity 1000
+    python benchmarks/bench_logs_analysis.py --fixture access_logs.ndjson
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from log_store import AccessLogRecord, LogStore  # noqa: E402
+from log_stats import LogAnalytics  # noqa: E402
+
+ATTACK_MESSAGES = ["SQL 注入攻击检测", "跨站脚本攻击检测", "命令注入攻击检测", "恶意文件上传检测"]
+
+
+def generate_fixture(records: int, now: float, seed: int = 42) -> list:
+    """生成最近两小时内的模拟日志，约 5% 为攻击"""
+    rng = random.Random(seed)
+    timestamps = sorted(now - rng.uniform(0, 7200) for _ in range(records))
+    logs = []
+    for ts in timestamps:
+        is_attack = rng.random() < 0.05
+        logs.append({
+            "timestamp": ts,
+            "ip": f"2001:db8::{rng.randrange(500):x}" if rng.random() < 0.3 else f"192.168.1.{rng.randrange(250)}",
+            "method": rng.choice(["GET", "GET", "GET", "POST", "PUT", "PROPFIND"]),
+            "path": "/",
+            "is_attack": is_attack,
+            "attack_message": rng.choice(ATTACK_MESSAGES) if is_attack else None,
+        })
+    return logs
+
+
+def load_fixture(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def to_record(log: dict) -> AccessLogRecord:
+    return AccessLogRecord(
+        timestamp=log["timestamp"],
+        ip=log["ip"],
+        is_ipv6=":" in log["ip"],
+        method=log.get("method", "GET"),
+        path=log.get("path", "/"),
+        is_attack=log.get("is_attack", False),
+        attack_message=log.get("attack_message"),
+    )
+
+
+def legacy_logs_analysis(access_logs: list, attack_logs: list, current_time: float, blacklist_size: int) -> dict:
+    """旧实现：每次调用扫描全部日志"""
+    attack_types = {}
+    for log in attack_logs:
+        attack_msg = log.get("attack_message", "Unknown")
+        if attack_msg:
+            attack_types[attack_msg] = attack_types.get(attack_msg, 0) + 1
+
+    ip_analysis = {
+        "total_ips": len(set(log["ip"] for log in access_logs)),
+        "attack_ips": len(set(log["ip"] for log in attack_logs)),
+        "blacklisted_ips": blacklist_size,
+    }
+
+    method_analysis = {}
+    for log in access_logs:
+        method = log.get("method", "Unknown")
+        method_analysis[method] = method_analysis.get(method, 0) + 1
+
+    time_trend = []
+    for i in range(60, 0, -1):
+        start_time = current_time - (i * 60)
+        end_time = current_time - ((i - 1) * 60)
+        requests_count = len([log for log in access_logs if start_time <= log["timestamp"] < end_time])
+        attacks_count = len([log for log in attack_logs if start_time <= log["timestamp"] < end_time])
+        time_trend.append({"timestamp": end_time, "requests": requests_count, "attacks": attacks_count})
+
+    status_analysis = {
+        "allowed": len([log for log in access_logs if log.get("status") == "allowed"]),
+        "blocked": len([log for log in access_logs if log.get("status") == "blocked"]),
+    }
+
+    return {
+        "attack_types": attack_types,
+        "ip_analysis": ip_analysis,
+        "method_analysis": method_analysis,
+        "time_trend": time_trend,
+        "status_analysis": status_analysis,
+        "total_logs": len(access_logs),
+        "total_attacks": len(attack_logs),
+    }
+
+
+def timed(func, repeat: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", help="NDJSON 日志文件")
+    parser.add_argument("--records", type=int, default=20000, help="生成的日志条数")
+    parser.add_argument("--capacity", type=int, default=1000, help="访问日志保留条数")
+    parser.add_argument("--attack-capacity", type=int, default=500, help="攻击日志保留条数")
+    parser.add_argument("--repeat", type=int, default=20, help="每种实现的调用次数")
+    args = parser.parse_args()
+
+    now = time.time()
+    logs = load_fixture(args.fixture) if args.fixture else generate_fixture(args.records, now)
+    if logs:
+        now = max(log["timestamp"] for log in logs) + 1
+
+    access_logs = LogStore(args.capacity)
+    attack_logs = LogStore(args.attack_capacity)
+    analytics = LogAnalytics()
+    for log in logs:
+        record = to_record(log)
+        evicted = access_logs.append(record)
+        analytics.add_access(record)
+        if evicted is not None:
+            analytics.remove_access(evicted)
+        if record.is_attack:
+            evicted = attack_logs.append(record)
+            analytics.add_attack(record)
+            if evicted is not None:
+                analytics.remove_attack(evicted)
+
+    # 新实现的时间窗口边界取整到秒，旧实现使用同一个时间点对比
+    aligned_now = float(math.floor(now) + 1)
+    legacy_access = [dict(r.to_dict()) for r in access_logs]
+    legacy_attack = [dict(r.to_dict()) for r in attack_logs]
+
+    expected, legacy_time = timed(lambda: legacy_logs_analysis(legacy_access, legacy_attack, aligned_now, 0), args.repeat)
+    actual, counter_time = timed(lambda: analytics.snapshot(now, 0), args.repeat)
+
+    print(f"records={len(logs)} retained={len(access_logs)} attacks_retained={len(attack_logs)}")
+    print(f"legacy scan     {legacy_time * 1000:8.3f} ms/call")
+    print(f"bucket counters {counter_time * 1000:8.3f} ms/call")
+    if expected != actual:
+        print("MISMATCH between legacy and incremental results")
+        sys.exit(1)
+    print("results match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+WAF 吞吐量和延迟基准套件：main.py 的 waf_middleware（进程内直接调用 ASGI 应用）和 basic_server.py（本机回环）
+
+流量由 traffic_corpus 生成：正常的 NAS 访问（WebDAV、媒体、管理接口）中混入 SQL 注入、XSS、命令注入等攻击。
+以基准场景（每个维度取第一个值）为起点，每次只改变一个维度：额外规则数、请求体大小、
+不同客户端地址数、内存日志容量。每个场景在新的进程中运行，统计每秒请求数、p50/p95/p99 延迟
+和内存（进程峰值 RSS、压测期间 RSS 的增长）。basic_server.py 的规则和日志容量不可配置，只测请求体和客户端数。
+
+结果写入 --output 指定的 JSON 文件，--compare 与之前保存的结果逐场景对比，便于比较不同提交。
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_suite.py --requests 5000 --output bench-results.json
+    python benchmarks/bench_suite.py --targets middleware --clients 1 10000 --compare bench-results.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import traffic_corpus  # noqa: E402
+
+WARMUP_REQUESTS = 200
+
+
+def percentile(samples: list, q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def memory_of(pid: int | str = "self") -> dict:
+    """进程当前和峰值 RSS（MB），读取 /proc，不支持的平台返回 None"""
+    usage = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key = "rss_mb" if line.startswith("VmRSS:") else "peak_rss_mb"
+                    usage[key] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
+
+
+def summarize(latencies: list, elapsed: float, statuses: dict, before: dict, after: dict) -> dict:
+    samples = sorted(latencies)
+    growth = None
+    if before["rss_mb"] is not None and after["rss_mb"] is not None:
+        growth = round(after["rss_mb"] - before["rss_mb"], 1)
+    return {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(len(samples) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(samples, 0.50) * 1000, 3),
+            "p95": round(percentile(samples, 0.95) * 1000, 3),
+            "p99": round(percentile(samples, 0.99) * 1000, 3),
+            "max": round(samples[-1] * 1000, 3),
+        },
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "memory": {"peak_rss_mb": after["peak_rss_mb"], "rss_growth_mb": growth},
+    }
+
+
+def build_corpus(scenario: dict, requests: int, attack_ratio: float, seed: int) -> tuple:
+    """(压测请求, 预热请求)，预热请求只有正常流量"""
+    body_size, clients = scenario["body_size"], scenario["clients"]
+    corpus = traffic_corpus.generate(requests, attack_ratio, body_size, clients, seed=seed)
+    warmup = traffic_corpus.generate(WARMUP_REQUESTS, 0.0, body_size, clients, seed=seed + 1)
+    return corpus, warmup
+
+
+def synthetic_rules(count: int) -> list:
+    # 与现有规则形式相近：字面量前缀加少量正则，正常流量不会命中
+    return [
+        rf"\bnas_probe_{i:05d}\b" if i % 3 == 0 else
+        rf"/admin{i:05d}/[a-z]+\.cgi" if i % 3 == 1 else
+        rf"\bbad_agent_{i:05d}/\d+"
+        for i in range(count)
+    ]
+
+
+# waf_middleware：在子进程中导入 main 并直接调用 ASGI 应用
+
+async def call_app(app, request) -> int:
+    body = request.body
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)] or [b""]
+    response_complete = asyncio.Event()
+    status = 0
+
+    async def receive():
+        if chunks:
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+        # 请求体已读完，与服务器一样在响应结束后才报告断开
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_complete.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": request.method,
+        "scheme": "http",
+        "path": urllib.parse.unquote(request.path),
+        "raw_path": request.path.encode("latin-1"),
+        "query_string": request.query.encode("latin-1"),
+        "root_path": "",
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in request.headers.items()],
+        "client": (request.client, 50000),
+        "server": ("nas.example.com", 80),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def drive_middleware(scenario: dict, corpus: list, warmup: list, concurrency: int) -> dict:
+    import main
+
+    await main.app.router.startup()
+    try:
+        if scenario["rules"]:
+            await main.reload_rules({**main.WAF_RULES, "benchmark": synthetic_rules(scenario["rules"])})
+        for request in warmup:
+            await call_app(main.app, request)
+        main.request_rate_limit.clear()
+
+        latencies = []
+        statuses = {}
+        pending = iter(corpus)
+
+        async def worker():
+            for request in pending:
+                start = time.perf_counter()
+                status = await call_app(main.app, request)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        before = memory_of()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        result = summarize(latencies, elapsed, statuses, before, memory_of())
+        result["rule_count"] = main.waf.rule_set.rule_count
+        return result
+    finally:
+        await main.app.router.shutdown()
+
+
+def run_middleware_child(spec: dict):
+    scenario = spec["scenario"]
+    corpus, warmup = build_corpus(scenario, spec["requests"], spec["attack_ratio"], spec["seed"])
+    result = asyncio.run(drive_middleware(scenario, corpus, warmup, spec["concurrency"]))
+    print(json.dumps(result))
+
+
+def bench_middleware(scenario: dict, args) -> dict:
+    env = dict(
+        os.environ,
+        # 不写日志数据库、不加载防护应用、不启用多 worker 同步，频率限制不影响正常流量
+        LOG_DB_PATH="", PROTECTED_APPS_PATH="", WAF_STATE_PATH="", PROXY_UPSTREAM="",
+        RATE_LIMIT_MAX_REQUESTS=str(10 ** 9),
+        ACCESS_LOG_CAPACITY=str(scenario["log_capacity"]),
+        ATTACK_LOG_CAPACITY=str(scenario["log_capacity"]),
+    )
+    spec = {"scenario": scenario, "requests": args.requests, "attack_ratio": args.attack_ratio,
+            "seed": args.seed, "concurrency": args.concurrency}
+    child = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if child.returncode != 0:
+        raise RuntimeError(f"middleware benchmark failed:\n{child.stderr}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+# basic_server.py：子进程中启动服务，通过回环地址的长连接发送请求
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def send_requests(port: int, requests: list, latencies: list, statuses: dict):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    for request in requests:
+        # basic_server.py 只处理 GET 和 POST：带请求体的请求按 POST 发送，其余按 GET 发送
+        method = "POST" if request.body else "GET"
+        headers = dict(request.headers, **{"x-forwarded-for": request.client})
+        start = time.perf_counter()
+        try:
+            conn.request(method, request.target, request.body or None, headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            status = 0
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    conn.close()
+
+
+def run_clients(port: int, requests: list, concurrency: int) -> tuple:
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=send_requests, args=(port, requests[i::concurrency], latencies[i], statuses[i]))
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    merged = {}
+    for chunk in statuses:
+        for status, count in chunk.items():
+            merged[status] = merged.get(status, 0) + count
+    return [x for chunk in latencies for x in chunk], time.perf_counter() - started, merged
+
+
+def bench_basic_server(scenario: dict, args) -> dict:
+    corpus, warmup = build_corpus(scenario, args.requests, args.attack_ratio, args.seed)
+    port = free_port()
+    env = dict(
+        os.environ, PORT=str(port), HOST="127.0.0.1", TOKEN_FILE="", RATE_LIMIT_MAX_REQUESTS=str(10 ** 9),
+        # 压测客户端通过 X-Forwarded-For 模拟不同的客户端地址
+        TRUSTED_PROXIES="127.0.0.1",
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, "basic_server.py")], cwd=tmp_dir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_ready(port)
+            run_clients(port, warmup, args.concurrency)
+            before = memory_of(server.pid)
+            latencies, elapsed, statuses = run_clients(port, corpus, args.concurrency)
+            return summarize(latencies, elapsed, statuses, before, memory_of(server.pid))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+# 场景、输出和对比
+
+TARGETS = {"middleware": bench_middleware, "basic_server": bench_basic_server}
+# basic_server.py 使用内置规则和固定的日志容量
+FIXED_DIMENSIONS = {"basic_server": ("rules", "log_capacity")}
+
+
+def scenario_name(scenario: dict) -> str:
+    return (f"rules+{scenario['rules']} body={scenario['body_size']} "
+            f"clients={scenario['clients']} logs={scenario['log_capacity']}")
+
+
+def scenarios(args) -> list:
+    """基准场景，以及每次只改变一个维度的场景"""
+    axes = {
+        "rules": args.rules,
+        "body_size": args.body_sizes,
+        "clients": args.clients,
+        "log_capacity": args.log_capacity,
+    }
+    baseline = {name: values[0] for name, values in axes.items()}
+    result = [("baseline", baseline)]
+    for name, values in axes.items():
+        for value in values[1:]:
+            result.append((name, dict(baseline, **{name: value})))
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(entry: dict):
+    latency, memory = entry["latency_ms"], entry["memory"]
+    peak = f"{memory['peak_rss_mb']:7.1f} MB" if memory["peak_rss_mb"] is not None else "      n/a"
+    growth = f"{memory['rss_growth_mb']:+6.1f} MB" if memory["rss_growth_mb"] is not None else "     n/a"
+    print(
+        f"{entry['target']:<13} {entry['name']:<45} {entry['req_per_s']:9.1f} req/s  "
+        f"p50 {latency['p50']:7.2f}  p95 {latency['p95']:7.2f}  p99 {latency['p99']:7.2f} ms  "
+        f"peak {peak} {growth}  {entry['statuses']}"
+    )
+
+
+def compare(results: list, path: str):
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)
+    old = {(r["target"], r["name"]): r for r in previous["results"]}
+    print(f"\ncompared with {path} (commit {previous['meta'].get('commit')}):")
+    for entry in results:
+        before = old.get((entry["target"], entry["name"]))
+        if before is None:
+            print(f"{entry['target']:<13} {entry['name']:<45} (not in previous run)")
+            continue
+        speedup = entry["req_per_s"] / before["req_per_s"] - 1
+        print(
+            f"{entry['target']:<13} {entry['name']:<45} {before['req_per_s']:9.1f} -> {entry['req_per_s']:9.1f} req/s "
+            f"({speedup:+.1%})  p99 {before['latency_ms']['p99']:7.2f} -> {entry['latency_ms']['p99']:7.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--requests", type=int, default=5000, help="每个场景的请求数")
+    parser.add_argument("--attack-ratio", type=float, default=0.05, help="攻击请求占比")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时进行的请求数")
+    parser.add_argument("--rules", type=int, nargs="+", default=[0, 500], help="在内置规则之外增加的规则数")
+    parser.add_argument("--body-sizes", type=int, nargs="+", default=[0, 4096, 65536], help="上传类请求的请求体字节数")
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 10000], help="正常流量的不同客户端地址数")
+    parser.add_argument("--log-capacity", type=int, nargs="+", default=[1000, 20000], help="内存中保留的日志条数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_middleware_child(json.loads(args.child))
+        return
+
+    print(f"{args.requests} requests per scenario, attack ratio {args.attack_ratio}, concurrency {args.concurrency}")
+    results = []
+    for target in args.targets:
+        for axis, scenario in scenarios(args):
+            if axis in FIXED_DIMENSIONS.get(target, ()):
+                continue
+            entry = {"target": target, "name": scenario_name(scenario), "scenario": scenario}
+            entry.update(TARGETS[target](scenario, args))
+            print_result(entry)
+            results.append(entry)
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        meta = {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests": args.requests,
+            "attack_ratio": args.attack_ratio,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
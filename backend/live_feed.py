@@ -0,0 +1,154 @@
+"""实时推送：新日志和统计变化通过一个共享的广播任务合并后推送给所有订阅者（Server-Sent Events）"""
+import asyncio
+import json
+from collections import deque
+
+
+class Subscriber:
+    """一个订阅者：有界队列，消费太慢时丢弃积压并通知客户端重新拉取"""
+
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message: bytes):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # 慢客户端不阻塞广播：清空积压，只留一条 resync 事件让客户端自行重新拉取
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(LiveFeed.encode("resync", {"dropped": self.dropped}))
+
+
+class LiveFeed:
+    """
+    实时事件广播
+
+    publish_log 只把记录追加到待发送列表（没有订阅者时什么也不做），
+    广播任务每 interval 秒把这段时间内的日志合并成一条消息，只编码一次，
+    再放入每个订阅者的队列；每 stats_interval 秒推送一次统计中发生变化的字段。
+    多 worker 模式下日志不由本进程推送，广播任务每次从 log_source 读取上次之后的新日志。
+    """
+
+    def __init__(self, interval: float = 0.5, stats_interval: float = 5.0, queue_size: int = 64, max_batch: int = 200):
+        self.interval = interval
+        self.stats_interval = stats_interval
+        self.queue_size = queue_size
+        self.max_batch = max_batch
+        self.subscribers = set()
+        self._pending = deque(maxlen=max_batch)
+        self._skipped = 0
+        self._last_stats = {}
+        self._stats_provider = None
+        self._log_source = None
+        self._log_after = None
+        self._task = None
+
+    @staticmethod
+    def encode(event: str, data) -> bytes:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish_log(self, seq: int, record):
+        if not self.subscribers:
+            return
+        if len(self._pending) == self.max_batch:
+            # 突发流量时只推送最新的 max_batch 条，其余的由客户端按需查询
+            self._skipped += 1
+        self._pending.append((seq, record))
+
+    def _broadcast(self, message: bytes):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(message)
+
+    def flush_logs(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, deque(maxlen=self.max_batch)
+        skipped, self._skipped = self._skipped, 0
+        self._broadcast(self.encode("logs", {
+            "logs": [{"seq": seq, **record.to_dict()} for seq, record in pending],
+            "skipped": skipped,
+        }))
+
+    async def poll_logs(self):
+        """
+        从 log_source(after, limit) 读取序号大于 after 的新日志
+
+        log_source 返回 (由旧到新的最新 limit 条 [(seq, record)], 最新序号)，序号连续递增；
+        after 为 None（刚有订阅者）时只取最新序号，从这之后开始推送。
+        """
+        records, last_seq = await self._log_source(self._log_after, self.max_batch)
+        if self._log_after is not None:
+            self._skipped += max(last_seq - self._log_after - len(records), 0)
+            for seq, record in records:
+                self.publish_log(seq, record)
+        self._log_after = last_seq
+
+    def flush_stats(self, stats: dict):
+        """只推送与上次相比发生变化的统计字段"""
+        delta = {k: v for k, v in stats.items() if self._last_stats.get(k) != v}
+        self._last_stats = stats
+        if delta and self.subscribers:
+            self._broadcast(self.encode("stats", delta))
+
+    async def run(self, stats_provider):
+        """广播循环，stats_provider 为返回当前统计（dict）的协程函数"""
+        elapsed = 0.0
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.subscribers:
+                self._pending.clear()
+                self._last_stats = {}
+                self._log_after = None
+                continue
+            if self._log_source is not None:
+                try:
+                    await self.poll_logs()
+                except Exception as e:
+                    print(f"Error reading live logs: {e}")
+            self.flush_logs()
+            elapsed += self.interval
+            if elapsed >= self.stats_interval:
+                elapsed = 0.0
+                self.flush_stats(await stats_provider())
+
+    def start(self, stats_provider, log_source=None):
+        self._stats_provider = stats_provider
+        self._log_source = log_source
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(stats_provider))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stream(self, heartbeat: float = 15.0):
+        """单个客户端的 SSE 数据流，连接后先推送一次完整统计"""
+        subscriber = self.subscribe()
+        try:
+            if self._stats_provider is not None:
+                yield self.encode("stats", await self._stats_provider())
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # 注释行作为心跳，保持连接并及时发现断开的客户端
+                    message = b": ping\n\n"
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
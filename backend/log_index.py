@@ -0,0 +1,184 @@
+"""访问日志二级索引：按 IP、攻击类型、请求方法、状态、路径首段索引日志序号，支持游标分页查询"""
+from bisect import bisect_left
+
+from log_store import LogStore
+
+
+class _SeqList:
+    """递增的序号列表，尾部追加、头部弹出均摊 O(1)，支持二分查找"""
+
+    __slots__ = ("items", "head")
+
+    def __init__(self):
+        self.items = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.items) - self.head
+
+    def append(self, seq: int):
+        self.items.append(seq)
+
+    def popleft(self):
+        self.head += 1
+        # 弹出的部分超过一半时再压缩，均摊 O(1)
+        if self.head > 32 and self.head * 2 > len(self.items):
+            del self.items[:self.head]
+            self.head = 0
+
+    def first(self):
+        return self.items[self.head] if len(self) else None
+
+    def range(self, start: int, end: int) -> tuple:
+        """返回 [start, end) 内序号在 items 中的下标区间"""
+        return bisect_left(self.items, start, self.head), bisect_left(self.items, end, self.head)
+
+
+def path_segment(path: str) -> str:
+    """路径的第一段，例如 /api/status -> /api"""
+    end = path.find("/", 1)
+    return path if end < 0 else path[:end]
+
+
+class LogIndex:
+    """
+    LogStore 的二级索引
+
+    每个索引键对应一个递增的序号列表；日志写入时追加到列表尾部，淘汰时
+    被淘汰的一定是最旧的记录，从列表头部弹出，索引与环形缓冲区保持同步。
+    查询时从最小的候选列表出发，由新到旧遍历，凑够 limit 条即停止，
+    耗时取决于结果数量而不是保留的日志总量。
+    """
+
+    FIELDS = ("ip", "attack_message", "method", "status", "segment")
+
+    def __init__(self, store: LogStore):
+        self.store = store
+        self._indexes = {field: {} for field in self.FIELDS}
+
+    @staticmethod
+    def _keys(record) -> dict:
+        return {
+            "ip": record.ip,
+            "attack_message": record.attack_message,
+            "method": record.method,
+            "status": record.status,
+            "segment": path_segment(record.path),
+        }
+
+    def add(self, seq: int, record):
+        for field, key in self._keys(record).items():
+            if key is None:
+                continue
+            index = self._indexes[field]
+            seqs = index.get(key)
+            if seqs is None:
+                seqs = index[key] = _SeqList()
+            seqs.append(seq)
+
+    def remove(self, seq: int, record):
+        for field, key in self._keys(record).items():
+            if key is None:
+                continue
+            index = self._indexes[field]
+            seqs = index.get(key)
+            if seqs is not None and seqs.first() == seq:
+                seqs.popleft()
+                if not seqs:
+                    del index[key]
+
+    def clear(self):
+        for index in self._indexes.values():
+            index.clear()
+
+    def _time_bound(self, timestamp: float) -> int:
+        """第一条时间戳 >= timestamp 的记录序号（日志按写入顺序即时间顺序排列）"""
+        lo, hi = self.store.first_seq, self.store.next_seq
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.store.get(mid).timestamp < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(
+        self,
+        limit: int = 100,
+        cursor: int | None = None,
+        ip: str | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        attack_type: str | None = None,
+        method: str | None = None,
+        status: str | None = None,
+        path_prefix: str | None = None,
+    ) -> tuple:
+        """
+        按条件查询，结果由新到旧排列
+
+        cursor 为上一页返回的 next_cursor，只返回序号小于它的记录；
+        返回 (记录列表 [(seq, record)], next_cursor)，没有更多结果时 next_cursor 为 None。
+        """
+        lo = self.store.first_seq if start is None else self._time_bound(start)
+        hi = self.store.next_seq if end is None else self._time_bound(end)
+        if cursor is not None:
+            hi = min(hi, cursor)
+        lo = max(lo, self.store.first_seq)
+        if limit <= 0 or lo >= hi:
+            return [], None
+
+        filters = {}
+        if ip is not None:
+            filters["ip"] = ip
+        if attack_type is not None:
+            filters["attack_message"] = attack_type
+        if method is not None:
+            filters["method"] = method.upper()
+        if status is not None:
+            filters["status"] = status
+        if path_prefix is not None and path_prefix.find("/", 1) > 0:
+            # 前缀包含完整的第一段时才能用路径索引缩小范围
+            filters["segment"] = path_segment(path_prefix)
+
+        # 从候选最少的索引出发
+        candidates = None
+        for field, key in filters.items():
+            seqs = self._indexes[field].get(key)
+            if seqs is None:
+                return [], None
+            if candidates is None or len(seqs) < len(candidates):
+                candidates = seqs
+
+        if candidates is None:
+            positions = range(hi - 1, lo - 1, -1)
+            seq_at = None
+        else:
+            first, last = candidates.range(lo, hi)
+            positions = range(last - 1, first - 1, -1)
+            seq_at = candidates.items
+
+        results = []
+        for position in positions:
+            seq = position if seq_at is None else seq_at[position]
+            record = self.store.get(seq)
+            if record is None:
+                continue
+            if ip is not None and record.ip != ip:
+                continue
+            if attack_type is not None and record.attack_message != attack_type:
+                continue
+            if method is not None and record.method != filters["method"]:
+                continue
+            if status is not None and record.status != status:
+                continue
+            if path_prefix is not None and not record.path.startswith(path_prefix):
+                continue
+            if start is not None and record.timestamp < start:
+                continue
+            if end is not None and record.timestamp >= end:
+                continue
+            results.append((seq, record))
+            if len(results) == limit:
+                return results, seq
+        return results, None
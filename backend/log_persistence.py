@@ -0,0 +1,281 @@
+"""日志持久化：SQLite（WAL 模式），请求路径只入队，后台线程批量写入"""
+import queue
+import sqlite3
+import threading
+
+from log_store import AccessLogRecord
+
+_COLUMNS = (
+    "timestamp",
+    "ip",
+    "is_ipv6",
+    "method",
+    "path",
+    "query_string",
+    "user_agent",
+    "content_type",
+    "accept",
+    "accept_language",
+    "accept_encoding",
+    "connection",
+    "is_attack",
+    "attack_message",
+    "is_blacklisted",
+    "request_count",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS access_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    ip TEXT NOT NULL,
+    is_ipv6 INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    query_string TEXT NOT NULL,
+    user_agent TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    accept TEXT NOT NULL,
+    accept_language TEXT NOT NULL,
+    accept_encoding TEXT NOT NULL,
+    connection TEXT NOT NULL,
+    is_attack INTEGER NOT NULL,
+    attack_message TEXT,
+    is_blacklisted INTEGER NOT NULL,
+    request_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_access_logs_timestamp ON access_logs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_access_logs_attack ON access_logs (is_attack, timestamp);
+CREATE INDEX IF NOT EXISTS idx_access_logs_ip ON access_logs (ip, id);
+"""
+
+_INSERT = f"INSERT INTO access_logs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})"
+
+_STOP = object()
+
+
+class LogPersistence:
+    """
+    访问日志持久化
+
+    submit 只把记录放入有界队列，后台线程每攒够 batch_size 条或每 flush_interval 秒
+    在一个事务里批量写入。表中最多保留 max_rows 条，超出后删除最旧的记录。
+    攻击日志就是 is_attack = 1 的访问日志，不单独存表。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_rows: int = 1000000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+        # 建表在启动时同步完成，之后的写入都在后台线程
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="log-persistence", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """写完队列中剩余的日志后停止后台线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, record: AccessLogRecord) -> bool:
+        """日志入队，返回是否入队成功
+
+        在事件循环中调用，不能等待：队列满时直接丢弃新日志并计数
+        """
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                batch = []
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                    if stopping or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: list):
+        try:
+            with conn:
+                conn.executemany(_INSERT, [tuple(getattr(r, c) for c in _COLUMNS) for r in batch])
+                if self.max_rows:
+                    last_id = self._last_id(conn)
+                    conn.execute("DELETE FROM access_logs WHERE id <= ?", (last_id - self.max_rows,))
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            # 写入失败只丢弃这一批，后台线程继续运行
+            self.dropped += len(batch)
+            print(f"Error writing logs: {e}")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def history(self, limit: int, before: float | None = None, attacks_only: bool = False) -> list:
+        """查询 before 时间之前最新的 limit 条日志，按从旧到新排列，返回 AccessLogRecord"""
+        if limit <= 0:
+            return []
+        conditions = []
+        params = []
+        if before is not None:
+            conditions.append("timestamp < ?")
+            params.append(before)
+        if attacks_only:
+            conditions.append("is_attack = 1")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM access_logs {where} ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return [self._record(row) for row in reversed(rows)]
+
+    def since(self, after_id: int, limit: int, attacks_only: bool = False) -> tuple:
+        """
+        id 大于 after_id 的日志中最新的 limit 条，按从旧到新排列
+
+        返回 (记录列表, 最大 id, 是否有更早的记录因 limit 被跳过)；多个进程共用同一个数据库时，
+        id 是所有进程共享的递增序号。
+        """
+        where = "WHERE id > ?" + (" AND is_attack = 1" if attacks_only else "")
+        sql = f"SELECT id, {', '.join(_COLUMNS)} FROM access_logs {where} ORDER BY id DESC LIMIT ?"
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, (after_id, max(limit, 0) + 1)).fetchall()
+            last_id = self._last_id(conn)
+        finally:
+            conn.close()
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        return [self._record(row[1:]) for row in reversed(rows)], last_id, truncated
+
+    def query(
+        self,
+        limit: int = 100,
+        cursor: int | None = None,
+        after: int | None = None,
+        ip: str | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        attack_type: str | None = None,
+        method: str | None = None,
+        status: str | None = None,
+        path_prefix: str | None = None,
+    ) -> tuple:
+        """
+        按条件查询，条件与 LogIndex.query 相同，序号为日志 id，结果由新到旧排列
+
+        cursor 只返回 id 小于它的记录，after 只返回 id 大于它的记录；
+        返回 (记录列表 [(id, record)], next_cursor)，没有更多结果时 next_cursor 为 None。
+        """
+        if limit <= 0 or status not in (None, "allowed", "blocked"):
+            return [], None
+        conditions = []
+        params = []
+        for condition, value in (
+            ("id < ?", cursor),
+            ("id > ?", after),
+            ("ip = ?", ip),
+            ("timestamp >= ?", start),
+            ("timestamp < ?", end),
+            ("attack_message = ?", attack_type),
+            ("method = ?", method.upper() if method is not None else None),
+            ("is_attack = ?", None if status is None else int(status == "blocked")),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if path_prefix is not None:
+            # 不用 LIKE，前缀中的 % 和 _ 按原样匹配
+            conditions.append("substr(path, 1, ?) = ?")
+            params.extend((len(path_prefix), path_prefix))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT id, {', '.join(_COLUMNS)} FROM access_logs {where} ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        results = [(row[0], self._record(row[1:])) for row in rows[:limit]]
+        return results, results[-1][0] if len(rows) > limit else None
+
+    def last_id(self) -> int:
+        """最新一条日志的 id，没有日志时为 0"""
+        conn = self._connect()
+        try:
+            return self._last_id(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _last_id(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT MAX(id) FROM access_logs").fetchone()[0] or 0
+
+    @staticmethod
+    def _record(row) -> AccessLogRecord:
+        values = dict(zip(_COLUMNS, row))
+        for flag in ("is_ipv6", "is_attack", "is_blacklisted"):
+            values[flag] = bool(values[flag])
+        return AccessLogRecord(**values)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
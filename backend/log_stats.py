@@ -0,0 +1,186 @@
+"""日志统计：随日志写入增量维护的计数器，统计接口只读计数器，不再扫描日志"""
+import math
+from collections import Counter
+
+# 时间趋势：最近 60 分钟，每分钟一个点
+TREND_POINTS = 60
+TREND_INTERVAL = 60
+
+
+class TimeBuckets:
+    """
+    按秒计数的环形桶
+
+    保留最近 span 秒，秒数 s 的计数位于 s % span；桶中记录所属的秒数，
+    过期的桶在下次写入同一位置时被覆盖。
+    """
+
+    def __init__(self, span: int):
+        self.span = span
+        self._seconds = [-1] * span
+        self._counts = [0] * span
+
+    def add(self, timestamp: float, delta: int = 1):
+        second = math.floor(timestamp)
+        index = second % self.span
+        if self._seconds[index] != second:
+            # 已经移出保留范围的旧记录无需再扣减
+            if delta < 0:
+                return
+            self._seconds[index] = second
+            self._counts[index] = 0
+        self._counts[index] += delta
+
+    def count(self, start: int, end: int) -> int:
+        """统计 [start, end) 秒内的记录数"""
+        total = 0
+        for second in range(max(start, end - self.span), end):
+            index = second % self.span
+            if self._seconds[index] == second:
+                total += self._counts[index]
+        return total
+
+
+class LogAnalytics:
+    """
+    /api/logs-analysis 使用的增量统计
+
+    日志写入时加计数，环形缓冲区淘汰记录时减计数，统计结果始终对应
+    当前保留的日志，与逐条扫描日志得到的结果一致。
+    """
+
+    def __init__(self):
+        span = TREND_POINTS * TREND_INTERVAL + TREND_INTERVAL
+        self.request_buckets = TimeBuckets(span)
+        self.attack_buckets = TimeBuckets(span)
+        self.methods = Counter()
+        self.statuses = Counter()
+        self.access_ips = Counter()
+        self.attack_ips = Counter()
+        self.attack_types = Counter()
+        self.total_logs = 0
+        self.total_attacks = 0
+
+    @staticmethod
+    def _decrement(counter: Counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def add_access(self, record):
+        self.total_logs += 1
+        self.request_buckets.add(record.timestamp)
+        self.methods[record.method] += 1
+        self.statuses[record.status] += 1
+        self.access_ips[record.ip] += 1
+
+    def remove_access(self, record):
+        self.total_logs -= 1
+        self.request_buckets.add(record.timestamp, -1)
+        self._decrement(self.methods, record.method)
+        self._decrement(self.statuses, record.status)
+        self._decrement(self.access_ips, record.ip)
+
+    def add_attack(self, record):
+        self.total_attacks += 1
+        self.attack_buckets.add(record.timestamp)
+        self.attack_ips[record.ip] += 1
+        if record.attack_message:
+            self.attack_types[record.attack_message] += 1
+
+    def remove_attack(self, record):
+        self.total_attacks -= 1
+        self.attack_buckets.add(record.timestamp, -1)
+        self._decrement(self.attack_ips, record.ip)
+        if record.attack_message:
+            self._decrement(self.attack_types, record.attack_message)
+
+    def time_trend(self, now: float) -> list:
+        """最近 60 分钟每分钟的请求数和攻击数，窗口边界取整到秒"""
+        end = math.floor(now) + 1
+        trend = []
+        for i in range(TREND_POINTS, 0, -1):
+            start_time = end - i * TREND_INTERVAL
+            end_time = start_time + TREND_INTERVAL
+            trend.append({
+                "timestamp": float(end_time),
+                "requests": self.request_buckets.count(start_time, end_time),
+                "attacks": self.attack_buckets.count(start_time, end_time),
+            })
+        return trend
+
+    def snapshot(self, now: float, blacklist_size: int) -> dict:
+        """生成 /api/logs-analysis 的返回内容"""
+        return {
+            "attack_types": dict(self.attack_types),
+            "ip_analysis": {
+                "total_ips": len(self.access_ips),
+                "attack_ips": len(self.attack_ips),
+                "blacklisted_ips": blacklist_size,
+            },
+            "method_analysis": dict(self.methods),
+            "time_trend": self.time_trend(now),
+            "status_analysis": {
+                "allowed": self.statuses["allowed"],
+                "blocked": self.statuses["blocked"],
+            },
+            "total_logs": self.total_logs,
+            "total_attacks": self.total_attacks,
+        }
+
+
+class TrafficStats:
+    """
+    /api/status 和 /api/ipv6-stats 使用的计数器
+
+    IPv4/IPv6 计数对应当前保留的访问日志；recent_attacks 为最近 recent_window
+    条访问日志中的攻击数，新记录进入窗口时加、最旧的一条移出窗口时减。
+    """
+
+    def __init__(self, recent_window: int):
+        self.recent_window = recent_window
+        self.total = 0
+        self.ipv6_count = 0
+        self.recent_attacks = 0
+
+    @property
+    def ipv4_count(self) -> int:
+        return self.total - self.ipv6_count
+
+    @property
+    def recent_accesses(self) -> int:
+        return min(self.total, self.recent_window)
+
+    def add_access(self, record, leaving=None):
+        """record 为新写入的记录，leaving 为因此移出最近窗口的记录"""
+        self.total += 1
+        if record.is_ipv6:
+            self.ipv6_count += 1
+        if record.is_attack:
+            self.recent_attacks += 1
+        if leaving is not None and leaving.is_attack:
+            self.recent_attacks -= 1
+
+    def remove_access(self, record):
+        """记录被环形缓冲区淘汰"""
+        self.total -= 1
+        if record.is_ipv6:
+            self.ipv6_count -= 1
+
+    def ipv6_stats(self) -> dict:
+        ipv6_percentage = (self.ipv6_count / self.total * 100) if self.total > 0 else 0
+        return {
+            "ipv6_count": self.ipv6_count,
+            "total_count": self.total,
+            "ipv6_percentage": round(ipv6_percentage, 2),
+        }
+
+    def status(self, total_attacks: int, blacklist_count: int) -> dict:
+        return {
+            "total_accesses": self.total,
+            "total_attacks": total_attacks,
+            "recent_accesses": self.recent_accesses,
+            "recent_attacks": self.recent_attacks,
+            "ipv6_stats": self.ipv6_stats(),
+            "blacklist_count": blacklist_count,
+        }
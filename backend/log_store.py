@@ -0,0 +1,149 @@
+"""访问日志存储：预分配的固定容量环形缓冲区"""
+import urllib.parse
+
+
+class AccessLogRecord:
+    """一条访问日志，使用 __slots__ 代替 dict 以减少每条记录的内存"""
+
+    __slots__ = (
+        "timestamp",
+        "ip",
+        "is_ipv6",
+        "method",
+        "path",
+        "query_string",
+        "user_agent",
+        "content_type",
+        "accept",
+        "accept_language",
+        "accept_encoding",
+        "connection",
+        "is_attack",
+        "attack_message",
+        "is_blacklisted",
+        "request_count",
+    )
+
+    def __init__(
+        self,
+        timestamp: float,
+        ip: str,
+        is_ipv6: bool,
+        method: str,
+        path: str,
+        query_string: str = "",
+        user_agent: str = "",
+        content_type: str = "",
+        accept: str = "",
+        accept_language: str = "",
+        accept_encoding: str = "",
+        connection: str = "",
+        is_attack: bool = False,
+        attack_message: str | None = None,
+        is_blacklisted: bool = False,
+        request_count: int = 0,
+    ):
+        self.timestamp = timestamp
+        self.ip = ip
+        self.is_ipv6 = is_ipv6
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.user_agent = user_agent
+        self.content_type = content_type
+        self.accept = accept
+        self.accept_language = accept_language
+        self.accept_encoding = accept_encoding
+        self.connection = connection
+        self.is_attack = is_attack
+        self.attack_message = attack_message
+        self.is_blacklisted = is_blacklisted
+        self.request_count = request_count
+
+    @property
+    def status(self) -> str:
+        return "blocked" if self.is_attack else "allowed"
+
+    def to_dict(self) -> dict:
+        """转换为接口返回的日志格式"""
+        return {
+            "timestamp": self.timestamp,
+            "ip": self.ip,
+            "is_ipv6": self.is_ipv6,
+            "method": self.method,
+            "path": self.path,
+            "query": dict(urllib.parse.parse_qsl(self.query_string, keep_blank_values=True)),
+            "user_agent": self.user_agent,
+            "content_type": self.content_type,
+            "accept": self.accept,
+            "accept_language": self.accept_language,
+            "accept_encoding": self.accept_encoding,
+            "connection": self.connection,
+            "is_attack": self.is_attack,
+            "attack_message": self.attack_message,
+            "is_blacklisted": self.is_blacklisted,
+            "request_count": self.request_count,
+            "status": self.status,
+        }
+
+
+class LogStore:
+    """
+    固定容量的环形缓冲区
+
+    追加为 O(1)，写满后覆盖最旧的记录；读取最新 k 条为 O(k)。
+    每条记录有一个单调递增的序号，序号 seq 的记录位于 seq % capacity。
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._buffer = [None] * capacity
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return min(self._next_seq, self.capacity)
+
+    def __iter__(self):
+        """从旧到新遍历全部记录"""
+        for seq in range(self.first_seq, self._next_seq):
+            yield self._buffer[seq % self.capacity]
+
+    @property
+    def first_seq(self) -> int:
+        """最旧一条记录的序号"""
+        return self._next_seq - len(self)
+
+    @property
+    def next_seq(self) -> int:
+        """下一条记录将使用的序号"""
+        return self._next_seq
+
+    def get(self, seq: int):
+        """按序号取记录，已淘汰或不存在时返回 None"""
+        if self.first_seq <= seq < self._next_seq:
+            return self._buffer[seq % self.capacity]
+        return None
+
+    def append(self, record):
+        """追加一条记录，返回被覆盖的旧记录（没有则返回 None）"""
+        index = self._next_seq % self.capacity
+        evicted = self._buffer[index]
+        self._buffer[index] = record
+        self._next_seq += 1
+        return evicted
+
+    def latest(self, limit: int) -> list:
+        """返回最新的 limit 条记录，按从旧到新排列"""
+        limit = min(max(limit, 0), len(self))
+        return [self._buffer[seq % self.capacity] for seq in range(self._next_seq - limit, self._next_seq)]
+
+    def since(self, seq: int, limit: int) -> list:
+        """返回序号 >= seq 的记录中最新的 limit 条，按从旧到新排列"""
+        start = max(seq, self._next_seq - max(limit, 0), self.first_seq)
+        return [self._buffer[s % self.capacity] for s in range(start, self._next_seq)]
+
+    def clear(self):
+        self._buffer = [None] * self.capacity
+        self._next_seq = 0
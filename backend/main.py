@@ -1,19 +1,40 @@
 import os
+import secrets
 import bcrypt
 
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
+import asyncio
 import time
-import ipaddress
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from rule_engine import RuleSet, RuleCompileError
+from log_store import AccessLogRecord, LogStore
+from log_stats import LogAnalytics, TrafficStats
+from rate_limiter import RateLimiter
+from ip_blacklist import IPBlacklist
+from log_persistence import LogPersistence
+from log_index import LogIndex
+from live_feed import LiveFeed
+from response_cache import ResponseCache
+from reverse_proxy import Upstream, forward
+from app_registry import AppRegistry
+from token_cache import VerifiedTokenCache
+from shared_state import SharedState, SharedBlacklist, SharedRateLimiter, SharedLogView
+from waf_core import (
+    WAF_RULES, WAF_RULE_TARGETS, WafCore, attack_message_for, inspects_body, is_multipart, parse_client, request_fields
+)
+
 # 加载环境变量
 load_dotenv()
 
@@ -49,12 +70,20 @@ def get_password_hash(password):
     hashed = bcrypt.hashpw(truncated_password.encode('utf-8'), bcrypt.gensalt())
     return hashed.decode('utf-8')
 
-# 默认用户：admin / admin123
+# 管理员账号：密码哈希从配置读取（bcrypt 格式），启动时不再计算哈希；
+# 默认值为 admin123 的哈希，生成新哈希：python -c "import bcrypt; print(bcrypt.hashpw(b'新密码', bcrypt.gensalt()).decode())"
+ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD_HASH = os.environ.get(
+    "ADMIN_PASSWORD_HASH", "$2b$12$uWopx1duuBiIvrZtFsNIcePd5BZfqFLgvnlrejkjgae6hE2G5pE4u"
+)
+if not ADMIN_PASSWORD_HASH.startswith(("$2a$", "$2b$", "$2y$")):
+    raise ValueError("ADMIN_PASSWORD_HASH must be a bcrypt hash")
+
 users_db = {
-    "admin": {
+    ADMIN_USERNAME: {
         "id": 1,
-        "username": "admin",
-        "password_hash": get_password_hash("admin123"),
+        "username": ADMIN_USERNAME,
+        "password_hash": ADMIN_PASSWORD_HASH,
         "role": "admin"
     }
 }
@@ -65,6 +94,17 @@ def get_user(db, username: str):
         user_dict = db[username]
         return UserInDB(**user_dict)
 
+# 用户对象缓存：users_db 运行期间不变，每个用户只构造一次 UserInDB
+user_cache = {}
+
+def get_cached_user(username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = get_user(users_db, username)
+        if user is not None:
+            user_cache[username] = user
+    return user
+
 # 验证密码
 def verify_password(plain_password, hashed_password):
     # 截断密码，确保不超过 72 字节（bcrypt 限制）
@@ -72,7 +112,24 @@ def verify_password(plain_password, hashed_password):
     # 使用 bcrypt 库直接验证密码
     return bcrypt.checkpw(truncated_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+# 密码校验在独立的有界线程池中执行（bcrypt 每次约 0.2~0.4 秒，在事件循环中直接调用会阻塞所有请求）；
+# 同时进行和排队的校验最多 PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING 个，超出直接返回 503
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "16"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
 
+async def check_password(plain_password, hashed_password) -> bool:
+    if password_slots.locked():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts, please retry later",
+            headers={"Retry-After": "1"},
+        )
+    async with password_slots:
+        return await asyncio.get_running_loop().run_in_executor(
+            password_executor, verify_password, plain_password, hashed_password
+        )
 
 # 创建访问令牌
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -81,10 +138,15 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti 保证同一秒内重复登录得到不同的 token，注销一个不会影响另一个
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(8)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# 已校验 token 的缓存（监控面板频繁轮询时跳过重复的 JWT 解码和签名校验），注销的 token 记入撤销列表
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "1024"))
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE)
+
 # 获取当前用户
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -92,15 +154,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    key = token_cache.key(token)
+    username = token_cache.get(key)
+    if username is None:
+        if token_cache.is_revoked(key):
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = get_user(users_db, username=token_data.username)
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username)
+        except JWTError:
+            raise credentials_exception
+        # 没有 exp 的 token 不缓存
+        if isinstance(payload.get("exp"), (int, float)):
+            token_cache.put(key, token_data.username, payload["exp"])
+    user = get_cached_user(username)
     if user is None:
         raise credentials_exception
     return user
@@ -122,198 +192,221 @@ app.add_middleware(
 )
 
 # 存储访问日志和攻击记录
-access_logs = []
-attack_logs = []
-
-# IP 黑名单
-ip_blacklist = set()
-
-# 请求频率限制（IP 地址 -> 请求时间列表）
-request_rate_limit = {}
+ACCESS_LOG_CAPACITY = int(os.environ.get("ACCESS_LOG_CAPACITY", "1000"))  # 访问日志保留条数
+ATTACK_LOG_CAPACITY = int(os.environ.get("ATTACK_LOG_CAPACITY", "500"))  # 攻击日志保留条数
+access_logs = LogStore(ACCESS_LOG_CAPACITY)
+attack_logs = LogStore(ATTACK_LOG_CAPACITY)
+
+# 日志持久化（SQLite 文件路径，设为空字符串则只保存在内存中）
+LOG_DB_PATH = os.environ.get("LOG_DB_PATH", "waf_logs.db")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))  # 待写入日志队列的容量，队列满时丢弃新日志
+LOG_DB_MAX_ROWS = int(os.environ.get("LOG_DB_MAX_ROWS", "1000000"))  # 数据库最多保留的日志条数
+log_persistence = LogPersistence(
+    LOG_DB_PATH,
+    queue_size=LOG_QUEUE_SIZE,
+    max_rows=LOG_DB_MAX_ROWS,
+) if LOG_DB_PATH else None
+
+# 日志分析计数器
+log_analytics = LogAnalytics()
+
+# 实时状态计数器（最近 60 条访问日志，不超过日志容量）
+RECENT_LOG_WINDOW = min(60, ACCESS_LOG_CAPACITY)
+traffic_stats = TrafficStats(RECENT_LOG_WINDOW)
+
+# 实时推送（新日志合并后每 0.5 秒推送一次，统计变化每 5 秒推送一次）
+live_feed = LiveFeed()
+
+# 聚合接口的响应缓存（状态版本变化或超过有效期时重新计算）
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "1"))
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL)
+
+# 访问日志二级索引（IP、攻击类型、方法、状态、路径）
+log_index = LogIndex(access_logs)
+
+# 写入访问日志，环形缓冲区写满后覆盖最旧的记录，同步更新统计和索引
+def log_access(record: AccessLogRecord):
+    seq = access_logs.next_seq
+    leaving = access_logs.get(seq - RECENT_LOG_WINDOW)
+    evicted = access_logs.append(record)
+    log_analytics.add_access(record)
+    traffic_stats.add_access(record, leaving)
+    log_index.add(seq, record)
+    if shared_logs is None:
+        # 多 worker 模式下实时推送从共享的日志数据库读取，包含所有 worker 的日志
+        live_feed.publish_log(seq, record)
+    if log_persistence is not None:
+        log_persistence.submit(record)
+    if evicted is not None:
+        log_analytics.remove_access(evicted)
+        traffic_stats.remove_access(evicted)
+        log_index.remove(seq - access_logs.capacity, evicted)
+
+# 写入攻击日志
+def log_attack(record: AccessLogRecord):
+    evicted = attack_logs.append(record)
+    log_analytics.add_attack(record)
+    if evicted is not None:
+        log_analytics.remove_attack(evicted)
+
+# 状态版本号：访问日志、攻击日志的序号和黑名单条目数，任何一项变化都说明统计可能已变化
+def state_version() -> str:
+    return f"{access_logs.next_seq}-{attack_logs.next_seq}-{len(ip_blacklist)}"
+
+# 监控面板轮询的只读接口：未命中规则时不写入访问日志，否则每次轮询都会改变统计，
+# 面板自身的请求也会挤占日志容量（设置 LOG_MONITORING_REQUESTS=1 恢复记录）
+MONITORING_PATHS = {
+    "/api/access-logs",
+    "/api/attack-logs",
+    "/api/logs/query",
+    "/api/ipv6-stats",
+    "/api/status",
+    "/api/logs-analysis",
+    "/api/live",
+    "/api/metrics",
+}
+LOG_MONITORING_REQUESTS = os.environ.get("LOG_MONITORING_REQUESTS", "").lower() in ("1", "true", "yes")
+
+# 多 worker 模式：设置 WAF_STATE_PATH（例如 waf_state.db）后，黑名单、频率限制计数、规则、频率限制配置和防护应用
+# 通过该 SQLite 文件在各 worker 之间同步（每 WAF_STATE_SYNC_INTERVAL 秒一次），
+# 统计、日志查询和实时推送改为读取共享的日志数据库
+WAF_STATE_PATH = os.environ.get("WAF_STATE_PATH", "")
+WAF_STATE_SYNC_INTERVAL = float(os.environ.get("WAF_STATE_SYNC_INTERVAL", "0.25"))
+shared_state = SharedState(WAF_STATE_PATH, WAF_STATE_SYNC_INTERVAL) if WAF_STATE_PATH else None
+shared_logs = SharedLogView(
+    log_persistence,
+    ACCESS_LOG_CAPACITY,
+    ATTACK_LOG_CAPACITY,
+    RECENT_LOG_WINDOW,
+) if shared_state is not None and log_persistence is not None else None
+
+# IP 黑名单（支持 CIDR；自动封禁 IPv6 时按该前缀长度封禁整个网段，128 表示只封单个地址）
+BLACKLIST_IPV6_PREFIX = int(os.environ.get("BLACKLIST_IPV6_PREFIX", "128"))
+# 自动封禁有效期（秒），重复封禁时按倍数递增，最长 BLACKLIST_MAX_TTL
+BLACKLIST_TTL = float(os.environ.get("BLACKLIST_TTL", "3600"))
+BLACKLIST_TTL_ESCALATION = float(os.environ.get("BLACKLIST_TTL_ESCALATION", "2"))
+BLACKLIST_MAX_TTL = float(os.environ.get("BLACKLIST_MAX_TTL", str(7 * 86400)))
+ip_blacklist = (SharedBlacklist if shared_state is not None else IPBlacklist)(
+    ipv6_auto_prefix=BLACKLIST_IPV6_PREFIX,
+    auto_ttl=BLACKLIST_TTL,
+    escalation=BLACKLIST_TTL_ESCALATION,
+    max_ttl=BLACKLIST_MAX_TTL,
+)
 
 # 频率限制配置
-RATE_LIMIT_WINDOW = 60  # 时间窗口（秒）
-RATE_LIMIT_MAX_REQUESTS = 100  # 时间窗口内最大请求数
-
-# WAF 规则
-WAF_RULES = {
-    "sql_injection": [
-        r"' OR 1=1--",
-        r"UNION SELECT",
-        r"DROP TABLE",
-        r"INSERT INTO",
-        r"UPDATE.*SET",
-        r"DELETE FROM",
-        r"CREATE TABLE",
-        r"ALTER TABLE",
-        r"TRUNCATE TABLE",
-        r"EXEC sp_",
-        r"xp_",
-        r"\bSELECT\b.*\bFROM\b",
-        r"\bWHERE\b.*\bOR\b",
-        r"\bAND\b.*\b1=1\b",
-    ],
-    "xss": [
-        r"<script",
-        r"javascript:",
-        r"onerror=",
-        r"onload=",
-        r"onclick=",
-        r"onmouseover=",
-        r"<iframe",
-        r"<object",
-        r"<embed",
-        r"<link",
-        r"<meta",
-        r"<img.*src=.*javascript:",
-        r"</script>",
-        r"eval\(",
-        r"document\.write",
-        r"window\.location",
-    ],
-    "command_injection": [
-        r";\s*",
-        r"\|\|\s*",
-        r"\&\&\s*",
-        r"`.*`",
-        r"\|\s*",
-        r"\<\s*",
-        r"\>\s*",
-        r"\|\s*grep\s*",
-        r"\|\s*awk\s*",
-        r"\|\s*sed\s*",
-        r"\|\s*sort\s*",
-        r"\|\s*uniq\s*",
-        r"\|\s*wc\s*",
-        r"\|\s*cat\s*",
-        r"\|\s*tac\s*",
-        r"\|\s*head\s*",
-        r"\|\s*tail\s*",
-    ],
-    "csrf": [
-        r"\bcsrf\b",
-        r"\bcross-site\b",
-        r"\brequest forgery\b",
-    ],
-    "file_upload": [
-        r"\.php$",
-        r"\.asp$",
-        r"\.aspx$",
-        r"\.jsp$",
-        r"\.jspx$",
-        r"\.exe$",
-        r"\.sh$",
-        r"\.bat$",
-        r"\.cmd$",
-        r"\.py$",
-        r"\.pl$",
-        r"\.perl$",
-        r"\.cgi$",
-        r"\.js$",
-        r"\.vbs$",
-        r"\.ps1$",
-    ],
-    "sensitive_info": [
-        r"\bpassword\b",
-        r"\bpasswd\b",
-        r"\bsecret\b",
-        r"\btoken\b",
-        r"\bapi_key\b",
-        r"\bapi_secret\b",
-        r"\bauth\b",
-        r"\bcookie\b",
-        r"\bsession\b",
-        r"\bcredit_card\b",
-        r"\bssn\b",
-        r"\bsocial_security\b",
-        r"\bprivate\b",
-        r"\bconfidential\b",
-    ],
-    "brute_force": [
-        r"\blogin\b",
-        r"\bauthenticate\b",
-        r"\bsignin\b",
-        r"\bpassword\b",
-        r"\bpasswd\b",
-    ],
-    "abnormal_request": [
-        r"\bnull\b",
-        r"\bundefined\b",
-        r"\binfinity\b",
-        r"\bNaN\b",
-        r"\bInfinity\b",
-        r"\bundefined\b",
-        r"\bnull\b",
-    ],
-}
+RATE_LIMIT_WINDOW = int(os.environ.get("RATE_LIMIT_WINDOW", "60"))  # 时间窗口（秒）
+RATE_LIMIT_MAX_REQUESTS = int(os.environ.get("RATE_LIMIT_MAX_REQUESTS", "100"))  # 时间窗口内最大请求数
+RATE_LIMIT_ALGORITHM = os.environ.get("RATE_LIMIT_ALGORITHM", "sliding_window")  # sliding_window 或 token_bucket
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", "100000"))  # 最多跟踪的客户端数
+
+# 请求频率限制（每个 IP 固定大小的状态，空闲客户端自动淘汰）
+request_rate_limit = (SharedRateLimiter if shared_state is not None else RateLimiter)(
+    RATE_LIMIT_MAX_REQUESTS,
+    RATE_LIMIT_WINDOW,
+    algorithm=RATE_LIMIT_ALGORITHM,
+    max_clients=RATE_LIMIT_MAX_CLIENTS,
+)
 
-# 检查请求是否包含攻击特征
-async def check_waf_rules(request: Request) -> tuple[bool, str]:
-    # 检查请求路径
-    path = request.url.path
+# 请求体检查配置
+BODY_INSPECT_MAX_BYTES = int(os.environ.get("BODY_INSPECT_MAX_BYTES", str(1024 * 1024)))  # 最多检查的请求体字节数
+BODY_INSPECT_OVERLAP = int(os.environ.get("BODY_INSPECT_OVERLAP", "256"))  # 相邻分块的重叠字符数
+BODY_INSPECT_INLINE_BYTES = 4096  # 不超过这个大小的分块直接在事件循环中检查，更大的分块交给线程池
+
+# WAF 核心检查（与 basic_server.py 共用）：黑名单、频率限制和编译后的全局规则集。
+# 规则更新时在工作线程中编译新规则集，编译成功后整体替换 waf.rule_set 并递增版本号，
+# 已开始检查的请求继续使用旧规则集
+_compile_started = time.perf_counter()
+waf = WafCore(
+    RuleSet(WAF_RULES, WAF_RULE_TARGETS),
+    ip_blacklist,
+    request_rate_limit,
+    BODY_INSPECT_MAX_BYTES,
+    BODY_INSPECT_OVERLAP,
+)
+rules_status = {
+    "version": 1,
+    "loaded_at": time.time(),
+    "compile_ms": round((time.perf_counter() - _compile_started) * 1000, 2),
+    "rule_count": waf.rule_set.rule_count,
+}
+rules_reload_lock = asyncio.Lock()
+
+# 防护应用注册表（按域名和路径前缀路由到上游，保存在 PROTECTED_APPS_PATH，设为空则不保存）
+PROTECTED_APPS_PATH = os.environ.get("PROTECTED_APPS_PATH", "protected_apps.json")
+app_registry = AppRegistry(WAF_RULES, WAF_RULE_TARGETS, PROTECTED_APPS_PATH, base_engine=waf.rule_set)
+
+# 取出各检查目标并规范化，结果缓存在请求 scope 上，每个请求只计算一次
+def request_targets(request: Request, engine: RuleSet) -> dict:
+    fields = request.scope.get("waf.targets")
+    if fields is None:
+        raw_path = request.scope.get("raw_path") or request.url.path.encode("utf-8")
+        fields = request_fields(
+            engine, raw_path, request.scope.get("query_string", b""), request.headers, request.method
+        )
+        request.scope["waf.targets"] = fields
+    return fields
+
+# 检查请求是否包含攻击特征（路径、参数、请求头）
+def check_waf_rules(request: Request, engine: RuleSet) -> set:
+    return engine.match(request_targets(request, engine))
+
+# 流式检查请求体，返回命中的分类和供下游读取请求体的 receive
+async def inspect_request_body(request: Request, engine: RuleSet):
+    content_type = request.headers.get("content-type")
+    if not inspects_body(engine, content_type):
+        return set(), request.receive
     
-    # 检查请求参数
-    query_params = dict(request.query_params)
-    query_string = str(request.query_params)
+    scanner = waf.body_scanner(engine, is_multipart(content_type))
+    received = deque()
+    more_body = True
+    while more_body and not scanner.exhausted:
+        message = await request.receive()
+        received.append(message)
+        if message["type"] != "http.request":
+            break
+        # 大分块的正则匹配耗时数十毫秒，放到线程池中执行，避免阻塞其他请求
+        chunk = message.get("body", b"")
+        if len(chunk) > BODY_INSPECT_INLINE_BYTES:
+            await run_in_threadpool(scanner.feed, chunk)
+        else:
+            scanner.feed(chunk)
+        more_body = message.get("more_body", False)
     
-    # 检查请求头
-    headers = dict(request.headers)
-    headers_string = str(request.headers)
+    # 已读取的消息原样交给下游，剩余部分由下游继续从连接中读取，不再复制请求体
+    async def receive():
+        if received:
+            return received.popleft()
+        return await request.receive()
     
-    # 检查请求体
-    body_string = ""
+    return scanner.matched, receive
+
+# 管理员修改规则和防护应用的接口：请求体本身就包含攻击特征（规则正则、规则覆盖），
+# 携带有效登录状态时不检查请求体，避免管理员的修改被拦截、管理员被加入黑名单
+ADMIN_CONFIG_PATHS = ("/api/firewall/rules", "/api/protected-apps")
+
+async def is_admin_config_request(request: Request) -> bool:
+    if request.method != "POST" or not request.url.path.startswith(ADMIN_CONFIG_PATHS):
+        return False
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
     try:
-        # 仅检查文本类型的请求体
-        if request.headers.get("content-type", "").startswith("application/"):
-            body = await request.body()
-            body_string = body.decode("utf-8", errors="ignore")
-    except Exception:
-        pass
-    
-    # 合并所有要检查的内容
-    check_content = f"{path} {query_string} {headers_string} {body_string}"
-    
-    # 检查 SQL 注入
-    for rule in WAF_RULES["sql_injection"]:
-        if rule in check_content:
-            return True, f"SQL 注入攻击检测"
-    
-    # 检查 XSS
-    for rule in WAF_RULES["xss"]:
-        if rule in check_content:
-            return True, f"跨站脚本攻击检测"
-    
-    # 检查命令注入
-    for rule in WAF_RULES["command_injection"]:
-        if rule in check_content:
-            return True, f"命令注入攻击检测"
-    
-    # 检查 CSRF
-    for rule in WAF_RULES["csrf"]:
-        if rule in check_content:
-            return True, f"跨站请求伪造攻击检测"
-    
-    # 检查文件上传
-    for rule in WAF_RULES["file_upload"]:
-        if rule in check_content:
-            return True, f"恶意文件上传检测"
-    
-    # 检查敏感信息泄露
-    for rule in WAF_RULES["sensitive_info"]:
-        if rule in check_content:
-            return True, f"敏感信息泄露检测"
-    
-    # 检查暴力破解
-    for rule in WAF_RULES["brute_force"]:
-        if rule in check_content:
-            return True, f"暴力破解攻击检测"
-    
-    # 检查异常请求
-    for rule in WAF_RULES["abnormal_request"]:
-        if rule in check_content:
-            return True, f"异常请求检测"
-    
-    return False, ""
+        await get_current_user(token)
+    except HTTPException:
+        return False
+    return True
+
+# 反向代理模式：设置 PROXY_UPSTREAM（例如 http://192.168.31.10:5000）后，
+# 通过检查的请求转发到上游，WAF 自身的接口（WAF_LOCAL_PATHS 开头的路径）除外
+PROXY_UPSTREAM = os.environ.get("PROXY_UPSTREAM", "")
+WAF_LOCAL_PATHS = ("/api/", "/health")
+proxy_upstream = Upstream(
+    PROXY_UPSTREAM,
+    max_connections=int(os.environ.get("PROXY_MAX_CONNECTIONS", "100")),
+    max_keepalive=int(os.environ.get("PROXY_MAX_KEEPALIVE", "20")),
+    connect_timeout=float(os.environ.get("PROXY_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.environ.get("PROXY_READ_TIMEOUT", "60")),
+) if PROXY_UPSTREAM else None
 
 # 中间件：请求拦截和监测
 @app.middleware("http")
@@ -322,194 +415,257 @@ async def waf_middleware(request: Request, call_next):
     client_ip = request.client.host
     
     # 检查是否为 IPv6 地址
-    is_ipv6 = False
-    try:
-        ip_obj = ipaddress.ip_address(client_ip)
-        is_ipv6 = isinstance(ip_obj, ipaddress.IPv6Address)
-    except ValueError:
-        pass
+    ip_obj, is_ipv6 = parse_client(client_ip)
     
-    # 检查 IP 黑名单
-    if client_ip in ip_blacklist:
+    # 检查 IP 黑名单（最长前缀匹配）和请求频率限制，超限的客户端加入黑名单
+    current_time = time.time()
+    verdict = waf.admit(client_ip, ip_obj, current_time)
+    if verdict is not None:
+        return JSONResponse(status_code=verdict.status, content=verdict.content)
+    
+    # 按域名和路径找到防护应用，未匹配的请求使用全局规则；已注册的域名上所有路径都属于防护应用，
+    # WAF 自身的接口（WAF_LOCAL_PATHS）只在没有注册应用的域名上提供
+    host = request.headers.get("host", "")
+    waf_local = request.url.path.startswith(WAF_LOCAL_PATHS) and not app_registry.has_host(host)
+    protected_app = None if waf_local else app_registry.route(host, request.url.path)
+    if protected_app is not None and not protected_app.running:
         return JSONResponse(
-            status_code=403,
-            content={
-                "detail": "Access denied: IP address is blacklisted",
-                "attack_type": "IP 黑名单拦截"
-            }
+            status_code=503,
+            content={"detail": "Application is stopped"}
         )
+    engine = protected_app.rule_set if protected_app is not None else waf.rule_set
     
-    # 检查请求频率限制
-    current_time = time.time()
-    if client_ip in request_rate_limit:
-        # 清理过期的请求时间
-        request_rate_limit[client_ip] = [t for t in request_rate_limit[client_ip] if current_time - t < RATE_LIMIT_WINDOW]
-        # 检查是否超过限制
-        if len(request_rate_limit[client_ip]) >= RATE_LIMIT_MAX_REQUESTS:
-            # 添加到黑名单
-            ip_blacklist.add(client_ip)
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "detail": "Too many requests: Rate limit exceeded",
-                    "attack_type": "请求频率限制"
-                }
-            )
-    else:
-        request_rate_limit[client_ip] = []
-    
-    # 记录请求时间
-    request_rate_limit[client_ip].append(current_time)
+    # 检查 WAF 规则：先查路径、参数和请求头，未命中再流式检查请求体（已取消防护的应用不检查）
+    matched = set()
+    if protected_app is None or protected_app.is_protected:
+        matched = check_waf_rules(request, engine)
+        if not matched and not (waf_local and await is_admin_config_request(request)):
+            body_matched, receive = await inspect_request_body(request, engine)
+            matched |= body_matched
+            request = Request(request.scope, receive=receive)
+    is_attack, attack_message = attack_message_for(matched, engine)
+    if protected_app is not None:
+        protected_app.requests_count += 1
+        protected_app.attacks_count += is_attack
     
-    # 检查 WAF 规则
-    is_attack, attack_message = await check_waf_rules(request)
+    # 监控面板的轮询请求不计入访问日志
+    if (
+        waf_local and not is_attack and not LOG_MONITORING_REQUESTS
+        and request.method == "GET" and request.url.path in MONITORING_PATHS
+    ):
+        return await call_next(request)
     
     # 记录访问日志
-    access_log = {
-        "timestamp": time.time(),
-        "ip": client_ip,
-        "is_ipv6": is_ipv6,
-        "method": request.method,
-        "path": request.url.path,
-        "query": dict(request.query_params),
-        "user_agent": request.headers.get("user-agent", ""),
-        "content_type": request.headers.get("content-type", ""),
-        "accept": request.headers.get("accept", ""),
-        "accept_language": request.headers.get("accept-language", ""),
-        "accept_encoding": request.headers.get("accept-encoding", ""),
-        "connection": request.headers.get("connection", ""),
-        "is_attack": is_attack,
-        "attack_message": attack_message if is_attack else None,
-        "is_blacklisted": client_ip in ip_blacklist,
-        "request_count": len(request_rate_limit.get(client_ip, [])),
-        "status": "blocked" if is_attack else "allowed"
-    }
-    access_logs.append(access_log)
-    
-    # 限制日志大小
-    if len(access_logs) > 1000:
-        access_logs.pop(0)
+    access_log = AccessLogRecord(
+        timestamp=time.time(),
+        ip=client_ip,
+        is_ipv6=is_ipv6,
+        method=request.method,
+        path=request.url.path,
+        query_string=request.url.query,
+        user_agent=request.headers.get("user-agent", ""),
+        content_type=request.headers.get("content-type", ""),
+        accept=request.headers.get("accept", ""),
+        accept_language=request.headers.get("accept-language", ""),
+        accept_encoding=request.headers.get("accept-encoding", ""),
+        connection=request.headers.get("connection", ""),
+        is_attack=is_attack,
+        attack_message=attack_message if is_attack else None,
+        is_blacklisted=ip_obj in ip_blacklist,
+        request_count=request_rate_limit.count(client_ip, current_time),
+    )
+    log_access(access_log)
     
     # 如果检测到攻击，记录并阻止
     if is_attack:
         # 添加到黑名单
-        ip_blacklist.add(client_ip)
+        verdict = waf.block(client_ip, attack_message)
         
         # 记录攻击日志
-        attack_logs.append(access_log)
-        if len(attack_logs) > 500:
-            attack_logs.pop(0)
+        log_attack(access_log)
         
-        return JSONResponse(
-            status_code=403,
-            content={
-                "detail": "访问被拒绝：检测到潜在攻击",
-                "attack_type": attack_message
-            }
-        )
+        return JSONResponse(status_code=verdict.status, content=verdict.content)
+    
+    # 转发到防护应用的上游，未注册的请求在反向代理模式下转发到默认上游
+    if protected_app is not None:
+        return await forward(request, protected_app.upstream, client_ip)
+    if proxy_upstream is not None and not waf_local:
+        return await forward(request, proxy_upstream, client_ip)
+    if not waf_local and request.url.path.startswith(WAF_LOCAL_PATHS):
+        # 已注册的域名上没有应用处理的 /api/ 路径，不交给 WAF 自身的接口
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
     
     # 继续处理请求
     response = await call_next(request)
     return response
 
-# API 接口：获取访问日志
+# 读取最新的 limit 条日志，内存中不足时从数据库补充更早的记录
+async def read_logs(store: LogStore, limit: int, attacks_only: bool) -> list:
+    logs = store.latest(limit)
+    older = limit - len(logs)
+    if older > 0 and log_persistence is not None:
+        before = logs[0].timestamp if logs else None
+        logs = await run_in_threadpool(log_persistence.history, older, before, attacks_only) + logs
+    return [log.to_dict() for log in logs]
+
+# 按序号增量读取日志：只返回序号 >= since 的最新 limit 条；
+# 中间有记录已被淘汰或超出 limit 时 truncated 为 true，客户端应重新全量拉取
+def read_logs_since(store: LogStore, since: int, limit: int) -> dict:
+    logs = store.since(since, limit)
+    return {
+        "logs": [log.to_dict() for log in logs],
+        "total": len(store),
+        "next_since": store.next_seq,
+        "truncated": store.next_seq - since > len(logs),
+    }
+
+# 多 worker 模式下从共享的日志数据库读取，序号为数据库中的日志 id
+async def read_shared_logs(limit: int, since: int | None, attacks_only: bool) -> dict:
+    _, traffic, attack_total, _ = await shared_logs.current()
+    logs, last_id, truncated = await run_in_threadpool(
+        log_persistence.since, max((since or 0) - 1, 0), limit, attacks_only
+    )
+    return {
+        "logs": [log.to_dict() for log in logs],
+        "total": attack_total if attacks_only else traffic.total,
+        "next_since": last_id + 1,
+        "truncated": since is not None and truncated,
+    }
+
+# API 接口：获取访问日志（next_since 作为下次请求的 since 参数）
 @app.get("/api/access-logs")
-async def get_access_logs(limit: int = 100):
+async def get_access_logs(limit: int = 100, since: int | None = None):
+    # 单次最多返回 1000 条（负数在 SQLite 中表示不限制）
+    limit = min(max(limit, 0), 1000)
+    if shared_logs is not None:
+        return await read_shared_logs(limit, since, attacks_only=False)
+    if since is not None:
+        return read_logs_since(access_logs, since, limit)
     return {
-        "logs": access_logs[-limit:],
-        "total": len(access_logs)
+        "logs": await read_logs(access_logs, limit, attacks_only=False),
+        "total": len(access_logs),
+        "next_since": access_logs.next_seq
     }
 
 # API 接口：获取攻击日志
 @app.get("/api/attack-logs")
-async def get_attack_logs(limit: int = 100):
+async def get_attack_logs(limit: int = 100, since: int | None = None):
+    # 单次最多返回 1000 条（负数在 SQLite 中表示不限制）
+    limit = min(max(limit, 0), 1000)
+    if shared_logs is not None:
+        return await read_shared_logs(limit, since, attacks_only=True)
+    if since is not None:
+        return read_logs_since(attack_logs, since, limit)
     return {
-        "logs": attack_logs[-limit:],
-        "total": len(attack_logs)
+        "logs": await read_logs(attack_logs, limit, attacks_only=True),
+        "total": len(attack_logs),
+        "next_since": attack_logs.next_seq
     }
 
-# API 接口：获取 IPv6 统计
-@app.get("/api/ipv6-stats")
-async def get_ipv6_stats():
-    ipv6_count = sum(1 for log in access_logs if log["is_ipv6"])
-    total_count = len(access_logs)
-    ipv6_percentage = (ipv6_count / total_count * 100) if total_count > 0 else 0
-    
+# API 接口：按条件查询访问日志，结果由新到旧，next_cursor 用于获取下一页
+@app.get("/api/logs/query")
+async def query_logs(
+    limit: int = 100,
+    cursor: int | None = None,
+    ip: str | None = None,
+    start: float | None = None,
+    end: float | None = None,
+    attack_type: str | None = None,
+    method: str | None = None,
+    status: str | None = None,
+    path_prefix: str | None = None
+):
+    conditions = dict(
+        limit=min(limit, 1000),
+        cursor=cursor,
+        ip=ip,
+        start=start,
+        end=end,
+        attack_type=attack_type,
+        method=method,
+        status=status,
+        path_prefix=path_prefix,
+    )
+    if shared_logs is not None:
+        # 多 worker 模式下查询共享的日志数据库，序号和游标为数据库中的日志 id
+        results, next_cursor = await run_in_threadpool(log_persistence.query, **conditions)
+    else:
+        results, next_cursor = log_index.query(**conditions)
     return {
-        "ipv6_count": ipv6_count,
-        "total_count": total_count,
-        "ipv6_percentage": round(ipv6_percentage, 2)
+        "logs": [{"seq": seq, **log.to_dict()} for seq, log in results],
+        "next_cursor": next_cursor
     }
 
+# API 接口：实时事件流（Server-Sent Events），推送新日志（logs）和统计变化（stats）
+@app.get("/api/live")
+async def live_events():
+    return StreamingResponse(
+        live_feed.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 缓存的聚合接口响应：If-None-Match 与当前 ETag 一致时直接返回 304，
+# 否则返回缓存中编码好的 JSON，版本变化时才重新计算
+async def cached_response(request: Request, key: str, version: str, build) -> Response:
+    etag = f'"{key}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    body = await response_cache.get(key, version, build)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# 统计接口使用的计数器，返回 (LogAnalytics, TrafficStats, 攻击日志条数, 状态版本)；
+# 多 worker 模式下由共享日志数据库中最近保留的日志计算
+async def dashboard_state() -> tuple:
+    if shared_logs is None:
+        return log_analytics, traffic_stats, len(attack_logs), state_version()
+    analytics, traffic, attack_total, last_id = await shared_logs.current()
+    return analytics, traffic, attack_total, f"db{last_id}-{len(ip_blacklist)}"
+
+# API 接口：获取 IPv6 统计
+@app.get("/api/ipv6-stats")
+async def get_ipv6_stats(request: Request):
+    _, traffic, _, version = await dashboard_state()
+    return await cached_response(request, "ipv6", version, traffic.ipv6_stats)
+
 # API 接口：获取实时状态
 @app.get("/api/status")
-async def get_status():
-    recent_logs = access_logs[-60:]  # 最近 60 条记录
-    recent_attacks = [log for log in recent_logs if log["is_attack"]]
-    
-    return {
-        "total_accesses": len(access_logs),
-        "total_attacks": len(attack_logs),
-        "recent_accesses": len(recent_logs),
-        "recent_attacks": len(recent_attacks),
-        "ipv6_stats": await get_ipv6_stats(),
-        "blacklist_count": len(ip_blacklist)
-    }
+async def get_status(request: Request):
+    _, traffic, attack_total, version = await dashboard_state()
+    return await cached_response(
+        request,
+        "status",
+        version,
+        lambda: traffic.status(attack_total, len(ip_blacklist))
+    )
 
 # API 接口：获取日志分析
 @app.get("/api/logs-analysis")
-async def get_logs_analysis():
-    # 攻击类型分布
-    attack_types = {}
-    for log in attack_logs:
-        attack_msg = log.get("attack_message", "Unknown")
-        if attack_msg:
-            attack_types[attack_msg] = attack_types.get(attack_msg, 0) + 1
-    
-    # IP 地址分析
-    ip_analysis = {
-        "total_ips": len(set(log["ip"] for log in access_logs)),
-        "attack_ips": len(set(log["ip"] for log in attack_logs)),
-        "blacklisted_ips": len(ip_blacklist)
-    }
-    
-    # 请求方法分析
-    method_analysis = {}
-    for log in access_logs:
-        method = log.get("method", "Unknown")
-        method_analysis[method] = method_analysis.get(method, 0) + 1
-    
-    # 时间趋势分析（最近 60 分钟）
-    time_trend = []
-    current_time = time.time()
-    for i in range(60, 0, -1):
-        start_time = current_time - (i * 60)
-        end_time = current_time - ((i - 1) * 60)
-        
-        # 统计该时间段内的请求数和攻击数
-        requests_count = len([log for log in access_logs if start_time <= log["timestamp"] < end_time])
-        attacks_count = len([log for log in attack_logs if start_time <= log["timestamp"] < end_time])
-        
-        time_trend.append({
-            "timestamp": end_time,
-            "requests": requests_count,
-            "attacks": attacks_count
-        })
-    
-    # 状态分布
-    status_analysis = {
-        "allowed": len([log for log in access_logs if log.get("status") == "allowed"]),
-        "blocked": len([log for log in access_logs if log.get("status") == "blocked"])
-    }
-    
+async def get_logs_analysis(request: Request):
+    # 计数器随日志写入和淘汰增量维护，这里只读取计数器；时间趋势按秒变化，版本中包含当前秒
+    now = time.time()
+    analytics, _, _, version = await dashboard_state()
+    return await cached_response(
+        request,
+        "analysis",
+        f"{version}-{int(now)}",
+        lambda: analytics.snapshot(now, len(ip_blacklist))
+    )
+
+# API 接口：运行指标（响应缓存命中率、日志持久化队列、多 worker 同步状态）
+@app.get("/api/metrics")
+async def get_metrics():
     return {
-        "attack_types": attack_types,
-        "ip_analysis": ip_analysis,
-        "method_analysis": method_analysis,
-        "time_trend": time_trend,
-        "status_analysis": status_analysis,
-        "total_logs": len(access_logs),
-        "total_attacks": len(attack_logs)
+        "response_cache": response_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "log_persistence": log_persistence.stats() if log_persistence is not None else None,
+        "shared_state": {
+            "path": shared_state.path,
+            "worker": shared_state.worker,
+            "versions": dict(shared_state.versions),
+        } if shared_state is not None else None
     }
 
 # 根路径
@@ -527,7 +683,7 @@ async def root():
 @app.post("/api/auth/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = get_user(users_db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await check_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
@@ -547,9 +703,15 @@ async def get_current_user_info(current_user: UserInDB = Depends(get_current_use
 
 # 登出接口
 @app.post("/api/auth/logout")
-async def logout(current_user: UserInDB = Depends(get_current_user)):
-    # JWT 是无状态的，登出主要在前端处理（清除 token）
-    # 这里可以添加额外的逻辑，如将 token 加入黑名单等
+async def logout(token: str = Depends(oauth2_scheme), current_user: UserInDB = Depends(get_current_user)):
+    # JWT 是无状态的，注销的 token 记入撤销列表直到过期；前端同时清除 token
+    key = token_cache.key(token)
+    exp = jwt.get_unverified_claims(token).get("exp")
+    if not isinstance(exp, (int, float)):
+        exp = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    token_cache.revoke(key, exp)
+    if shared_state is not None:
+        await run_in_threadpool(shared_state.revoke_token, key, exp)
     return {"message": "Successfully logged out"}
 
 # API 接口：获取防火墙配置
@@ -557,11 +719,38 @@ async def logout(current_user: UserInDB = Depends(get_current_user)):
 async def get_firewall_config(current_user: UserInDB = Depends(get_current_user)):
     return {
         "waf_rules": WAF_RULES,
-        "rate_limit": {
-            "window": RATE_LIMIT_WINDOW,
-            "max_requests": RATE_LIMIT_MAX_REQUESTS
+        "rule_targets": waf.rule_set.targets,
+        "rate_limit": request_rate_limit.config(),
+        "blacklist": list(ip_blacklist),
+        "blacklist_entries": ip_blacklist.entries(),
+        "blacklist_ipv6_prefix": ip_blacklist.ipv6_auto_prefix,
+        "blacklist_ttl": {
+            "ttl": ip_blacklist.auto_ttl,
+            "escalation": ip_blacklist.escalation,
+            "max_ttl": ip_blacklist.max_ttl
         },
-        "blacklist": list(ip_blacklist)
+        "proxy_upstream": proxy_upstream.config() if proxy_upstream is not None else None,
+        "rules_status": rules_status
+    }
+
+# 编译全局规则集和所有防护应用的规则集（在工作线程中执行，不修改当前生效的规则）
+def compile_rules(rules: dict) -> tuple:
+    engine = RuleSet(rules, WAF_RULE_TARGETS)
+    return engine, app_registry.compile_all(rules, WAF_RULE_TARGETS, engine)
+
+# 编译并替换规则，编译失败抛出 RuleCompileError，当前规则保持不变；调用方需持有 rules_reload_lock
+async def reload_rules(new_rules: dict, version: int | None = None):
+    global WAF_RULES, rules_status
+    started = time.perf_counter()
+    new_engine, compiled = await run_in_threadpool(compile_rules, new_rules)
+    app_registry.apply_base_rules(new_rules, WAF_RULE_TARGETS, new_engine, compiled)
+    WAF_RULES = new_rules
+    waf.rule_set = new_engine
+    rules_status = {
+        "version": version if version is not None else rules_status["version"] + 1,
+        "loaded_at": time.time(),
+        "compile_ms": round((time.perf_counter() - started) * 1000, 2),
+        "rule_count": new_engine.rule_count,
     }
 
 # API 接口：更新防火墙规则
@@ -570,18 +759,34 @@ async def update_firewall_rules(
     rules: dict,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    global WAF_RULES
-    WAF_RULES.update(rules)
-    return {"message": "Firewall rules updated successfully", "rules": WAF_RULES}
+    # 同一时间只处理一次更新，保证版本号与规则的合并顺序一致
+    async with rules_reload_lock:
+        try:
+            await reload_rules({**WAF_RULES, **rules})
+        except RuleCompileError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rule: {e}")
+        if shared_state is not None:
+            # 多 worker 模式下使用共享的版本号，其他 worker 同步后使用相同的版本号
+            rules_status["version"] = await run_in_threadpool(
+                shared_state.publish, "rules", WAF_RULES, rules_status["version"]
+            )
+    return {"message": "Firewall rules updated successfully", "rules": WAF_RULES, "rules_status": rules_status}
 
 # API 接口：添加 IP 到黑名单
 @app.post("/api/firewall/blacklist/add")
 async def add_ip_to_blacklist(
     ip: str,
+    ttl: float | None = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    ip_blacklist.add(ip)
-    return {"message": f"IP {ip} added to blacklist successfully", "blacklist": list(ip_blacklist)}
+    # 支持单个地址和 CIDR 网段（如 2001:db8::/64）；ttl 为有效期（秒），不传则永久封禁
+    if ttl is not None and ttl <= 0:
+        raise HTTPException(status_code=400, detail="ttl must be positive")
+    try:
+        entry = ip_blacklist.add(str(IPBlacklist.parse(ip)), ttl=ttl)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid IP address or CIDR: {ip}")
+    return {"message": f"IP {entry} added to blacklist successfully", "blacklist": list(ip_blacklist)}
 
 # API 接口：从黑名单移除 IP
 @app.post("/api/firewall/blacklist/remove")
@@ -589,8 +794,7 @@ async def remove_ip_from_blacklist(
     ip: str,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    if ip in ip_blacklist:
-        ip_blacklist.remove(ip)
+    if ip_blacklist.remove(ip):
         return {"message": f"IP {ip} removed from blacklist successfully", "blacklist": list(ip_blacklist)}
     else:
         return {"message": f"IP {ip} not found in blacklist", "blacklist": list(ip_blacklist)}
@@ -610,18 +814,160 @@ async def update_rate_limit(
     current_user: UserInDB = Depends(get_current_user)
 ):
     global RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_REQUESTS
-    if "window" in config:
-        RATE_LIMIT_WINDOW = config["window"]
-    if "max_requests" in config:
-        RATE_LIMIT_MAX_REQUESTS = config["max_requests"]
+    try:
+        request_rate_limit.configure(
+            max_requests=config.get("max_requests"),
+            window=config.get("window"),
+            algorithm=config.get("algorithm"),
+            max_clients=config.get("max_clients"),
+            idle_ttl=config.get("idle_ttl"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    RATE_LIMIT_WINDOW = request_rate_limit.window
+    RATE_LIMIT_MAX_REQUESTS = request_rate_limit.max_requests
+    if shared_state is not None:
+        await run_in_threadpool(shared_state.publish, "rate_limit", {
+            "max_requests": request_rate_limit.max_requests,
+            "window": request_rate_limit.window,
+            "algorithm": request_rate_limit.algorithm,
+            "max_clients": request_rate_limit.max_clients,
+            "idle_ttl": request_rate_limit.idle_ttl,
+        })
     return {
         "message": "Rate limit configuration updated successfully",
-        "config": {
-            "window": RATE_LIMIT_WINDOW,
-            "max_requests": RATE_LIMIT_MAX_REQUESTS
-        }
+        "config": request_rate_limit.config()
     }
 
+# 多 worker 模式下发布防护应用的修改，其他 worker 同步后替换各自的注册表；
+# 在锁内读取当前列表，同一 worker 的多次修改按顺序发布
+protected_apps_lock = asyncio.Lock()
+
+async def publish_protected_apps():
+    if shared_state is None:
+        return
+    async with protected_apps_lock:
+        await run_in_threadpool(shared_state.publish, "protected_apps", app_registry.snapshot())
+
+# 防护应用：不存在时返回 404
+def get_protected_app(app_id: int):
+    protected_app = app_registry.get(app_id)
+    if protected_app is None:
+        raise HTTPException(status_code=404, detail="Protected app not found")
+    return protected_app
+
+# API 接口：获取防护应用列表
+@app.get("/api/protected-apps")
+async def list_protected_apps(current_user: UserInDB = Depends(get_current_user)):
+    return {"apps": [protected_app.to_dict() for protected_app in app_registry]}
+
+# API 接口：添加防护应用（host 为空表示不限域名，pathPrefix 默认为 /，ruleOverrides 按分类覆盖全局规则）
+@app.post("/api/protected-apps")
+async def add_protected_app(data: dict, current_user: UserInDB = Depends(get_current_user)):
+    try:
+        protected_app = app_registry.add(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid app: {e}")
+    await publish_protected_apps()
+    return {"message": "Protected app added successfully", "app": protected_app.to_dict()}
+
+# API 接口：获取防护应用详情
+@app.get("/api/protected-apps/{app_id}")
+async def get_protected_app_detail(app_id: int, current_user: UserInDB = Depends(get_current_user)):
+    return get_protected_app(app_id).to_dict()
+
+# API 接口：修改防护应用，action 为 toggle-protection / toggle-status 时切换防护或运行状态，否则按字段修改
+@app.post("/api/protected-apps/{app_id}")
+async def update_protected_app(app_id: int, data: dict, current_user: UserInDB = Depends(get_current_user)):
+    protected_app = get_protected_app(app_id)
+    action = data.pop("action", None)
+    if action == "toggle-status":
+        protected_app = app_registry.set_running(app_id, not protected_app.running)
+        await publish_protected_apps()
+        return {"message": "Protected app updated successfully", "app": protected_app.to_dict()}
+    if action == "toggle-protection":
+        data = {"isProtected": not protected_app.is_protected}
+    elif action is not None:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+    try:
+        protected_app, retired = app_registry.update(app_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid app: {e}")
+    if retired is not None:
+        await retired.close()
+    await publish_protected_apps()
+    return {"message": "Protected app updated successfully", "app": protected_app.to_dict()}
+
+# API 接口：删除防护应用
+@app.delete("/api/protected-apps/{app_id}")
+async def delete_protected_app(app_id: int, current_user: UserInDB = Depends(get_current_user)):
+    get_protected_app(app_id)
+    protected_app = app_registry.remove(app_id)
+    await protected_app.upstream.close()
+    await publish_protected_apps()
+    return {"message": "Protected app removed successfully"}
+
+# 应用其他 worker 修改的规则、频率限制配置和防护应用
+async def apply_shared_change(key: str, version: int, value):
+    global RATE_LIMIT_WINDOW, RATE_LIMIT_MAX_REQUESTS
+    if key == "rules":
+        async with rules_reload_lock:
+            try:
+                await reload_rules(value, version)
+            except RuleCompileError as e:
+                print(f"Error applying shared rules: {e}")
+    elif key == "revoked_tokens":
+        token_cache.load_revoked(value)
+    elif key == "rate_limit":
+        try:
+            request_rate_limit.configure(**value)
+        except ValueError as e:
+            print(f"Error applying shared rate limit: {e}")
+        RATE_LIMIT_WINDOW = request_rate_limit.window
+        RATE_LIMIT_MAX_REQUESTS = request_rate_limit.max_requests
+    elif key == "protected_apps":
+        try:
+            retired = app_registry.replace(value)
+        except (KeyError, ValueError) as e:
+            print(f"Error applying shared protected apps: {e}")
+            return
+        for upstream in retired:
+            await upstream.close()
+
+# 实时推送的统计，与 /api/status 相同
+async def live_status() -> dict:
+    _, traffic, attack_total, _ = await dashboard_state()
+    return traffic.status(attack_total, len(ip_blacklist))
+
+# 多 worker 模式下实时推送的日志来源：共享日志数据库中 id 大于 after 的最新 limit 条
+async def read_live_logs(after: int | None, limit: int) -> tuple:
+    if after is None:
+        return [], await run_in_threadpool(log_persistence.last_id)
+    results, _ = await run_in_threadpool(log_persistence.query, limit, after=after)
+    return results[::-1], results[0][0] if results else after
+
+# 启动和停止后台任务：日志持久化线程、实时推送广播、多 worker 状态同步
+@app.on_event("startup")
+async def start_background_tasks():
+    if log_persistence is not None:
+        log_persistence.start()
+    live_feed.start(live_status, read_live_logs if shared_logs is not None else None)
+    if shared_state is not None:
+        shared_state.start(ip_blacklist, request_rate_limit, apply_shared_change)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await live_feed.stop()
+    if shared_state is not None:
+        await shared_state.stop()
+    if proxy_upstream is not None:
+        await proxy_upstream.close()
+    for protected_app in app_registry:
+        await protected_app.upstream.close()
+    password_executor.shutdown(wait=False, cancel_futures=True)
+    if log_persistence is not None:
+        await run_in_threadpool(log_persistence.stop)
+
 # 健康检查
 @app.get("/health")
 async def health_check():
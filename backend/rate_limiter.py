@@ -0,0 +1,206 @@
+"""请求频率限制：每个客户端固定大小的状态，O(1) 更新，按 LRU/TTL 淘汰空闲客户端"""
+import math
+import time
+from collections import OrderedDict
+
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+ALGORITHMS = (SLIDING_WINDOW, TOKEN_BUCKET)
+MIN_WINDOW = 0.001
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class _WindowState:
+    """滑动窗口计数：当前窗口序号、当前窗口计数、上一窗口计数"""
+
+    __slots__ = ("window", "current", "previous", "last_seen")
+
+    def __init__(self, window: int, now: float):
+        self.window = window
+        self.current = 0
+        self.previous = 0
+        self.last_seen = now
+
+
+class _BucketState:
+    """令牌桶：剩余令牌数和上次补充时间"""
+
+    __slots__ = ("tokens", "updated", "last_seen")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.last_seen = now
+
+
+class RateLimiter:
+    """
+    频率限制器
+
+    sliding_window：按上一窗口计数和当前窗口已过去的比例估算最近 window 秒内的请求数；
+    token_bucket：容量为 max_requests，每 window 秒补满。
+    客户端按最近访问时间排成 LRU，空闲超过 idle_ttl 或总数超过 max_clients
+    时从最久未访问的一端淘汰，淘汰与每次请求一起进行，均摊 O(1)。
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window: float,
+        algorithm: str = SLIDING_WINDOW,
+        max_clients: int = 100000,
+        idle_ttl: float | None = None,
+    ):
+        self._clients = OrderedDict()
+        self.configure(max_requests, window, algorithm, max_clients, idle_ttl)
+
+    def configure(
+        self,
+        max_requests: int | None = None,
+        window: float | None = None,
+        algorithm: str | None = None,
+        max_clients: int | None = None,
+        idle_ttl: float | None = None,
+    ):
+        """更新配置，参数非法时抛出 ValueError；窗口或算法变化时清空已有状态"""
+        max_requests = getattr(self, "max_requests", None) if max_requests is None else max_requests
+        window = getattr(self, "window", None) if window is None else window
+        algorithm = getattr(self, "algorithm", SLIDING_WINDOW) if algorithm is None else algorithm
+        max_clients = getattr(self, "max_clients", None) if max_clients is None else max_clients
+
+        # bool 是 int 的子类，JSON 中的 true 不能当作 1
+        if not _is_int(max_requests) or max_requests <= 0:
+            raise ValueError("max_requests must be a positive integer")
+        if (
+            isinstance(window, bool) or not isinstance(window, (int, float))
+            or not math.isfinite(window) or window < MIN_WINDOW
+        ):
+            # JSON 解析接受 NaN 和 Infinity；NaN 或过小的窗口会让每个请求计算窗口序号时都抛出异常
+            raise ValueError(f"window must be a finite number of at least {MIN_WINDOW} seconds")
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+        if not _is_int(max_clients) or max_clients <= 0:
+            raise ValueError("max_clients must be a positive integer")
+        if idle_ttl is not None and (
+            isinstance(idle_ttl, bool) or not isinstance(idle_ttl, (int, float)) or not idle_ttl > 0
+        ):
+            # 非数值会让之后每个请求的淘汰都出错，负数会淘汰所有客户端、等于关闭限流
+            raise ValueError("idle_ttl must be a positive number")
+
+        if window != getattr(self, "window", None) or algorithm != getattr(self, "algorithm", None):
+            self._clients.clear()
+        self.max_requests = max_requests
+        self.window = window
+        self.algorithm = algorithm
+        self.max_clients = max_clients
+        if idle_ttl is not None:
+            self.idle_ttl = idle_ttl
+        elif not hasattr(self, "idle_ttl"):
+            self.idle_ttl = None
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, key) -> bool:
+        return key in self._clients
+
+    @property
+    def ttl(self) -> float:
+        if self.idle_ttl is not None:
+            return self.idle_ttl
+        # 滑动窗口的上一窗口计数在当前窗口结束前都有效，最后一次请求后要保留两个窗口；
+        # 令牌桶空闲一个窗口后已经补满，状态等同于新客户端
+        return 2 * self.window if self.algorithm == SLIDING_WINDOW else self.window
+
+    def _evict(self, now: float):
+        """从最久未访问的一端淘汰空闲客户端"""
+        deadline = now - self.ttl
+        clients = self._clients
+        while clients:
+            state = next(iter(clients.values()))
+            if state.last_seen > deadline:
+                break
+            clients.popitem(last=False)
+
+    def _state(self, key, now: float):
+        state = self._clients.get(key)
+        if state is None:
+            if len(self._clients) >= self.max_clients:
+                self._clients.popitem(last=False)
+            if self.algorithm == SLIDING_WINDOW:
+                state = _WindowState(math.floor(now / self.window), now)
+            else:
+                state = _BucketState(float(self.max_requests), now)
+            self._clients[key] = state
+        else:
+            self._clients.move_to_end(key)
+        state.last_seen = now
+        return state
+
+    def _roll(self, state: _WindowState, now: float):
+        window = math.floor(now / self.window)
+        if window != state.window:
+            state.previous = state.current if window == state.window + 1 else 0
+            state.current = 0
+            state.window = window
+
+    def _refill(self, state: _BucketState, now: float):
+        elapsed = now - state.updated
+        if elapsed > 0:
+            rate = self.max_requests / self.window
+            state.tokens = min(float(self.max_requests), state.tokens + elapsed * rate)
+            state.updated = now
+
+    def _estimate(self, state: _WindowState, now: float) -> float:
+        elapsed = now / self.window - state.window
+        return state.previous * max(0.0, 1.0 - elapsed) + state.current
+
+    def hit(self, key, now: float | None = None, extra: float = 0.0) -> bool:
+        """记录一次请求，返回是否允许；被拒绝的请求不计入。extra 为在别处（例如其他 worker）已计入的请求数"""
+        now = time.time() if now is None else now
+        self._evict(now)
+        state = self._state(key, now)
+        if self.algorithm == SLIDING_WINDOW:
+            self._roll(state, now)
+            if self._estimate(state, now) + extra >= self.max_requests:
+                return False
+            state.current += 1
+            return True
+        self._refill(state, now)
+        if state.tokens - extra < 1:
+            return False
+        state.tokens -= 1
+        return True
+
+    def count(self, key, now: float | None = None) -> int:
+        """最近一个窗口内的（估算）请求数"""
+        state = self._clients.get(key)
+        if state is None:
+            return 0
+        now = time.time() if now is None else now
+        if self.algorithm == SLIDING_WINDOW:
+            self._roll(state, now)
+            return math.ceil(self._estimate(state, now))
+        self._refill(state, now)
+        return self.max_requests - math.floor(state.tokens)
+
+    def remove(self, key):
+        self._clients.pop(key, None)
+
+    def clear(self):
+        self._clients.clear()
+
+    def config(self) -> dict:
+        return {
+            "window": self.window,
+            "max_requests": self.max_requests,
+            "algorithm": self.algorithm,
+            "max_clients": self.max_clients,
+            "idle_ttl": self.ttl,
+            "tracked_clients": len(self._clients),
+        }
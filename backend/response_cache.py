@@ -0,0 +1,91 @@
+"""响应缓存：按接口和参数缓存编码好的 JSON 字节，状态版本变化或超过有效期时重新计算"""
+import asyncio
+import inspect
+import json
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ("version", "body", "expires_at")
+
+    def __init__(self, version, body: bytes, expires_at: float):
+        self.version = version
+        self.body = body
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    聚合接口的响应缓存
+
+    get(key, version, build) 在缓存的版本与 version 一致且未超过 ttl 时直接返回缓存的字节；
+    否则调用 build 生成内容并编码一次。同一 key、同一版本的并发请求共享一次计算（single-flight），
+    后到的请求等待先到请求的结果。最多缓存 max_entries 个 key，超出时淘汰最久未使用的。
+    """
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    @staticmethod
+    def encode(content) -> bytes:
+        # 与 JSONResponse 的编码方式一致
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    async def get(self, key, version, build) -> bytes:
+        """build 返回可编码为 JSON 的内容，可以是普通函数或协程函数"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version and entry.expires_at > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.body
+
+        flight = self._inflight.get(key)
+        if flight is not None and flight[0] == version:
+            self.shared += 1
+            return await asyncio.shield(flight[1])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (version, future)
+        try:
+            content = build()
+            if inspect.isawaitable(content):
+                content = await content
+            body = self.encode(content)
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+
+        future.set_result(body)
+        self._entries[key] = _Entry(version, body, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.shared
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((self.hits + self.shared) / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+        }
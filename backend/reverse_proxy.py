@@ -0,0 +1,148 @@
+"""反向代理：把通过 WAF 检查的请求转发到上游服务，请求体和响应体均流式传输"""
+from urllib.parse import quote
+
+import httpx
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+
+# 逐跳头部，只对单个连接有效，不能转发
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# 由代理重新生成的请求头
+_REPLACED_HEADERS = {"host", "x-forwarded-for", "x-forwarded-host", "x-forwarded-proto", "x-real-ip"}
+
+
+class Upstream:
+    """
+    一个上游服务
+
+    每个上游有独立的连接池（keep-alive 复用连接）、连接数上限和超时；
+    连接池满时请求最多等待 pool_timeout 秒。transport 可以替换为
+    httpx.ASGITransport(app) 等，用本地应用代替真实上游。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        write_timeout: float = 60.0,
+        pool_timeout: float = 5.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        url = httpx.URL(url)
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ValueError("upstream url must be an absolute http(s) url")
+        self.url = url
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout)
+        self._transport = transport
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 第一次使用时创建，之后所有请求共用同一个连接池
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=self.timeout,
+                transport=self._transport,
+                follow_redirects=False,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def target(self, raw_path: bytes, query: bytes = b"") -> httpx.URL:
+        """上游地址：客户端发来的原始（未解码的）路径和查询字符串原样拼接到上游路径后面"""
+        base = self.url.raw_path.split(b"?", 1)[0].rstrip(b"/")
+        return self.url.copy_with(raw_path=base + raw_path + (b"?" + query if query else b""))
+
+    def config(self) -> dict:
+        return {
+            "url": str(self.url),
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "connect_timeout": self.timeout.connect,
+            "read_timeout": self.timeout.read,
+        }
+
+
+def forward_headers(request: Request, client_ip: str) -> list:
+    """转发给上游的请求头：去掉逐跳头部，补充 X-Forwarded-*"""
+    headers = [
+        (name, value)
+        for name, value in request.headers.items()
+        if name not in HOP_BY_HOP_HEADERS and name not in _REPLACED_HEADERS
+    ]
+    forwarded_for = request.headers.get("x-forwarded-for")
+    headers.append(("x-forwarded-for", f"{forwarded_for}, {client_ip}" if forwarded_for else client_ip))
+    headers.append(("x-forwarded-host", request.headers.get("host", "")))
+    headers.append(("x-forwarded-proto", request.url.scheme))
+    headers.append(("x-real-ip", client_ip))
+    return headers
+
+
+def raw_path(request: Request) -> bytes:
+    """请求的原始路径；解码后的路径会把 %2F 等变成 /，与上游看到的路径不一致"""
+    path = request.scope.get("raw_path")
+    if path:
+        return path.split(b"?", 1)[0]
+    return quote(request.url.path).encode("ascii")
+
+
+async def forward(request: Request, upstream: Upstream, client_ip: str):
+    """把请求转发到上游，返回流式响应；上游不可用或超时返回 502/503/504"""
+    has_body = request.method not in ("GET", "HEAD", "OPTIONS") or "content-length" in request.headers \
+        or "transfer-encoding" in request.headers
+    upstream_request = upstream.client.build_request(
+        request.method,
+        upstream.target(raw_path(request), request.scope.get("query_string", b"")),
+        headers=forward_headers(request, client_ip),
+        content=request.stream() if has_body else None,
+    )
+    try:
+        upstream_response = await upstream.client.send(upstream_request, stream=True)
+    except httpx.PoolTimeout:
+        return JSONResponse(status_code=503, content={"detail": "Upstream busy: connection limit reached"})
+    except httpx.TimeoutException:
+        return JSONResponse(status_code=504, content={"detail": "Upstream timeout"})
+    except httpx.HTTPError:
+        return JSONResponse(status_code=502, content={"detail": "Upstream unavailable"})
+
+    headers = [
+        (name, value)
+        for name, value in upstream_response.headers.multi_items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+    ]
+    response = StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(upstream_response.aclose),
+    )
+    # 保留上游的重复头部（例如多个 Set-Cookie），编码方式原样透传
+    response.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    return response
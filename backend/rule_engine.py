@@ -0,0 +1,259 @@
+"""WAF 规则引擎：把整套规则一次性编译成单个多模式匹配器"""
+import codecs
+import re
+import urllib.parse
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# 规则默认不区分大小写（SQL 关键字、HTML 标签都不区分大小写）
+DEFAULT_FLAGS = re.IGNORECASE
+
+# 检查目标：path（路径）、args（查询参数）、body（请求体）、header:<名称>（指定请求头）、
+# filename（上传的文件名：WebDAV 写入的目标文件名、multipart 请求体中的 filename）
+DEFAULT_TARGETS = ("path", "args", "body")
+FILENAME_TARGET = "filename"
+TARGETS = DEFAULT_TARGETS + (FILENAME_TARGET,)
+HEADER_TARGET_PREFIX = "header:"
+
+_WHITESPACE = re.compile(r"\s+")
+# multipart 各部分 Content-Disposition 中的文件名（filename="..." 或 filename*=...）
+_UPLOAD_FILENAME = re.compile(r'filename\*?\s*=\s*(?:"([^"\r\n]{0,1024})"|([^\s;"]{1,1024}))', re.IGNORECASE)
+
+
+def normalize(text: str) -> str:
+    """URL 解码、合并空白字符并转为小写，每个检查目标每个请求只做一次"""
+    if not text:
+        return ""
+    return _WHITESPACE.sub(" ", urllib.parse.unquote_plus(text)).lower()
+
+
+class RuleCompileError(ValueError):
+    """规则无法编译时抛出，message 中包含分类和出错的规则"""
+
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT} | (
+    {sre_parse.POSSESSIVE_REPEAT} if hasattr(sre_parse, "POSSESSIVE_REPEAT") else set()
+)
+_NEGATED_CATEGORIES = {
+    sre_parse.CATEGORY_NOT_DIGIT, sre_parse.CATEGORY_NOT_SPACE, sre_parse.CATEGORY_NOT_WORD,
+}
+
+
+def _is_wildcard(node) -> bool:
+    """node 是否几乎能匹配任意字符：.、[^...]、\S、\W、\D"""
+    if len(node) != 1:
+        return False
+    op, av = node[0]
+    if op is sre_parse.SUBPATTERN:
+        return _is_wildcard(av[-1])
+    if op in (sre_parse.ANY, sre_parse.NOT_LITERAL):
+        return True
+    if op is sre_parse.IN and av:
+        first_op, first_av = av[0]
+        return first_op is sre_parse.NEGATE or (
+            len(av) == 1 and first_op is sre_parse.CATEGORY and first_av in _NEGATED_CATEGORIES
+        )
+    return False
+
+
+def _has_unbounded_wildcard(node) -> bool:
+    for op, av in node:
+        if op in _REPEATS and av[1] == sre_parse.MAXREPEAT and _is_wildcard(av[2]):
+            return True
+        children = av if isinstance(av, (tuple, list)) else (av,)
+        for child in children:
+            nested = child if isinstance(child, list) else (child,)
+            if any(isinstance(c, sre_parse.SubPattern) and _has_unbounded_wildcard(c) for c in nested):
+                return True
+    return False
+
+
+def check_bounded(pattern: str, flags: int = DEFAULT_FLAGS):
+    """
+    拒绝无上限地重复通配字符的规则（.*、.+、[^>]*、\S+ 等）
+
+    这类规则在不匹配的长文本上回溯，耗时随长度成平方甚至立方增长，一个请求就能长时间占住事件循环；
+    应改成有上限的形式，例如 .{0,100}?。
+    """
+    if _has_unbounded_wildcard(sre_parse.parse(pattern, flags)):
+        raise re.error("unbounded wildcard repetition, use a bounded form such as .{0,100}?")
+
+
+class RuleEngine:
+    """
+    编译后的规则集
+
+    所有分类的规则合并成一个带命名分组的正则（每个分类一个分组），
+    正常流量只需对文本扫描一遍即可确认没有命中；命中后再用各分类
+    自己的正则补查其余分类，保证返回全部命中的分类。
+    """
+
+    def __init__(self, rules: dict, flags: int = DEFAULT_FLAGS):
+        self.categories = []
+        self._category_patterns = {}
+        self._group_names = {}
+
+        alternatives = []
+        for category, patterns in rules.items():
+            patterns = [p for p in dict.fromkeys(patterns or []) if p]
+            if not patterns:
+                continue
+            # 逐条编译，出错时能准确指出是哪条规则
+            for pattern in patterns:
+                try:
+                    re.compile(pattern, flags)
+                    check_bounded(pattern, flags)
+                except (re.error, TypeError) as e:
+                    raise RuleCompileError(f"{category}: {pattern!r}: {e}") from e
+
+            # 分类名可能不是合法的分组名，这里统一用序号命名
+            group = f"c{len(self.categories)}"
+            body = "|".join(f"(?:{p})" for p in patterns)
+            try:
+                self._category_patterns[category] = re.compile(body, flags)
+            except re.error as e:
+                raise RuleCompileError(f"{category}: {e}") from e
+            self._group_names[group] = category
+            self.categories.append(category)
+            alternatives.append(f"(?P<{group}>{body})")
+
+        self.rule_count = sum(len(set(p for p in (rules[c] or []) if p)) for c in self.categories)
+        try:
+            self._combined = re.compile("|".join(alternatives), flags) if alternatives else None
+        except re.error as e:
+            # 单条规则都能编译但合并失败（例如规则里自带同名分组）
+            raise RuleCompileError(str(e)) from e
+
+    def search(self, text: str) -> str | None:
+        """返回最先命中的分类（按文本位置），没有命中返回 None"""
+        if self._combined is None or not text:
+            return None
+        match = self._combined.search(text)
+        if match is None:
+            return None
+        return self._group_names[match.lastgroup]
+
+    def match(self, text: str) -> list:
+        """返回命中的全部分类，按规则集中的分类顺序排列"""
+        first = self.search(text)
+        if first is None:
+            return []
+        matched = {first}
+        for category in self.categories:
+            if category not in matched and self._category_patterns[category].search(text):
+                matched.add(category)
+        return [c for c in self.categories if c in matched]
+
+
+class StreamScanner:
+    """
+    分块扫描数据流
+
+    每块数据与上一块末尾的 overlap 个字符拼接后再匹配，跨块边界、
+    长度不超过 overlap 的特征仍能命中；累计检查超过 max_bytes 后不再扫描。
+    name_engine 不为空时（multipart 请求体）取出各部分的文件名，逐个用 name_engine 匹配；
+    engine 为 None 时只检查文件名。
+    """
+
+    def __init__(self, engine: RuleEngine | None, max_bytes: int, overlap: int = 256, normalizer=None,
+                 name_engine: RuleEngine | None = None):
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.overlap = overlap
+        self.normalizer = normalizer
+        self.name_engine = name_engine
+        self.inspected = 0
+        self.matched = set()
+        self._tail = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+
+    @property
+    def exhausted(self) -> bool:
+        return self.inspected >= self.max_bytes
+
+    def feed(self, chunk: bytes):
+        """扫描一块数据，超出上限的部分直接忽略"""
+        if self.exhausted or not chunk:
+            return
+        remaining = self.max_bytes - self.inspected
+        if len(chunk) > remaining:
+            chunk = memoryview(chunk)[:remaining]
+        self.inspected += len(chunk)
+
+        # 重叠部分保留原文，和新数据拼接后再规范化，避免 %xx 之类的编码被分块截断
+        window = self._tail + self._decoder.decode(chunk, final=self.exhausted)
+        if self.engine is not None:
+            text = self.normalizer(window) if self.normalizer else window
+            self.matched.update(self.engine.match(text))
+        if self.name_engine is not None:
+            for match in _UPLOAD_FILENAME.finditer(window):
+                self.matched.update(self.name_engine.match(normalize(match.group(1) or match.group(2))))
+        self._tail = window[-self.overlap:] if self.overlap else ""
+
+
+class RuleSet:
+    """
+    按检查目标拆分的规则集
+
+    targets 指定每个分类检查哪些目标，未指定的分类使用 DEFAULT_TARGETS；
+    每个目标编译一个 RuleEngine，只包含检查该目标的分类。
+    """
+
+    def __init__(self, rules: dict, targets: dict | None = None, flags: int = DEFAULT_FLAGS):
+        targets = targets or {}
+        for category, patterns in rules.items():
+            if not isinstance(patterns, (list, tuple)) or not all(isinstance(p, str) for p in patterns):
+                raise RuleCompileError(f"{category}: rules must be a list of strings")
+        self.categories = [c for c, patterns in rules.items() if patterns]
+        self.targets = {c: list(targets.get(c, DEFAULT_TARGETS)) for c in self.categories}
+
+        by_target = {}
+        for category in self.categories:
+            for target in self.targets[category]:
+                if target not in TARGETS and not (
+                    target.startswith(HEADER_TARGET_PREFIX) and len(target) > len(HEADER_TARGET_PREFIX)
+                ):
+                    raise RuleCompileError(f"{category}: unknown target {target!r}")
+                by_target.setdefault(target.lower(), {})[category] = rules[category]
+
+        self.engines = {target: RuleEngine(r, flags) for target, r in by_target.items()}
+        # 需要检查的请求头名称（小写）
+        self.header_names = [
+            t[len(HEADER_TARGET_PREFIX):] for t in self.engines if t.startswith(HEADER_TARGET_PREFIX)
+        ]
+        self.rule_count = sum(len(set(rules[c])) for c in self.categories)
+
+    @property
+    def inspects_body(self) -> bool:
+        return "body" in self.engines
+
+    @property
+    def inspects_filenames(self) -> bool:
+        return FILENAME_TARGET in self.engines
+
+    def match(self, fields: dict) -> set:
+        """fields 为 目标 -> 规范化后的文本（filename 为文件名列表，逐个匹配），返回命中的分类集合"""
+        matched = set()
+        for target, text in fields.items():
+            engine = self.engines.get(target)
+            if engine is None or not text:
+                continue
+            for value in (text,) if isinstance(text, str) else text:
+                matched.update(engine.match(value))
+        return matched
+
+    def body_scanner(self, max_bytes: int, overlap: int = 256, multipart: bool = False) -> StreamScanner:
+        """multipart 为 True 时只检查上传的文件名，文件内容不按 body 规则检查"""
+        if multipart:
+            return StreamScanner(None, max_bytes, overlap, name_engine=self.engines[FILENAME_TARGET])
+        return StreamScanner(self.engines["body"], max_bytes, overlap, normalizer=normalize)
+
+    def first(self, matched) -> str | None:
+        """按分类优先级返回第一个命中的分类"""
+        for category in self.categories:
+            if category in matched:
+                return category
+        return None
@@ -0,0 +1,451 @@
+"""多 worker 共享状态：黑名单、频率限制计数和配置保存在同一个 SQLite 文件中，各 worker 定期同步"""
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import time
+
+from ip_blacklist import IPBlacklist
+from log_stats import LogAnalytics, TrafficStats
+from rate_limiter import RateLimiter
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blacklist (
+    entry TEXT PRIMARY KEY,
+    expires_at REAL,
+    offences INTEGER NOT NULL,
+    forget_at REAL
+);
+CREATE TABLE IF NOT EXISTS blacklist_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at REAL NOT NULL,
+    op TEXT NOT NULL,
+    entry TEXT,
+    expires_at REAL,
+    offences INTEGER,
+    forget_at REAL
+);
+CREATE TABLE IF NOT EXISTS rate_hits (
+    worker TEXT NOT NULL,
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (worker, key, window)
+);
+CREATE INDEX IF NOT EXISTS idx_rate_hits_window ON rate_hits (window);
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    digest TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+"""
+
+# 黑名单的修改按顺序记入 blacklist_changes，各 worker 记住已应用到的 id，之后只读取新的修改；
+# versions 中的 blacklist 为已应用到的 id，meta 中的 blacklist 记录修改记录已清理到的 id
+BLACKLIST_VERSION = "blacklist"
+# 修改记录保留的时间（秒），超过这么久没有同步的 worker 从 blacklist 表重新加载
+BLACKLIST_CHANGES_RETENTION = 300.0
+BLACKLIST_CHANGES_PRUNE_INTERVAL = 10.0
+# 一次同步中新修改超过这么多条时也改为重新加载，在工作线程中建好基数树，避免阻塞事件循环
+BLACKLIST_MAX_DELTA = 1000
+# 同样只用作版本号：任何 worker 注销 token 后递增，其他 worker 读回未过期的撤销记录
+REVOKED_TOKENS_VERSION = "revoked_tokens"
+
+
+class SharedBlacklist(IPBlacklist):
+    """
+    多 worker 共享的黑名单
+
+    请求路径上只查本进程的基数树；本进程的修改记入待同步列表，由同步任务写入数据库，
+    各 worker 按顺序应用新的修改（apply）；需要整体重新加载时在工作线程中建好新的
+    基数树（build），再在事件循环中替换（load）。条目按时间轮到期属于本地行为，
+    每个 worker 各自处理，不写数据库。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = []
+        self._replicating = False
+
+    def _publish(self, op: str, name: str | None = None):
+        if self._replicating:
+            return
+        self.pending.append((op, name, self.state(name) if op == "put" else None))
+
+    def add(self, entry: str, ttl: float | None = None, now: float | None = None) -> str:
+        name = super().add(entry, ttl, now)
+        self._publish("put", name)
+        return name
+
+    def expire(self, now: float | None = None):
+        replicating, self._replicating = self._replicating, True
+        try:
+            super().expire(now)
+        finally:
+            self._replicating = replicating
+
+    def remove(self, entry: str) -> bool:
+        name = entry if entry in self._others else None
+        removed = super().remove(entry)
+        if removed:
+            self._publish("delete", name or self.display(self.parse(entry)))
+        return removed
+
+    def clear(self):
+        super().clear()
+        self._publish("clear")
+
+    def apply(self, changes: list, now: float | None = None):
+        """按顺序应用数据库中的修改 [(操作, 条目, 状态)]，随后重放尚未写入数据库的本地修改"""
+        now = time.time() if now is None else now
+        replicating, self._replicating = self._replicating, True
+        try:
+            for op, name, state in list(changes) + self.pending:
+                if op == "clear":
+                    super().clear()
+                elif op == "delete":
+                    super().remove(name)
+                elif state is not None:
+                    self.restore(name, *state, now)
+        finally:
+            self._replicating = replicating
+
+    def build(self, rows: list, now: float | None = None) -> IPBlacklist:
+        """用数据库中的条目建一个新的黑名单；不修改本对象，可以在工作线程中调用"""
+        blacklist = IPBlacklist(self.ipv6_auto_prefix, self.auto_ttl, self.escalation, self.max_ttl, self.offence_memory)
+        for name, expires_at, offences, forget_at in rows:
+            blacklist.restore(name, expires_at, offences, forget_at, now)
+        return blacklist
+
+    def load(self, blacklist: IPBlacklist):
+        """换成 build 建好的黑名单，随后重放尚未写入数据库的本地修改"""
+        self._tries = blacklist._tries
+        self._entries = blacklist._entries
+        self._others = blacklist._others
+        self._expires = blacklist._expires
+        self._offences = blacklist._offences
+        self._wheel = blacklist._wheel
+        self.apply([])
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    多 worker 共享计数的频率限制器
+
+    每个 worker 按固定窗口统计本进程放行的请求数，由同步任务写入数据库，
+    同时读回其他 worker 在当前和上一窗口的计数；判断是否超限时把其他 worker 的
+    请求数按滑动窗口估算后计入，误差不超过一个同步周期内的请求数。
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._hits = {}
+        self._dirty = set()
+        self._cleaned_at = 0.0
+        self.remote = {}
+        super().__init__(*args, **kwargs)
+
+    def _window(self, now: float) -> int:
+        return math.floor(now / self.window)
+
+    def remote_estimate(self, key, now: float) -> float:
+        counts = self.remote.get(key)
+        if not counts:
+            return 0.0
+        window = self._window(now)
+        elapsed = now / self.window - window
+        return counts.get(window - 1, 0) * max(0.0, 1.0 - elapsed) + counts.get(window, 0)
+
+    def hit(self, key, now: float | None = None, extra: float = 0.0) -> bool:
+        now = time.time() if now is None else now
+        if not super().hit(key, now, extra + self.remote_estimate(key, now)):
+            return False
+        window = self._window(now)
+        counts = self._hits.setdefault(key, {})
+        counts[window] = counts.get(window, 0) + 1
+        self._dirty.add(key)
+        return True
+
+    def count(self, key, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        return super().count(key, now) + math.ceil(self.remote_estimate(key, now))
+
+    def configure(self, *args, **kwargs):
+        window = getattr(self, "window", None)
+        super().configure(*args, **kwargs)
+        if self.window != window:
+            self._hits.clear()
+            self._dirty.clear()
+            self.remote = {}
+
+    def clear(self):
+        super().clear()
+        self._hits.clear()
+        self._dirty.clear()
+        self.remote = {}
+
+    def take_dirty(self, now: float) -> list:
+        """取出上次同步以来有变化的计数 [(key, 窗口, 计数)]，并清理已经过期的窗口"""
+        oldest = self._window(now) - 1
+        rows = []
+        for key in self._dirty:
+            counts = self._hits.get(key)
+            if counts is None:
+                continue
+            for window in [w for w in counts if w < oldest]:
+                del counts[window]
+            rows.extend((str(key), window, count) for window, count in counts.items())
+        self._dirty.clear()
+        # 没有新请求的客户端不会再出现在 _dirty 中，每个窗口整体清理一次
+        if now - self._cleaned_at >= self.window:
+            self._cleaned_at = now
+            for key in [k for k, counts in self._hits.items() if all(w < oldest for w in counts)]:
+                del self._hits[key]
+        return rows
+
+
+class SharedState:
+    """
+    共享状态数据库
+
+    同步任务每 interval 秒在工作线程中执行一次 exchange：先写入本进程的黑名单修改和
+    频率计数，再读回新的黑名单修改、其他 worker 的计数和各项配置的版本号，结果回到事件循环中应用。
+    请求路径上不访问数据库。
+    """
+
+    def __init__(self, path: str, interval: float = 0.25):
+        self.path = path
+        self.interval = interval
+        self.worker = str(os.getpid())
+        self.versions = {}
+        self._pruned_at = 0.0
+        self._task = None
+        self._conn = None
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection, key: str, value: str = "", at_least: int = 1) -> int:
+        # 先写后读：写操作先拿到写锁，多个进程同时递增时不会读到过期的版本号
+        conn.execute(
+            "INSERT INTO meta (key, version, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET version = MAX(version + 1, excluded.version), value = excluded.value",
+            (key, at_least, value),
+        )
+        return conn.execute("SELECT version FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def publish(self, key: str, value, at_least: int = 1) -> int:
+        """保存一项配置（JSON）并递增其版本号（不小于 at_least），返回新版本号；在工作线程中调用"""
+        conn = self._connect()
+        try:
+            with conn:
+                version = self._bump(conn, key, json.dumps(value, ensure_ascii=False), at_least)
+        finally:
+            conn.close()
+        self.versions[key] = version
+        return version
+
+    def revoke_token(self, digest: str, expires_at: float):
+        """记录注销的 token（摘要）直到其过期；在工作线程中调用"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO revoked_tokens (digest, expires_at) VALUES (?, ?)", (digest, expires_at)
+                )
+                conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+                # 不记录版本号：下次同步时连同其他 worker 同时写入的记录一起读回
+                self._bump(conn, REVOKED_TOKENS_VERSION)
+        finally:
+            conn.close()
+
+    def exchange(self, blacklist_changes: list, hits: list, rate_window: float, now: float) -> dict:
+        """写入本进程的修改，读回共享状态；在工作线程中调用"""
+        if self._conn is None:
+            self._conn = self._connect()
+        conn = self._conn
+        current = math.floor(now / rate_window)
+        result = {"remote_hits": {}, "changed": {}}
+        with conn:
+            for op, name, state in blacklist_changes:
+                if op == "clear":
+                    conn.execute("DELETE FROM blacklist")
+                elif op == "delete":
+                    conn.execute("DELETE FROM blacklist WHERE entry = ?", (name,))
+                elif state is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO blacklist (entry, expires_at, offences, forget_at) VALUES (?, ?, ?, ?)",
+                        (name, *state),
+                    )
+                else:
+                    continue
+                conn.execute(
+                    "INSERT INTO blacklist_changes (at, op, entry, expires_at, offences, forget_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (now, op, name, *(state or (None, None, None))),
+                )
+            if hits:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_hits (worker, key, window, count) VALUES (?, ?, ?, ?)",
+                    [(self.worker, key, window, count) for key, window, count in hits],
+                )
+            conn.execute("DELETE FROM rate_hits WHERE window < ?", (current - 1,))
+            # 以上写操作已经拿到写锁，下面清理和读取黑名单修改时其他 worker 不会同时写入
+            if now - self._pruned_at >= BLACKLIST_CHANGES_PRUNE_INTERVAL:
+                self._pruned_at = now
+                self._prune_blacklist_changes(conn, now)
+            blacklist_result, seen = self._read_blacklist(conn)
+        result.update(blacklist_result)
+
+        remote = result["remote_hits"]
+        for key, window, count in conn.execute(
+            "SELECT key, window, SUM(count) FROM rate_hits WHERE worker != ? AND window >= ? GROUP BY key, window",
+            (self.worker, current - 1),
+        ):
+            remote.setdefault(key, {})[window] = count
+
+        changed = {}
+        for key, version, value in conn.execute("SELECT key, version, value FROM meta"):
+            if key == BLACKLIST_VERSION:
+                continue
+            if self.versions.get(key) != version:
+                self.versions[key] = version
+                changed[key] = (version, value)
+
+        for key, (version, value) in changed.items():
+            if key == REVOKED_TOKENS_VERSION:
+                result["changed"][key] = (version, conn.execute(
+                    "SELECT digest, expires_at FROM revoked_tokens WHERE expires_at > ?", (now,)
+                ).fetchall())
+            else:
+                result["changed"][key] = (version, json.loads(value))
+        # 全部读取成功后才记下已读到的修改 id，出错时下次重新读取
+        self.versions[BLACKLIST_VERSION] = seen
+        return result
+
+    def _prune_blacklist_changes(self, conn: sqlite3.Connection, now: float):
+        """删除超过保留时间的黑名单修改记录，并在 meta 中记下已清理到的 id"""
+        pruned = conn.execute(
+            "SELECT MAX(id) FROM blacklist_changes WHERE at < ?", (now - BLACKLIST_CHANGES_RETENTION,)
+        ).fetchone()[0]
+        if pruned is not None:
+            conn.execute("DELETE FROM blacklist_changes WHERE id <= ?", (pruned,))
+            self._bump(conn, BLACKLIST_VERSION, str(pruned))
+
+    def _read_blacklist(self, conn: sqlite3.Connection) -> tuple:
+        """
+        读取上次同步以来的黑名单修改，返回 (结果, 读到的最后一条修改的 id)；
+        第一次同步、修改记录已被清理或修改过多时返回全部条目
+        """
+        seen = self.versions.get(BLACKLIST_VERSION)
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (BLACKLIST_VERSION,)).fetchone()
+        pruned = int(row[0] or 0) if row else 0
+        if seen is not None and seen >= pruned:
+            changes = conn.execute(
+                "SELECT id, op, entry, expires_at, offences, forget_at FROM blacklist_changes "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (seen, BLACKLIST_MAX_DELTA + 1),
+            ).fetchall()
+            if len(changes) <= BLACKLIST_MAX_DELTA:
+                return {"blacklist_changes": [
+                    (op, name, None if op != "put" else (expires_at, offences, forget_at))
+                    for _, op, name, expires_at, offences, forget_at in changes
+                ]}, changes[-1][0] if changes else seen
+        last = conn.execute("SELECT MAX(id) FROM blacklist_changes").fetchone()[0]
+        rows = conn.execute("SELECT entry, expires_at, offences, forget_at FROM blacklist").fetchall()
+        return {"blacklist": rows}, max(last or 0, pruned)
+
+    async def run(self, blacklist: SharedBlacklist, rate_limiter: SharedRateLimiter, on_change):
+        """同步循环；on_change(key, version, value) 在事件循环中处理配置变化"""
+        while True:
+            try:
+                now = time.time()
+                changes, blacklist.pending = blacklist.pending, []
+                hits = rate_limiter.take_dirty(now)
+                try:
+                    result = await asyncio.to_thread(self.exchange, changes, hits, rate_limiter.window, now)
+                except sqlite3.Error as e:
+                    # 写入失败时保留修改，下次重试
+                    blacklist.pending = changes + blacklist.pending
+                    print(f"Error syncing shared state: {e}")
+                else:
+                    rate_limiter.remote = result["remote_hits"]
+                    if "blacklist" in result:
+                        blacklist.load(await asyncio.to_thread(blacklist.build, result["blacklist"]))
+                    elif result["blacklist_changes"]:
+                        blacklist.apply(result["blacklist_changes"])
+                    for key, (version, value) in result["changed"].items():
+                        await on_change(key, version, value)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error applying shared state: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self, blacklist: SharedBlacklist, rate_limiter: SharedRateLimiter, on_change):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run(blacklist, rate_limiter, on_change))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SharedLogView:
+    """
+    多 worker 模式下的日志统计
+
+    各 worker 的日志都写入同一个日志数据库，统计接口从数据库读取最近保留的日志，
+    用与单进程相同的计数器重新计算；结果最多缓存 max_age 秒。
+    """
+
+    def __init__(self, persistence, access_capacity: int, attack_capacity: int, recent_window: int, max_age: float = 1.0):
+        self.persistence = persistence
+        self.access_capacity = access_capacity
+        self.attack_capacity = attack_capacity
+        self.recent_window = recent_window
+        self.max_age = max_age
+        self._built_at = 0.0
+        self._current = None
+        self._lock = asyncio.Lock()
+
+    def _build(self) -> tuple:
+        access, last_id, _ = self.persistence.since(0, self.access_capacity)
+        attacks, _, _ = self.persistence.since(0, self.attack_capacity, attacks_only=True)
+        analytics = LogAnalytics()
+        traffic = TrafficStats(self.recent_window)
+        for i, record in enumerate(access):
+            analytics.add_access(record)
+            traffic.add_access(record, access[i - self.recent_window] if i >= self.recent_window else None)
+        for record in attacks:
+            analytics.add_attack(record)
+        return analytics, traffic, len(attacks), last_id
+
+    async def current(self) -> tuple:
+        """返回 (LogAnalytics, TrafficStats, 攻击日志条数, 最新日志 id)"""
+        async with self._lock:
+            if self._current is None or time.monotonic() - self._built_at >= self.max_age:
+                self._current = await asyncio.to_thread(self._build)
+                self._built_at = time.monotonic()
+            return self._current
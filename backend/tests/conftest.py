@@ -0,0 +1,5 @@
+"""pytest 配置：测试直接导入 backend 目录下的模块"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,110 @@
+"""ip_blacklist 测试：基数树最长前缀匹配、条目有效期和自动封禁"""
+import random
+import time
+
+import pytest
+
+from ip_blacklist import IPBlacklist, RadixTrie
+
+
+def test_trie_longest_prefix_match():
+    trie = RadixTrie(8)
+    trie.insert(0b1, 1, "1/1")
+    trie.insert(0b1010, 4, "1010/4")
+    trie.insert(0b10101111, 8, "10101111/8")
+    assert trie.lookup(0b10101111) == "10101111/8"
+    assert trie.lookup(0b10101110) == "1010/4"
+    assert trie.lookup(0b11000000) == "1/1"
+    assert trie.lookup(0b01000000) is None
+
+
+def test_trie_remove_keeps_other_prefixes():
+    trie = RadixTrie(8)
+    trie.insert(0b10, 2, "a")
+    trie.insert(0b1011, 4, "b")
+    trie.insert(0b1000, 4, "c")
+    assert trie.remove(0b10, 2)
+    assert not trie.remove(0b10, 2)
+    assert not trie.remove(0b1111, 4)
+    assert trie.lookup(0b10110000) == "b"
+    assert trie.lookup(0b10000000) == "c"
+    assert trie.lookup(0b10010000) is None
+
+
+def test_trie_matches_linear_scan():
+    rng = random.Random(1)
+    prefixes = {}
+    trie = RadixTrie(16)
+    for _ in range(300):
+        length = rng.randint(0, 16)
+        value = rng.getrandbits(16) >> (16 - length)
+        prefixes[(value, length)] = f"{value}/{length}"
+        trie.insert(value, length, prefixes[(value, length)])
+    for value, length in list(prefixes)[:100]:
+        trie.remove(value, length)
+        del prefixes[(value, length)]
+    for _ in range(2000):
+        address = rng.getrandbits(16)
+        covering = [(l, e) for (v, l), e in prefixes.items() if address >> (16 - l) == v]
+        assert trie.lookup(address) == (max(covering)[1] if covering else None)
+
+
+def test_blacklist_addresses_and_networks():
+    blacklist = IPBlacklist()
+    assert blacklist.add("10.0.0.0/8") == "10.0.0.0/8"
+    assert blacklist.add("192.168.1.77/24") == "192.168.1.0/24"
+    assert blacklist.add("2001:db8::1") == "2001:db8::1"
+    assert blacklist.lookup("10.1.2.3") == "10.0.0.0/8"
+    assert "192.168.1.5" in blacklist
+    assert "192.168.2.5" not in blacklist
+    assert "2001:db8::1" in blacklist and "2001:db8::2" not in blacklist
+    assert blacklist.remove("192.168.1.0/24")
+    assert "192.168.1.5" not in blacklist
+    assert len(blacklist) == 2
+
+
+def test_blacklist_non_ip_clients_match_exactly():
+    blacklist = IPBlacklist()
+    blacklist.add("unix:/tmp/sock")
+    assert "unix:/tmp/sock" in blacklist
+    assert "unix:/tmp/other" not in blacklist
+
+
+def test_ipv4_mapped_entries_are_stored_as_ipv4():
+    blacklist = IPBlacklist(ipv6_auto_prefix=64)
+    assert blacklist.add("::ffff:1.2.3.4") == "1.2.3.4"
+    assert blacklist.add("::ffff:10.0.0.0/104") == "10.0.0.0/8"
+    assert "::ffff:1.2.3.4" in blacklist and "10.9.9.9" in blacklist
+    assert blacklist.add_client("::ffff:5.6.7.8") == "5.6.7.8"
+    assert "2001:db8::1" not in blacklist
+    assert blacklist.remove("::ffff:1.2.3.4")
+
+
+def test_entries_expire():
+    # 查找时按当前时间推进时间轮，测试中的时间以当前时间为起点
+    now = time.time()
+    blacklist = IPBlacklist()
+    blacklist.add("1.2.3.4", ttl=10, now=now)
+    blacklist.add("5.6.7.8", now=now)
+    assert [e["entry"] for e in blacklist.entries(now + 5)] == ["1.2.3.4", "5.6.7.8"]
+    assert [e["entry"] for e in blacklist.entries(now + 11)] == ["5.6.7.8"]
+
+
+def test_auto_ban_escalates_and_widens_ipv6():
+    now = time.time()
+    blacklist = IPBlacklist(ipv6_auto_prefix=64, auto_ttl=60, escalation=2, max_ttl=200)
+    assert blacklist.add_client("2001:db8::1", now=now) == "2001:db8::/64"
+    assert "2001:db8::ffff" in blacklist
+    assert blacklist.state("2001:db8::/64")[0] == pytest.approx(now + 60)
+    # 到期后再次封禁，有效期翻倍，最长 max_ttl
+    blacklist.add_client("2001:db8::2", now=now + 100)
+    assert blacklist.state("2001:db8::/64")[0] == pytest.approx(now + 220)
+    blacklist.add_client("2001:db8::3", now=now + 300)
+    assert blacklist.state("2001:db8::/64")[0] == pytest.approx(now + 500)
+
+
+def test_manual_permanent_ban_is_not_shortened_by_auto_ban():
+    blacklist = IPBlacklist(auto_ttl=60)
+    blacklist.add("1.2.3.4")
+    blacklist.add_client("1.2.3.4")
+    assert blacklist.state("1.2.3.4")[0] is None
@@ -0,0 +1,21 @@
+"""登录洪水下事件循环不被密码校验阻塞（测量方法与 benchmarks/bench_login_latency.py 相同）"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from bench_login_latency import main, run  # noqa: E402
+
+
+def test_login_flood_does_not_block_event_loop():
+    # 一次 bcrypt 校验的耗时：在事件循环中直接校验时，延迟至少是这么久
+    started = time.perf_counter()
+    main.verify_password("wrong-password", main.ADMIN_PASSWORD_HASH)
+    hash_time = time.perf_counter() - started
+
+    result = asyncio.run(run("pool", logins=6, concurrency=6, tick=0.01))
+    assert result["statuses"] == {200: 3, 401: 3}
+    assert max(result["lags"]) < hash_time / 2
+    assert max(result["health"]) < hash_time / 2
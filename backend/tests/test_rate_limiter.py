@@ -0,0 +1,65 @@
+"""rate_limiter 测试：滑动窗口、令牌桶、空闲淘汰和配置校验"""
+import math
+
+import pytest
+
+from rate_limiter import RateLimiter
+
+
+def test_sliding_window_limits_requests_per_window():
+    limiter = RateLimiter(max_requests=5, window=10)
+    assert sum(limiter.hit("a", 0.0) for _ in range(10)) == 5
+    assert limiter.hit("b", 0.0)
+    # 下一窗口开始时上一窗口的计数按剩余比例计入：10.5 秒时估算为 4.75 个请求
+    assert sum(limiter.hit("a", 10.5) for _ in range(10)) == 1
+    assert sum(limiter.hit("a", 19.9) for _ in range(10)) == 4
+
+
+def test_sliding_window_state_outlives_one_idle_window():
+    limiter = RateLimiter(max_requests=10, window=10)
+    assert sum(limiter.hit("a", 10.1) for _ in range(20)) == 10
+    limiter.hit("b", 20.2)
+    assert sum(limiter.hit("a", 20.2) for _ in range(20)) == 1
+
+
+def test_token_bucket_refills_over_the_window():
+    limiter = RateLimiter(max_requests=4, window=8, algorithm="token_bucket")
+    assert sum(limiter.hit("a", 0.0) for _ in range(10)) == 4
+    assert sum(limiter.hit("a", 4.0) for _ in range(10)) == 2
+
+
+def test_idle_and_excess_clients_are_evicted():
+    limiter = RateLimiter(max_requests=5, window=10, max_clients=2)
+    limiter.hit("a", 0.0)
+    limiter.hit("b", 0.0)
+    limiter.hit("c", 0.0)
+    assert "a" not in limiter and len(limiter) == 2
+    limiter.hit("d", 25.0)
+    assert list(limiter._clients) == ["d"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"max_requests": 0},
+    {"max_requests": True},
+    {"window": 0},
+    {"window": math.nan},
+    {"window": math.inf},
+    {"window": True},
+    {"algorithm": "leaky"},
+    {"max_clients": False},
+    {"idle_ttl": -1},
+])
+def test_invalid_configuration_is_rejected(kwargs):
+    limiter = RateLimiter(max_requests=5, window=10)
+    with pytest.raises(ValueError):
+        limiter.configure(**kwargs)
+    assert limiter.max_requests == 5 and limiter.window == 10
+
+
+def test_changing_the_window_resets_state():
+    limiter = RateLimiter(max_requests=1, window=10)
+    limiter.hit("a", 0.0)
+    limiter.configure(max_requests=1)
+    assert "a" in limiter
+    limiter.configure(window=20)
+    assert "a" not in limiter
@@ -0,0 +1,97 @@
+"""reverse_proxy 测试：用 httpx.ASGITransport 把本地应用当作上游，经 forward() 转发"""
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from reverse_proxy import Upstream, forward
+
+
+async def echo(request: Request):
+    """上游：返回收到的原始路径、查询字符串和请求体"""
+    body = await request.body()
+    return Response(body, headers={
+        "x-raw-path": request.scope["raw_path"].decode("latin-1"),
+        "x-query": request.scope["query_string"].decode("latin-1"),
+        "x-forwarded-for": request.headers.get("x-forwarded-for", ""),
+    })
+
+
+async def cookies(request: Request):
+    response = Response("ok")
+    response.raw_headers.append((b"set-cookie", b"a=1; Path=/"))
+    response.raw_headers.append((b"set-cookie", b"b=2; Path=/"))
+    return response
+
+
+async def chunks(request: Request):
+    async def body():
+        for i in range(3):
+            yield f"chunk{i};".encode()
+    return StreamingResponse(body(), media_type="text/plain")
+
+
+upstream_app = Starlette(routes=[
+    Route("/base/cookies", cookies),
+    Route("/base/chunks", chunks),
+    Route("/{path:path}", echo, methods=["GET", "POST", "PUT"]),
+])
+
+
+def proxy_client(upstream: Upstream) -> TestClient:
+    """WAF 一侧：所有请求经 forward() 转发到 upstream"""
+    async def proxy(request: Request):
+        return await forward(request, upstream, "203.0.113.7")
+
+    app = Starlette(routes=[Route("/{path:path}", proxy, methods=["GET", "POST", "PUT"])])
+    return TestClient(app)
+
+
+@pytest.fixture
+def client():
+    return proxy_client(Upstream("http://upstream.test/base/", transport=httpx.ASGITransport(app=upstream_app)))
+
+
+def test_forwards_raw_path_and_query(client):
+    response = client.get("/files/a%2Fb/%2e%2e/c%20d?q=%3Cx%3E&r=1")
+    assert response.status_code == 200
+    assert response.headers["x-raw-path"] == "/base/files/a%2Fb/%2e%2e/c%20d"
+    assert response.headers["x-query"] == "q=%3Cx%3E&r=1"
+    assert response.headers["x-forwarded-for"] == "203.0.113.7"
+
+
+def test_streams_request_body(client):
+    def body():
+        for i in range(4):
+            yield f"part{i}-".encode() * 1000
+
+    response = client.post("/upload", content=body())
+    assert response.status_code == 200
+    assert response.content == b"".join(f"part{i}-".encode() * 1000 for i in range(4))
+
+
+def test_streams_response_body(client):
+    response = client.get("/chunks")
+    assert response.status_code == 200
+    assert response.text == "chunk0;chunk1;chunk2;"
+
+
+def test_keeps_repeated_set_cookie(client):
+    response = client.get("/cookies")
+    assert response.headers.get_list("set-cookie") == ["a=1; Path=/", "b=2; Path=/"]
+
+
+@pytest.mark.parametrize("error, status", [
+    (httpx.ConnectError("refused"), 502),
+    (httpx.PoolTimeout("pool full"), 503),
+    (httpx.ReadTimeout("slow"), 504),
+])
+def test_upstream_errors(error, status):
+    def fail(request: httpx.Request):
+        raise error
+
+    client = proxy_client(Upstream("http://upstream.test", transport=httpx.MockTransport(fail)))
+    assert client.get("/anything").status_code == status
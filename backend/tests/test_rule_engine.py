@@ -0,0 +1,96 @@
+"""rule_engine 测试：规则编译、多分类匹配、按目标拆分和分块扫描"""
+import pytest
+
+from rule_engine import RuleCompileError, RuleEngine, RuleSet, StreamScanner, normalize
+
+RULES = {
+    "sql_injection": [r"union\s+select", r"\bor\s+1=1\b"],
+    "xss": [r"<script"],
+    "custom": ["evilword"],
+}
+
+
+def test_normalize_decodes_and_collapses_whitespace():
+    assert normalize("UNION%20%20SELECT+1") == "union select 1"
+    assert normalize("") == ""
+
+
+def test_engine_returns_all_matched_categories_in_rule_order():
+    engine = RuleEngine(RULES)
+    assert engine.match("<script>union select 1</script>") == ["sql_injection", "xss"]
+    assert engine.search("hello <script>") == "xss"
+    assert engine.match("hello world") == []
+    assert engine.rule_count == 4
+
+
+def test_engine_skips_empty_categories_and_duplicate_rules():
+    engine = RuleEngine({"a": ["x", "x", ""], "b": []})
+    assert engine.categories == ["a"]
+    assert engine.rule_count == 1
+    assert RuleEngine({}).match("anything") == []
+
+
+@pytest.mark.parametrize("pattern", ["(", ".*passwd", r"<[^>]+>", r"\S+@"])
+def test_invalid_or_unbounded_rules_are_rejected(pattern):
+    with pytest.raises(RuleCompileError) as error:
+        RuleEngine({"custom": [pattern]})
+    assert "custom" in str(error.value)
+
+
+def test_bounded_wildcards_are_allowed():
+    engine = RuleEngine({"custom": [r"<a.{0,100}?href", r"\d+"]})
+    assert engine.match("<a class=x href=y>") == ["custom"]
+
+
+def test_rule_set_matches_each_target_with_its_own_categories():
+    rule_set = RuleSet(RULES, {"xss": ["args", "header:referer"], "custom": ["path"]})
+    assert rule_set.match({"path": "/evilword", "args": "q=union select"}) == {"custom", "sql_injection"}
+    assert rule_set.match({"path": "/<script"}) == set()
+    assert rule_set.match({"header:referer": "<script"}) == {"xss"}
+    assert rule_set.header_names == ["referer"]
+    assert rule_set.first({"xss", "sql_injection"}) == "sql_injection"
+
+
+def test_rule_set_rejects_unknown_targets_and_non_string_rules():
+    with pytest.raises(RuleCompileError):
+        RuleSet({"xss": ["<script"]}, {"xss": ["cookie"]})
+    with pytest.raises(RuleCompileError):
+        RuleSet({"xss": "<script"})
+    with pytest.raises(RuleCompileError):
+        RuleSet({"xss": [1]})
+
+
+def test_stream_scanner_finds_patterns_across_chunk_boundaries():
+    scanner = RuleSet(RULES).body_scanner(max_bytes=1024, overlap=32)
+    scanner.feed(b"a=1&b=UNION%20SE")
+    assert scanner.matched == set()
+    scanner.feed(b"LECT%201")
+    assert scanner.matched == {"sql_injection"}
+
+
+def test_stream_scanner_stops_after_max_bytes():
+    scanner = RuleSet(RULES).body_scanner(max_bytes=10)
+    scanner.feed(b"x" * 8)
+    scanner.feed(b"<script>")
+    assert scanner.exhausted
+    assert scanner.matched == set()
+    scanner.feed(b"<script>")
+    assert scanner.inspected == 10
+
+
+def test_stream_scanner_handles_split_utf8_characters():
+    scanner = StreamScanner(RuleEngine({"custom": ["攻击"]}), max_bytes=1024)
+    data = "攻击".encode("utf-8")
+    scanner.feed(data[:2])
+    scanner.feed(data[2:])
+    assert scanner.matched == {"custom"}
+
+
+def test_multipart_scanner_checks_only_file_names():
+    rule_set = RuleSet({"file_upload": [r"\.php$"], "sql_injection": [r"union\s+select"]},
+                       {"file_upload": ["filename"]})
+    scanner = rule_set.body_scanner(max_bytes=4096, multipart=True)
+    scanner.feed(b'--x\r\nContent-Disposition: form-data; name="f"; filename="cat.jpg"\r\n\r\nunion select\r\n')
+    assert scanner.matched == set()
+    scanner.feed(b'--x\r\nContent-Disposition: form-data; name="f"; filename="shell.PHP"\r\n\r\n')
+    assert scanner.matched == {"file_upload"}
@@ -0,0 +1,50 @@
+"""timer_wheel 测试：到期顺序、跨层下放和超出范围的定时器"""
+import random
+
+from timer_wheel import TimerWheel
+
+
+def test_timers_fire_once_after_their_deadline():
+    wheel = TimerWheel(resolution=1.0, now=0)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 2.5)
+    assert wheel.advance(2) == []
+    assert wheel.advance(3) == ["b"]
+    assert wheel.advance(4) == []
+    assert wheel.advance(10) == ["a"]
+    assert wheel.advance(20) == []
+    assert len(wheel) == 0
+
+
+def test_past_deadlines_fire_on_next_advance():
+    wheel = TimerWheel(now=100)
+    wheel.schedule("late", 50)
+    assert wheel.advance(100) == ["late"]
+
+
+def test_timers_cascade_from_higher_levels_and_overflow():
+    wheel = TimerWheel(resolution=1.0, slots=4, levels=2, now=0)
+    deadlines = {"level0": 3, "level1": 9, "overflow": 40}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    fired = {}
+    for now in range(0, 50):
+        for key in wheel.advance(now):
+            fired[key] = now
+    assert fired == deadlines
+
+
+def test_random_timers_match_sorted_deadlines():
+    rng = random.Random(7)
+    wheel = TimerWheel(resolution=0.5, slots=8, levels=3, now=0)
+    deadlines = {i: rng.uniform(0, 300) for i in range(500)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+    now = 0.0
+    while now < 310:
+        now += rng.uniform(0, 3)
+        for key in wheel.advance(now):
+            assert deadlines.pop(key) <= now
+        # 到期的定时器最多晚一个刻度
+        assert all(deadline > now - 0.5 for deadline in deadlines.values())
+    assert not deadlines
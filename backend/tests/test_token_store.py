@@ -0,0 +1,62 @@
+"""token_store 测试：签发、校验、过期清理和文件持久化"""
+import json
+
+import pytest
+
+from token_store import TokenStore
+
+
+def test_issue_verify_and_revoke():
+    store = TokenStore(ttl=60)
+    token = store.issue("admin", now=0)
+    assert store.verify(token, now=59) == "admin"
+    assert store.verify(token, now=60) is None
+    assert store.verify("unknown", now=0) is None
+    assert store.revoke(token)
+    assert not store.revoke(token)
+    assert store.verify(token, now=0) is None
+
+
+def test_purge_removes_only_expired_tokens():
+    store = TokenStore(ttl=10)
+    old = store.issue("a", now=0)
+    new = store.issue("b", now=5)
+    assert store.purge(now=12) == 1
+    assert store.verify(old, now=12) is None
+    assert store.verify(new, now=12) == "b"
+
+
+def test_flush_and_load_round_trip(tmp_path):
+    path = tmp_path / "tokens.json"
+    store = TokenStore(str(path), ttl=100)
+    token = store.issue("admin", now=0)
+    store.issue("expired", now=-200)
+    assert store.flush()
+    assert not store.flush()
+
+    loaded = TokenStore(str(path), ttl=100)
+    loaded.load(now=50)
+    assert loaded.verify(token, now=50) == "admin"
+    assert len(loaded) == 1
+
+
+def test_load_drops_legacy_tokens(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps({
+        "token_admin_1700000000": "admin",
+        "fresh": {"username": "admin", "expires_at": 1000},
+    }))
+    store = TokenStore(str(path), ttl=86400)
+    store.load(now=0)
+    assert store.verify("token_admin_1700000000", now=0) is None
+    assert store.verify("fresh", now=0) == "admin"
+    assert store.flush()
+    assert list(json.loads(path.read_text())) == ["fresh"]
+
+
+def test_load_rejects_invalid_files(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text("[]")
+    with pytest.raises(ValueError):
+        TokenStore(str(path)).load()
+    TokenStore(str(tmp_path / "missing.json")).load()
@@ -0,0 +1,82 @@
+"""分层时间轮：定时器的添加和到期处理均摊 O(1)"""
+import math
+import time
+
+
+class TimerWheel:
+    """
+    分层时间轮
+
+    每层 slots 个槽，第 0 层每槽 resolution 秒，第 n 层每槽为第 n-1 层一整圈。
+    定时器按距离到期的时长放入能容纳它的最低层，高层的槽转到时整体下放到低层，
+    每个定时器最多被移动 levels 次。超出最高层范围的定时器暂存，最高层转满一圈时重新放置。
+
+    定时器不支持取消：调用方在到期时自行判断是否仍然有效（惰性删除）。
+    """
+
+    def __init__(self, resolution: float = 1.0, slots: int = 64, levels: int = 4, now: float | None = None):
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._overflow = []
+        self._due = []
+        self._count = 0
+        self.current = self._tick(time.time() if now is None else now)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _tick(self, timestamp: float) -> int:
+        return math.floor(timestamp / self.resolution)
+
+    def schedule(self, key, deadline: float):
+        """deadline（时间戳）到达后，advance 会返回 key"""
+        self._count += 1
+        self._place(math.ceil(deadline / self.resolution), key)
+
+    def _place(self, tick: int, key):
+        delta = tick - self.current
+        if delta <= 0:
+            self._due.append(key)
+            return
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                slot = (tick // self._spans[level]) % self.slots
+                self._wheels[level][slot].append((tick, key))
+                return
+        self._overflow.append((tick, key))
+
+    def _cascade(self):
+        """当前时刻跨过高层槽的边界时，把该槽的定时器下放到低层"""
+        for level in range(1, self.levels + 1):
+            if self.current % self._spans[level]:
+                return
+            if level == self.levels:
+                items, self._overflow = self._overflow, []
+            else:
+                slot = (self.current // self._spans[level]) % self.slots
+                items, self._wheels[level][slot] = self._wheels[level][slot], []
+            for tick, key in items:
+                self._place(tick, key)
+
+    def advance(self, now: float | None = None) -> list:
+        """推进到 now，返回已到期的 key"""
+        target = self._tick(time.time() if now is None else now)
+        expired, self._due = self._due, []
+        while self.current < target and len(expired) < self._count:
+            self.current += 1
+            self._cascade()
+            index = self.current % self.slots
+            slot = self._wheels[0][index]
+            if slot:
+                self._wheels[0][index] = []
+                expired.extend(key for _, key in slot)
+            if self._due:
+                expired.extend(self._due)
+                self._due = []
+        # 没有剩余定时器时直接跳到目标时刻
+        self.current = max(self.current, target)
+        self._count -= len(expired)
+        return expired
@@ -0,0 +1,80 @@
+"""已校验登录 token 的缓存和注销后的撤销列表"""
+import hashlib
+import heapq
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """
+    已校验 JWT 的 LRU 缓存
+
+    以 token 的 SHA-256 摘要为 key（内存中不保留 token 原文），保存校验得到的用户名和 exp，
+    exp 到期后条目失效，最多保留 max_entries 条。注销的 token 记入撤销列表直到 exp，
+    撤销的 token 不再命中缓存，调用方也应在重新校验前拒绝它。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._revoked_expiry = []
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, now: float | None = None) -> str | None:
+        """返回缓存的用户名；未缓存、已过期或已撤销时返回 None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > (time.time() if now is None else now) and key not in self._revoked:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, username: str, exp: float):
+        if key in self._revoked:
+            return
+        self._entries[key] = (username, exp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, key: str) -> bool:
+        return key in self._revoked
+
+    def revoke(self, key: str, exp: float, now: float | None = None):
+        """撤销 token 直到 exp（之后 token 本身已过期，不再需要记录）"""
+        self._purge_revoked(time.time() if now is None else now)
+        self._entries.pop(key, None)
+        if self._revoked.get(key, float("-inf")) < exp:
+            self._revoked[key] = exp
+            heapq.heappush(self._revoked_expiry, (exp, key))
+
+    def load_revoked(self, rows, now: float | None = None):
+        """合并其他 worker 的撤销记录 [(key, exp), ...]"""
+        now = time.time() if now is None else now
+        for key, exp in rows:
+            self.revoke(key, exp, now)
+
+    def _purge_revoked(self, now: float):
+        while self._revoked_expiry and self._revoked_expiry[0][0] <= now:
+            exp, key = heapq.heappop(self._revoked_expiry)
+            if self._revoked.get(key) == exp:
+                del self._revoked[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,111 @@
+"""登录 token 存储：带有效期，校验 O(1)，过期清理和持久化的开销只与有效 token 数有关"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenStore:
+    """
+    登录 token 存储
+
+    所有 token 的有效期相同，按签发顺序保存在 OrderedDict 中，最早签发的最先过期，
+    purge 只需从头部弹出已过期的 token。签发和注销只在内存中修改并标记为脏，
+    由 flush 批量写入文件（先写临时文件再替换），文件中只有未过期的 token。
+    """
+
+    def __init__(self, path: str = "", ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def issue(self, username: str, now: float | None = None) -> str:
+        token = secrets.token_urlsafe(32)
+        expires_at = (time.time() if now is None else now) + self.ttl
+        with self._lock:
+            self._tokens[token] = (username, expires_at)
+            self._dirty = True
+        return token
+
+    def verify(self, token: str, now: float | None = None) -> str | None:
+        """返回 token 对应的用户名，token 不存在或已过期时返回 None"""
+        entry = self._tokens.get(token)
+        if entry is None or entry[1] <= (time.time() if now is None else now):
+            return None
+        return entry[0]
+
+    def revoke(self, token: str) -> bool:
+        with self._lock:
+            if self._tokens.pop(token, None) is None:
+                return False
+            self._dirty = True
+            return True
+
+    def purge(self, now: float | None = None) -> int:
+        """删除已过期的 token，返回删除的数量"""
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._tokens:
+                token = next(iter(self._tokens))
+                if self._tokens[token][1] > now:
+                    break
+                self._tokens.popitem(last=False)
+                removed += 1
+            if removed:
+                self._dirty = True
+        return removed
+
+    def flush(self) -> bool:
+        """有未保存的修改时写入文件，返回是否写入"""
+        if not self.path:
+            return False
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                data = {
+                    token: {"username": username, "expires_at": expires_at}
+                    for token, (username, expires_at) in self._tokens.items()
+                }
+                self._dirty = False
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+        return True
+
+    def load(self, now: float | None = None):
+        """从文件加载未过期的 token，文件不存在时不做任何事；文件内容无效时抛出 ValueError"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        now = time.time() if now is None else now
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("token file must contain a JSON object")
+        entries = []
+        for token, value in data.items():
+            # 旧格式 {token: username} 的 token 是可猜测的 token_<用户名>_<时间戳>，直接丢弃，需要重新登录
+            if isinstance(value, dict) and value.get("expires_at", 0) > now:
+                entries.append((value["expires_at"], token, value["username"]))
+        entries.sort()
+        with self._lock:
+            self._tokens.clear()
+            for expires_at, token, username in entries:
+                self._tokens[token] = (username, expires_at)
+            # 去掉了过期或旧格式的 token 时需要重写文件
+            self._dirty = len(entries) != len(data)
@@ -0,0 +1,317 @@
+"""
+离线流量回放：用 WAF 规则检查记录下来的请求，评估规则修改的效果
+
+支持的输入格式（按扩展名识别，可用 --format 指定，.gz 文件自动解压）：
+    nginx   nginx 默认的 combined 格式访问日志（frontend/nginx.conf 代理的请求）
+    ndjson  每行一条 JSON：/api/access-logs、/api/logs/query 导出的日志（path 为解码后的路径），
+            或 {"method", "url"（未解码）, "headers", "body", "status"} 形式的记录
+    har     浏览器或抓包工具导出的 HAR 文件
+
+检查逻辑与线上相同（waf_core.WafCore.inspect：路径、参数、请求头，未命中时检查请求体），
+不包含黑名单和频率限制。记录按批分给多个进程并行检查，输出各分类命中数、疑似误报和每秒处理的记录数。
+疑似误报：命中规则，但记录中的响应状态码小于 400（线上正常处理了），或原来的 WAF 日志中没有判定为攻击。
+
+用法（在 backend 目录下）：
+    python traffic_replay.py /var/log/nginx/access.log access.log.1.gz
+    python traffic_replay.py exported.ndjson --rules new_rules.json --workers 4
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import NamedTuple
+
+from rule_engine import RuleCompileError, RuleSet
+from waf_core import WAF_RULE_TARGETS, WAF_RULES, WafCore
+
+BATCH_SIZE = 2000
+
+# nginx combined 格式：
+# $remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"
+NGINX_LINE = re.compile(
+    r'(?P<client>\S+) \S+ \S+ \[[^\]]*\] "(?P<request>(?:[^"\\]|\\.)*)" (?P<status>\d{3}) \S+'
+    r'(?: "(?P<referer>(?:[^"\\]|\\.)*)" "(?P<user_agent>(?:[^"\\]|\\.)*)")?'
+)
+NGINX_ESCAPE = re.compile(r"\\x([0-9A-Fa-f]{2})")
+
+# WAF 导出的日志把部分请求头展开为单独的字段
+LOGGED_HEADERS = {
+    "user_agent": "user-agent",
+    "content_type": "content-type",
+    "accept": "accept",
+    "accept_language": "accept-language",
+    "accept_encoding": "accept-encoding",
+    "connection": "connection",
+}
+
+
+class Record(NamedTuple):
+    method: str
+    path: str  # 未解码的路径
+    query: str  # 未解码的查询串
+    headers: dict  # 小写名称
+    body: bytes
+    status: int | None  # 记录中的响应状态码
+    recorded_attack: bool | None  # 原来的 WAF 是否判定为攻击
+
+
+def unescape_nginx(value: str) -> str:
+    # nginx 把引号、反斜杠和不可打印字符记为 \xHH，还原为对应的字节（按 latin-1，与请求行的处理一致）
+    return NGINX_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), value)
+
+
+def parse_nginx(line: str) -> Record | None:
+    match = NGINX_LINE.match(line)
+    if match is None:
+        return None
+    parts = unescape_nginx(match.group("request")).split(" ")
+    if len(parts) != 3:
+        # 扫描器发送的非 HTTP 数据等，请求行无法解析
+        return None
+    method, target, _ = parts
+    path, _, query = target.partition("?")
+    headers = {}
+    for group, name in (("referer", "referer"), ("user_agent", "user-agent")):
+        value = match.group(group)
+        if value and value != "-":
+            headers[name] = unescape_nginx(value)
+    return Record(method, path, query, headers, b"", int(match.group("status")), None)
+
+
+def parse_ndjson(line: str) -> Record | None:
+    if not line.strip():
+        return None
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("record must be a JSON object")
+    headers = {str(k).lower(): str(v) for k, v in (data.get("headers") or {}).items()}
+    for field, name in LOGGED_HEADERS.items():
+        if data.get(field):
+            headers.setdefault(name, str(data[field]))
+    if "url" in data:
+        url = urllib.parse.urlsplit(data["url"])
+        path, query = url.path or "/", url.query
+    else:
+        # WAF 日志中的路径已经解码，重新编码成请求行中的形式
+        path = urllib.parse.quote(data.get("path") or "/", safe="/:@!$&'()*+,;=~")
+        query = data.get("query_string", data.get("query", ""))
+        if isinstance(query, dict):
+            query = urllib.parse.urlencode(query)
+    body = data.get("body") or ""
+    status = data.get("status")
+    recorded_attack = data.get("is_attack")
+    return Record(
+        str(data.get("method") or "GET"),
+        path,
+        str(query or ""),
+        headers,
+        body.encode("utf-8") if isinstance(body, str) else b"",
+        status if isinstance(status, int) and not isinstance(status, bool) else None,
+        recorded_attack if isinstance(recorded_attack, bool) else None,
+    )
+
+
+def parse_har(entry: dict) -> Record | None:
+    request = entry.get("request") or {}
+    if not request.get("url"):
+        return None
+    url = urllib.parse.urlsplit(request["url"])
+    headers = {h["name"].lower(): h["value"] for h in request.get("headers", []) if h.get("name")}
+    post_data = request.get("postData") or {}
+    if post_data.get("mimeType"):
+        headers.setdefault("content-type", post_data["mimeType"])
+    # HAR 中没有收到响应的请求状态码为 0
+    status = (entry.get("response") or {}).get("status") or None
+    return Record(
+        request.get("method", "GET"), url.path or "/", url.query, headers,
+        (post_data.get("text") or "").encode("utf-8"), status, None,
+    )
+
+
+PARSERS = {"nginx": parse_nginx, "ndjson": parse_ndjson, "har": parse_har}
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".har":
+        return "har"
+    if extension in (".ndjson", ".jsonl", ".json"):
+        return "ndjson"
+    return "nginx"
+
+
+def open_input(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_batches(path: str, fmt: str):
+    """按批读取原始记录（文本行或 HAR 条目），解析在工作进程中完成"""
+    with open_input(path) as f:
+        if fmt == "har":
+            # HAR 是单个 JSON 文档，只能整体读入
+            entries = json.load(f).get("log", {}).get("entries", [])
+            for i in range(0, len(entries), BATCH_SIZE):
+                yield entries[i:i + BATCH_SIZE]
+            return
+        batch = []
+        for line in f:
+            batch.append(line)
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def all_batches(inputs: list, fmt: str | None):
+    for path in inputs:
+        path_fmt = fmt or detect_format(path)
+        for batch in read_batches(path, path_fmt):
+            yield path_fmt, batch
+
+
+# 工作进程中的检查器，由 init_worker 创建，每个进程只编译一次规则
+_core = None
+
+
+def init_worker(rules: dict):
+    global _core
+    # 只用到规则检查，不需要黑名单和频率限制
+    _core = WafCore(RuleSet(rules, WAF_RULE_TARGETS), None, None)
+
+
+def new_report() -> dict:
+    return {
+        "records": 0,
+        "unparsed": 0,
+        "flagged": 0,
+        "hits": Counter(),
+        "suspects": Counter(),  # (分类, 方法, 路径) -> 疑似误报数
+        "examples": {},
+        "no_longer_flagged": 0,
+    }
+
+
+def evaluate_batch(fmt: str, batch: list) -> dict:
+    parse = PARSERS[fmt]
+    rule_set = _core.rule_set
+    report = new_report()
+    for raw in batch:
+        try:
+            record = parse(raw)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            record = None
+        if record is None:
+            if fmt != "ndjson" or raw.strip():
+                report["unparsed"] += 1
+            continue
+        report["records"] += 1
+        matched = _core.inspect(record.path, record.query, record.headers, record.body, method=record.method)
+        if not matched:
+            report["no_longer_flagged"] += record.recorded_attack is True
+            continue
+        report["flagged"] += 1
+        report["hits"].update(matched)
+        served = record.status is not None and record.status < 400
+        if served or record.recorded_attack is False:
+            key = (rule_set.first(matched), record.method, urllib.parse.unquote(record.path))
+            report["suspects"][key] += 1
+            if key not in report["examples"]:
+                target = f"{record.path}?{record.query}" if record.query else record.path
+                report["examples"][key] = target[:200]
+    return report
+
+
+def merge(total: dict, part: dict):
+    for key in ("records", "unparsed", "flagged", "no_longer_flagged"):
+        total[key] += part[key]
+    total["hits"].update(part["hits"])
+    total["suspects"].update(part["suspects"])
+    for key, example in part["examples"].items():
+        total["examples"].setdefault(key, example)
+
+
+def replay(inputs: list, fmt: str | None, rules: dict, workers: int) -> dict:
+    total = new_report()
+    batches = all_batches(inputs, fmt)
+    if workers <= 1:
+        init_worker(rules)
+        for batch_fmt, batch in batches:
+            merge(total, evaluate_batch(batch_fmt, batch))
+        return total
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(rules,)) as pool:
+        # 限制同时提交的批数，大文件不会被一次读进内存
+        pending = set()
+        for batch_fmt, batch in batches:
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(total, future.result())
+            pending.add(pool.submit(evaluate_batch, batch_fmt, batch))
+        for future in wait(pending).done:
+            merge(total, future.result())
+    return total
+
+
+def load_rules(path: str | None) -> dict:
+    """与 /api/firewall/rules 相同：文件中的分类覆盖内置规则的同名分类"""
+    if path is None:
+        return WAF_RULES
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    if not isinstance(rules, dict):
+        raise ValueError("rules file must contain a JSON object")
+    merged = {**WAF_RULES, **rules}
+    RuleSet(merged, WAF_RULE_TARGETS)
+    return merged
+
+
+def print_report(report: dict, elapsed: float, workers: int, top: int):
+    records = report["records"]
+    print(
+        f"records: {records}  unparsed: {report['unparsed']}  "
+        f"time: {elapsed:.2f}s  {records / elapsed if elapsed else 0:.0f} records/s  workers: {workers}"
+    )
+    print(f"flagged: {report['flagged']} ({report['flagged'] / records if records else 0:.2%})")
+    if report["no_longer_flagged"]:
+        print(f"blocked in the original log but not flagged now: {report['no_longer_flagged']}")
+    print("\nhits by category:")
+    for category, count in report["hits"].most_common():
+        print(f"  {category:<20} {count:>10}")
+    suspects = report["suspects"]
+    print(f"\nfalse-positive candidates: {sum(suspects.values())} (flagged, but served normally or allowed before)")
+    for key, count in suspects.most_common(top):
+        category, method, path = key
+        print(f"  {count:>8}  {category:<18} {method:<8} {path[:60]:<60}  e.g. {report['examples'][key][:80]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="日志文件")
+    parser.add_argument("--format", choices=list(PARSERS), help="输入格式，默认按扩展名识别")
+    parser.add_argument("--rules", help="规则 JSON 文件（分类 -> 正则列表），覆盖内置规则的同名分类")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数")
+    parser.add_argument("--top", type=int, default=20, help="显示的疑似误报条数")
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, RuleCompileError) as e:
+        sys.exit(f"Invalid rules file: {e}")
+
+    started = time.perf_counter()
+    report = replay(args.inputs, args.format, rules, args.workers)
+    print_report(report, time.perf_counter() - started, args.workers, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+WAF 核心检查：IP 黑名单、频率限制和规则匹配
+
+只依赖标准库，输入为客户端地址和原始的路径、查询串、请求头、请求体，
+FastAPI 后端（main.py）和容器中运行的 basic_server.py 共用，两者对同一请求给出相同的判定。
+"""
+import ipaddress
+import urllib.parse
+from contextlib import nullcontext
+
+from ip_blacklist import IPBlacklist
+from rate_limiter import RateLimiter
+from rule_engine import FILENAME_TARGET, HEADER_TARGET_PREFIX, RuleSet, normalize
+
+# WAF 规则
+WAF_RULES = {
+    "sql_injection": [
+        r"' OR 1=1--",
+        r"UNION SELECT",
+        r"DROP TABLE",
+        r"INSERT INTO",
+        r"\bUPDATE\b.{0,100}?\bSET\b",
+        r"DELETE FROM",
+        r"CREATE TABLE",
+        r"ALTER TABLE",
+        r"TRUNCATE TABLE",
+        r"EXEC sp_",
+        r"xp_",
+        r"\bSELECT\b.{0,100}?\bFROM\b",
+        r"\bWHERE\b.{0,100}?\bOR\b",
+        r"\bAND\b.{0,100}?\b1=1\b",
+    ],
+    "xss": [
+        r"<script",
+        r"javascript:",
+        r"onerror=",
+        r"onload=",
+        r"onclick=",
+        r"onmouseover=",
+        r"<iframe",
+        r"<object",
+        r"<embed",
+        r"<link",
+        r"<meta",
+        r"<img[^>]{0,200}?javascript:",
+        r"</script>",
+        r"eval\(",
+        r"document\.write",
+        r"window\.location",
+    ],
+    "command_injection": [
+        r";\s*(?:ls|cat|id|whoami|uname|pwd|wget|curl|nc|bash|sh|rm|chmod|ping)\b",
+        r"\|\|\s*(?:ls|cat|id|whoami|uname|pwd|wget|curl|nc|bash|sh|rm|chmod|ping)\b",
+        r"\&\&\s*(?:ls|cat|id|whoami|uname|pwd|wget|curl|nc|bash|sh|rm|chmod|ping)\b",
+        r"`[^`]{0,200}`",
+        r"\$\([^)]{0,200}\)",
+        r"\<\s*/(?:etc|dev|proc|tmp)/",
+        r"\>\s*/(?:etc|dev|proc|tmp)/",
+        r"\|\s*grep\s*",
+        r"\|\s*awk\s*",
+        r"\|\s*sed\s*",
+        r"\|\s*sort\s*",
+        r"\|\s*uniq\s*",
+        r"\|\s*wc\s*",
+        r"\|\s*cat\s*",
+        r"\|\s*tac\s*",
+        r"\|\s*head\s*",
+        r"\|\s*tail\s*",
+    ],
+    "csrf": [
+        r"\bcsrf\b",
+        r"\bcross-site\b",
+        r"\brequest forgery\b",
+    ],
+    "file_upload": [
+        r"\.php$",
+        r"\.asp$",
+        r"\.aspx$",
+        r"\.jsp$",
+        r"\.jspx$",
+        r"\.exe$",
+        r"\.sh$",
+        r"\.bat$",
+        r"\.cmd$",
+        r"\.py$",
+        r"\.pl$",
+        r"\.perl$",
+        r"\.cgi$",
+        r"\.js$",
+        r"\.vbs$",
+        r"\.ps1$",
+    ],
+    "sensitive_info": [
+        r"\bpassword\b",
+        r"\bpasswd\b",
+        r"\bsecret\b",
+        r"\btoken\b",
+        r"\bapi_key\b",
+        r"\bapi_secret\b",
+        r"\bauth\b",
+        r"\bcookie\b",
+        r"\bsession\b",
+        r"\bcredit_card\b",
+        r"\bssn\b",
+        r"\bsocial_security\b",
+        r"\bprivate\b",
+        r"\bconfidential\b",
+    ],
+    "brute_force": [
+        r"\blogin\b",
+        r"\bauthenticate\b",
+        r"\bsignin\b",
+        r"\bpassword\b",
+        r"\bpasswd\b",
+    ],
+    "abnormal_request": [
+        r"\bnull\b",
+        r"\bundefined\b",
+        r"\binfinity\b",
+        r"\bNaN\b",
+        r"\bInfinity\b",
+        r"\bundefined\b",
+        r"\bnull\b",
+    ],
+}
+
+# 各分类的检查目标：path、args、body、header:<名称>，未列出的分类检查 path、args、body
+WAF_RULE_TARGETS = {
+    "sql_injection": ["path", "args", "body", "header:user-agent", "header:referer"],
+    "xss": ["path", "args", "body", "header:user-agent", "header:referer"],
+    "command_injection": ["path", "args", "body", "header:user-agent"],
+    "csrf": ["args", "body"],
+    "file_upload": ["filename"],
+    "sensitive_info": ["args"],
+    "brute_force": ["args"],
+    "abnormal_request": ["args"],
+}
+
+# 各分类命中时返回的提示信息（顺序即检测优先级）
+ATTACK_MESSAGES = {
+    "sql_injection": "SQL 注入攻击检测",
+    "xss": "跨站脚本攻击检测",
+    "command_injection": "命令注入攻击检测",
+    "csrf": "跨站请求伪造攻击检测",
+    "file_upload": "恶意文件上传检测",
+    "sensitive_info": "敏感信息泄露检测",
+    "brute_force": "暴力破解攻击检测",
+    "abnormal_request": "异常请求检测",
+}
+
+# 在服务器上写入文件的方法（WebDAV）：PUT 的路径、MOVE/COPY 的 Destination 即上传或改名后的文件名
+UPLOAD_METHODS = ("PUT", "MOVE", "COPY")
+
+# 请求体检查默认配置：最多检查的字节数、相邻分块的重叠字符数
+BODY_INSPECT_MAX_BYTES = 1024 * 1024
+BODY_INSPECT_OVERLAP = 256
+
+# 拦截响应的内容
+BLACKLISTED_RESPONSE = {
+    "detail": "Access denied: IP address is blacklisted",
+    "attack_type": "IP 黑名单拦截"
+}
+RATE_LIMITED_RESPONSE = {
+    "detail": "Too many requests: Rate limit exceeded",
+    "attack_type": "请求频率限制"
+}
+
+
+def parse_client(client_ip: str) -> tuple:
+    """返回 (地址对象, 是否 IPv6)，无法解析的客户端标识原样返回"""
+    try:
+        address = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return client_ip, False
+    return address, address.version == 6
+
+
+def attack_message_for(matched, rule_set: RuleSet) -> tuple[bool, str]:
+    """按分类优先级取第一个命中的分类，返回 (是否攻击, 提示信息)"""
+    category = rule_set.first(matched)
+    if category is None:
+        return False, ""
+    return True, ATTACK_MESSAGES.get(category, f"{category} 规则命中")
+
+
+def upload_names(method: str, path: str, headers) -> list:
+    """请求要写入的文件名（已解码的路径的最后一段），不写入文件的请求返回空列表"""
+    method = method.upper()
+    if method not in UPLOAD_METHODS:
+        return []
+    if method != "PUT":
+        path = urllib.parse.unquote(urllib.parse.urlsplit(headers.get("destination") or "").path)
+    name = path.rstrip("/").rsplit("/", 1)[-1]
+    return [normalize(name)] if name else []
+
+
+def request_fields(rule_set: RuleSet, path, query, headers, method: str = "GET") -> dict:
+    """
+    取出各检查目标并规范化
+
+    path、query 为请求行中未解码的路径和查询串（str 或 bytes），
+    headers 为支持按小写名称 get 的映射（不区分大小写）。
+    路径先按服务器的方式解码一次，再与其他目标一样规范化。
+    filename 只在写入文件的请求中存在，访问已有的 .js、.php 等文件不检查。
+    """
+    if isinstance(path, bytes):
+        path = path.decode("latin-1")
+    if isinstance(query, bytes):
+        query = query.decode("latin-1")
+    path = urllib.parse.unquote(path)
+    fields = {
+        "path": normalize(path),
+        "args": normalize(query),
+    }
+    for name in rule_set.header_names:
+        value = headers.get(name)
+        if value:
+            fields[HEADER_TARGET_PREFIX + name] = normalize(value)
+    if rule_set.inspects_filenames:
+        names = upload_names(method, path, headers)
+        if names:
+            fields[FILENAME_TARGET] = names
+    return fields
+
+
+def is_multipart(content_type: str | None) -> bool:
+    return (content_type or "").lower().startswith("multipart/form-data")
+
+
+def inspects_body(rule_set: RuleSet, content_type: str | None) -> bool:
+    # 文本类型（application/*）的请求体按 body 规则检查，multipart 表单只检查上传的文件名
+    if is_multipart(content_type):
+        return rule_set.inspects_filenames
+    return rule_set.inspects_body and (content_type or "").lower().startswith("application/")
+
+
+class Verdict:
+    """检查结果：status 为 None 表示放行，否则按 status 和 content 返回拦截响应"""
+
+    __slots__ = ("status", "content", "attack_message", "is_ipv6")
+
+    def __init__(self, status: int | None = None, content: dict | None = None,
+                 attack_message: str | None = None, is_ipv6: bool = False):
+        self.status = status
+        self.content = content
+        self.attack_message = attack_message
+        self.is_ipv6 = is_ipv6
+
+    @property
+    def allowed(self) -> bool:
+        return self.status is None
+
+    @property
+    def is_attack(self) -> bool:
+        return self.attack_message is not None
+
+
+class WafCore:
+    """
+    一个服务进程的 WAF 状态：规则集、IP 黑名单和频率限制
+
+    rule_set 可以随时整体替换（规则更新）；blacklist 和 rate_limiter 可以换成多 worker 共享状态的子类。
+    多线程服务器传入 lock，黑名单和频率限制在 lock 内读写（调用方直接访问时也要持有 lock）；规则匹配不修改状态，不需要加锁。
+    """
+
+    def __init__(
+        self,
+        rule_set: RuleSet,
+        blacklist: IPBlacklist,
+        rate_limiter: RateLimiter,
+        body_max_bytes: int = BODY_INSPECT_MAX_BYTES,
+        body_overlap: int = BODY_INSPECT_OVERLAP,
+        lock=None,
+    ):
+        self.rule_set = rule_set
+        self.blacklist = blacklist
+        self.rate_limiter = rate_limiter
+        self.body_max_bytes = body_max_bytes
+        self.body_overlap = body_overlap
+        self.lock = lock if lock is not None else nullcontext()
+
+    def admit(self, client_ip: str, address=None, now: float | None = None) -> Verdict | None:
+        """黑名单和频率限制检查（未超限时同时记录本次请求），放行返回 None；超过频率限制的客户端加入黑名单"""
+        if address is None:
+            address = parse_client(client_ip)[0]
+        with self.lock:
+            if address in self.blacklist:
+                return Verdict(403, BLACKLISTED_RESPONSE)
+            if not self.rate_limiter.hit(client_ip, now):
+                self.blacklist.add_client(client_ip, now)
+                return Verdict(429, RATE_LIMITED_RESPONSE)
+        return None
+
+    def body_scanner(self, rule_set: RuleSet | None = None, multipart: bool = False):
+        return (rule_set or self.rule_set).body_scanner(self.body_max_bytes, self.body_overlap, multipart)
+
+    def inspect(self, path, query, headers, body: bytes = b"", rule_set: RuleSet | None = None,
+                method: str = "GET") -> set:
+        """先查路径、参数和请求头，未命中再检查请求体，返回命中的分类集合"""
+        rule_set = rule_set or self.rule_set
+        matched = rule_set.match(request_fields(rule_set, path, query, headers, method))
+        content_type = headers.get("content-type")
+        if not matched and body and inspects_body(rule_set, content_type):
+            scanner = self.body_scanner(rule_set, is_multipart(content_type))
+            scanner.feed(body)
+            matched = scanner.matched
+        return matched
+
+    def block(self, client_ip: str, attack_message: str, now: float | None = None) -> Verdict:
+        """把发起攻击的客户端加入黑名单，返回 403 判定"""
+        with self.lock:
+            self.blacklist.add_client(client_ip, now)
+        return Verdict(403, {"detail": "访问被拒绝：检测到潜在攻击", "attack_type": attack_message}, attack_message)
+
+    def check(self, client_ip: str, path, query, headers, body: bytes = b"", now: float | None = None,
+              method: str = "GET") -> Verdict:
+        """完整检查一个请求：黑名单、频率限制、规则，命中规则的客户端加入黑名单"""
+        address, is_ipv6 = parse_client(client_ip)
+        verdict = self.admit(client_ip, address, now)
+        if verdict is None:
+            rule_set = self.rule_set
+            matched = self.inspect(path, query, headers, body, rule_set, method)
+            is_attack, attack_message = attack_message_for(matched, rule_set)
+            verdict = self.block(client_ip, attack_message, now) if is_attack else Verdict()
+        verdict.is_ipv6 = is_ipv6
+        return verdict
@@ -43,14 +43,14 @@ api.interceptors.response.use(
   }
 )
 
-// 获取访问日志
-export const getAccessLogs = (limit = 100) => {
-  return api.get('/access-logs', { params: { limit } })
+// 获取访问日志（since 为上次响应的 next_since，只返回更新的记录）
+export const getAccessLogs = (limit = 100, since) => {
+  return api.get('/access-logs', { params: { limit, since } })
 }
 
 // 获取攻击日志
-export const getAttackLogs = (limit = 100) => {
-  return api.get('/attack-logs', { params: { limit } })
+export const getAttackLogs = (limit = 100, since) => {
+  return api.get('/attack-logs', { params: { limit, since } })
 }
 
 // 获取 IPv6 统计
@@ -63,4 +63,21 @@ export const getStatus = () => {
   return api.get('/status')
 }
 
+// 订阅实时事件流（Server-Sent Events）：handlers 按事件名（logs、stats、resync）处理解析后的数据。
+// 后端不支持实时推送时（例如容器后端 basic_server.py 返回 404）调用 onUnavailable，由调用方退回轮询。
+// 返回 EventSource，组件卸载时调用 close()
+export const subscribeLive = (handlers, onUnavailable) => {
+  const source = new EventSource('/api/live')
+  Object.entries(handlers).forEach(([event, handler]) => {
+    source.addEventListener(event, (e) => handler(JSON.parse(e.data)))
+  })
+  source.onerror = () => {
+    // 网络断开时浏览器会自动重连，只有响应不是事件流时连接才会被关闭
+    if (source.readyState === EventSource.CLOSED) {
+      onUnavailable?.()
+    }
+  }
+  return source
+}
+
 export default api